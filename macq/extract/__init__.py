@@ -11,7 +11,7 @@ from .amdn import AMDN
 from .arms import ARMS
 from .locm import LOCM
 from .slaf import SLAF
-from .observer import Observer
+from .observer import Observer, IncrementalObserver
 from macq.core.signature_parameter import ObjectType
 
 __all__ = [
@@ -29,4 +29,5 @@ __all__ = [
     "LOCM",
     "SLAF",
     "Observer",
+    "IncrementalObserver",
 ]
@@ -3,6 +3,7 @@
 from macq.trace import Fluent, Action  # for typing
 from macq.extract.learned_action import LearnedAction
 from nnf.operators import implies
+import numpy as np
 
 import macq.extract as extract
 from typing import Dict, List, Optional, Union, Hashable
@@ -12,9 +13,10 @@ from .exceptions import (
     IncompatibleObservationToken,
 )
 from .model import Model
-from ..trace import ActionPair
+from ..trace import ActionPair, FluentIndex, TraceArrays
+from ..trace.trace_arrays import state_matrix
 from ..observation import NoisyPartialDisorderedParallelObservation, ObservedTraceList
-from ..utils.pysat import to_wcnf, extract_raw_model
+from ..utils.pysat import to_wcnf, extract_raw_model, write_wcnf, MaxSATSolver
 
 e = Encoding
 
@@ -70,6 +72,8 @@ class AMDN:
         obs_tracelist: ObservedTraceList,
         debug: bool = False,
         occ_threshold: int = 1,
+        solver: Optional[MaxSATSolver] = None,
+        wcnf_path: Optional[str] = None,
     ):
         """Creates a new Model object.
 
@@ -80,6 +84,13 @@ class AMDN:
                 Optional debugging mode.
             occ_threshold (int):
                 Threshold to be used for noise constraints.
+            solver (MaxSATSolver):
+                Optional; The solver for the MAX-SAT problem, for example one
+                with a time limit. Defaults to an RC2 solver without a time limit.
+            wcnf_path (str):
+                Optional; A path to write the MAX-SAT problem to, as a DIMACS
+                WCNF file along with its decode mapping (see
+                `macq.utils.pysat.write_wcnf`).
 
         Raises:
             IncompatibleObservationToken:
@@ -88,10 +99,16 @@ class AMDN:
         if obs_tracelist.type is not NoisyPartialDisorderedParallelObservation:
             raise IncompatibleObservationToken(obs_tracelist.type, AMDN)
 
-        return AMDN._amdn(obs_tracelist, debug, occ_threshold)
+        return AMDN._amdn(obs_tracelist, debug, occ_threshold, solver, wcnf_path)
 
     @staticmethod
-    def _amdn(obs_tracelist: ObservedTraceList, debug: bool, occ_threshold: int):
+    def _amdn(
+        obs_tracelist: ObservedTraceList,
+        debug: bool,
+        occ_threshold: int,
+        solver: Optional[MaxSATSolver] = None,
+        wcnf_path: Optional[str] = None,
+    ):
         """Main driver for the entire AMDN algorithm.
         The first line contains steps 1-4.
         The second line contains step 5.
@@ -104,12 +121,18 @@ class AMDN:
                 Optional debugging mode.
             occ_threshold (int):
                 Threshold to be used for noise constraints.
+            solver (MaxSATSolver):
+                Optional; The solver for the MAX-SAT problem.
+            wcnf_path (str):
+                Optional; A path to write the MAX-SAT problem to.
 
         Returns:
             The extracted `Model`.
         """
         wcnf, decode = AMDN._solve_constraints(obs_tracelist, occ_threshold, debug)
-        raw_model = extract_raw_model(wcnf, decode)
+        if wcnf_path is not None:
+            write_wcnf(wcnf_path, wcnf, decode)
+        raw_model = extract_raw_model(wcnf, decode, solver)
         return AMDN._extract_model(obs_tracelist, raw_model)
 
     @staticmethod
@@ -438,53 +461,64 @@ class AMDN:
         return {**hard_constraints, **soft_constraints}
 
     @staticmethod
-    def _calculate_all_r_occ(obs_tracelist: ObservedTraceList):
-        """Calculates the total number of (true) propositions in the provided traces/tokens.
+    def _to_arrays(obs_tracelist: ObservedTraceList):
+        """Stacks the tokens into a `TraceArrays` whose columns follow the order of
+        the propositions and whose action vocabulary follows the order of the
+        actions, which is the order the constraints are built in.
 
         Args:
             obs_tracelist (ObservationLists):
                 The tokens to be analyzed.
 
+        Returns:
+            The `TraceArrays` of the tokens.
+        """
+        return TraceArrays.from_traces(
+            obs_tracelist, list(obs_tracelist.propositions), obs_tracelist.actions
+        )
+
+    @staticmethod
+    def _calculate_all_r_occ(arrays: TraceArrays):
+        """Calculates the total number of (true) propositions in the provided traces/tokens.
+
+        Args:
+            arrays (TraceArrays):
+                The tokens to be analyzed, as arrays.
+
         Returns:
             The total number of (true) propositions in the provided traces/tokens.
         """
         # tracks occurrences of all propositions
-        all_occ = 0
-        for trace in obs_tracelist:
-            for step in trace:
-                all_occ += len([f for f in step.state if step.state[f]])
-        return all_occ
+        return int(arrays.states.sum())
 
     @staticmethod
-    def _set_up_occurrences_dict(obs_tracelist: ObservedTraceList):
+    def _count_occurrences(action_ids: np.ndarray, states: np.ndarray, n_actions: int):
         """Helper function used when constructing noise constraints.
-        Sets up an "occurrence" dictionary used to track the occurrences of propositions
-        before or after actions.
+        Counts the occurrences of each proposition alongside each action.
 
         Args:
-            obs_tracelist (ObservationLists):
-                The tokens to be analyzed.
+            action_ids (np.ndarray):
+                The action of each row, or -1 for rows without an action.
+            states (np.ndarray):
+                The state matrix rows to count, aligned with `action_ids`.
+            n_actions (int):
+                The number of actions.
 
         Returns:
-            The blank "occurrences" dictionary.
+            The (actions x propositions) matrix of occurrence counts.
         """
-        # set up dict
-        occurrences = {}
-        for a in obs_tracelist.actions:
-            occurrences[a] = {}
-            for r in obs_tracelist.propositions:
-                occurrences[a][r] = 0
+        has_action = action_ids >= 0
+        occurrences = np.zeros((n_actions, states.shape[1]), dtype=np.int64)
+        np.add.at(occurrences, action_ids[has_action], states[has_action])
         return occurrences
 
     @staticmethod
-    def _noise_constraints_6(
-        obs_tracelist: ObservedTraceList, all_occ: int, occ_threshold: int
-    ):
+    def _noise_constraints_6(arrays: TraceArrays, all_occ: int, occ_threshold: int):
         """Noise constraints (6) in the AMDN paper.
 
         Args:
-            obs_tracelist (ObservationLists):
-                The tokens that were analyzed.
+            arrays (TraceArrays):
+                The tokens that were analyzed, as arrays.
             all_occ (int):
                 The number of occurrences of all (true) propositions in the given observation list.
             occ_threshold (int):
@@ -494,41 +528,36 @@ class AMDN:
             The noise constraints.
         """
         noise_constraints_6 = {}
-        occurrences = AMDN._set_up_occurrences_dict(obs_tracelist)
-
-        # iterate over ALL the plan traces, adding occurrences accordingly
-        for i in range(len(obs_tracelist)):
-            # iterate through each step in each trace, omitting the last step because the last action is None/we access the state in the next step
-            for j in range(len(obs_tracelist[i]) - 1):
-                true_prop = [
-                    f
-                    for f in obs_tracelist[i][j + 1].state
-                    if obs_tracelist[i][j + 1].state[f]
-                ]
-                for r in true_prop:
-                    # count the number of occurrences of each action and its following proposition
-                    occurrences[obs_tracelist[i][j].action][r] += 1
-
-        # iterate through actions
-        for a in occurrences:
-            # iterate through all propositions for this action
-            for r in occurrences[a]:
-                occ_r = occurrences[a][r]
-                # if the # of occurrences is higher than the user-provided threshold:
-                if occ_r > occ_threshold:
-                    # set constraint 6 with the calculated weight
-                    noise_constraints_6[AMDN._or_refactor(~delete(r, a))] = (
-                        occ_r / all_occ
-                    ) * WMAX
+        # pair each step with the state of the following step, omitting the last
+        # step of each trace because the last action is None
+        follows = np.ones(len(arrays.action_ids), dtype=bool)
+        follows[arrays.offsets[1:] - 1] = False
+        follows = follows[:-1]
+        occurrences = AMDN._count_occurrences(
+            arrays.action_ids[:-1][follows],
+            arrays.states[1:][follows],
+            len(arrays.actions),
+        )
+
+        # iterate through the (action, proposition) pairs over the threshold
+        for a, r in zip(*np.nonzero(occurrences > occ_threshold)):
+            # set constraint 6 with the calculated weight
+            noise_constraints_6[
+                AMDN._or_refactor(~delete(arrays.fluents[r], arrays.actions[a]))
+            ] = (occurrences[a, r] / all_occ) * WMAX
         return noise_constraints_6
 
     @staticmethod
-    def _noise_constraints_7(obs_tracelist: ObservedTraceList, all_occ: int):
+    def _noise_constraints_7(
+        obs_tracelist: ObservedTraceList, arrays: TraceArrays, all_occ: int
+    ):
         """Noise constraints (7) in the AMDN paper.
 
         Args:
             obs_tracelist (ObservationLists):
                 The tokens that were analyzed.
+            arrays (TraceArrays):
+                The tokens that were analyzed, as arrays.
             all_occ (int):
                 The number of occurrences of all (true) propositions in the given observation list.
 
@@ -536,40 +565,33 @@ class AMDN:
             The noise constraints.
         """
         noise_constraints_7 = {}
-        # set up dict
-        occurrences = {}
-        for r in obs_tracelist.propositions:
-            occurrences[r] = 0
-
-        for trace in obs_tracelist.all_states:
-            for state in trace:
-                true_prop = [r for r in state if state[r]]
-                for r in true_prop:
-                    occurrences[r] += 1
+        index = FluentIndex(arrays.fluents)
+        # the states relative to the parallel action sets, stacked and split per trace
+        stacked = state_matrix(
+            (state for states in obs_tracelist.all_states for state in states), index
+        )
+        lengths = [len(states) for states in obs_tracelist.all_states]
+        all_states = np.split(stacked, np.cumsum(lengths)[:-1])
+        occurrences = stacked.sum(axis=0)
+        fluents = index.fluents
 
         # iterate through all traces
-        for i in range(len(obs_tracelist.all_par_act_sets)):
-            # get the next trace/states
-            par_act_sets = obs_tracelist.all_par_act_sets[i]
-            states = obs_tracelist.all_states[i]
-            # iterate through all parallel action sets within the trace
-            for j in range(len(par_act_sets)):
-                # examine the states before and after each parallel action set; set constraints accordinglly
-                true_prop = [r for r in states[j + 1] if states[j + 1][r]]
-                for r in true_prop:
-                    if not states[j][r]:
-                        noise_constraints_7[
-                            Or([add(r, act) for act in par_act_sets[j]])
-                        ] = (occurrences[r] / all_occ) * WMAX
+        for par_act_sets, states in zip(obs_tracelist.all_par_act_sets, all_states):
+            # examine the states before and after each parallel action set; set constraints accordinglly
+            became_true = states[1:] & ~states[:-1]
+            for j, r in zip(*np.nonzero(became_true[: len(par_act_sets)])):
+                noise_constraints_7[
+                    Or([add(fluents[r], act) for act in par_act_sets[j]])
+                ] = (occurrences[r] / all_occ) * WMAX
         return noise_constraints_7
 
     @staticmethod
-    def _noise_constraints_8(obs_tracelist, all_occ: int, occ_threshold: int):
+    def _noise_constraints_8(arrays: TraceArrays, all_occ: int, occ_threshold: int):
         """Noise constraints (8) in the AMDN paper.
 
         Args:
-            obs_tracelist (ObservationLists):
-                The tokens that were analyzed.
+            arrays (TraceArrays):
+                The tokens that were analyzed, as arrays.
             all_occ (int):
                 The number of occurrences of all (true) propositions in the given observation list.
             occ_threshold (int):
@@ -579,34 +601,17 @@ class AMDN:
             The noise constraints.
         """
         noise_constraints_8 = {}
-        occurrences = AMDN._set_up_occurrences_dict(obs_tracelist)
-
-        # iterate over ALL the plan traces, adding occurrences accordingly
-        for i in range(len(obs_tracelist)):
-            # iterate through each step in each trace
-            for j in range(len(obs_tracelist[i])):
-                # if the action is not None
-                if obs_tracelist[i][j].action:
-                    true_prop = [
-                        f
-                        for f in obs_tracelist[i][j].state
-                        if obs_tracelist[i][j].state[f]
-                    ]
-                    for r in true_prop:
-                        # count the number of occurrences of each action and its previous proposition
-                        occurrences[obs_tracelist[i][j].action][r] += 1
-
-        # iterate through actions
-        for a in occurrences:
-            # iterate through all propositions for this action
-            for r in occurrences[a]:
-                occ_r = occurrences[a][r]
-                # if the # of occurrences is higher than the user-provided threshold:
-                if occ_r > occ_threshold:
-                    # set constraint 8 with the calculated weight
-                    noise_constraints_8[AMDN._or_refactor(pre(r, a))] = (
-                        occ_r / all_occ
-                    ) * WMAX
+        # count the number of occurrences of each action and its previous proposition
+        occurrences = AMDN._count_occurrences(
+            arrays.action_ids, arrays.states, len(arrays.actions)
+        )
+
+        # iterate through the (action, proposition) pairs over the threshold
+        for a, r in zip(*np.nonzero(occurrences > occ_threshold)):
+            # set constraint 8 with the calculated weight
+            noise_constraints_8[
+                AMDN._or_refactor(pre(arrays.fluents[r], arrays.actions[a]))
+            ] = (occurrences[a, r] / all_occ) * WMAX
         return noise_constraints_8
 
     @staticmethod
@@ -629,10 +634,11 @@ class AMDN:
                 If in the optional debugging mode, the list of fluents to observe.
         """
         # calculate all occurrences for use in weights
-        all_occ = AMDN._calculate_all_r_occ(obs_tracelist)
-        nc_6 = AMDN._noise_constraints_6(obs_tracelist, all_occ, occ_threshold)
-        nc_7 = AMDN._noise_constraints_7(obs_tracelist, all_occ)
-        nc_8 = AMDN._noise_constraints_8(obs_tracelist, all_occ, occ_threshold)
+        arrays = AMDN._to_arrays(obs_tracelist)
+        all_occ = AMDN._calculate_all_r_occ(arrays)
+        nc_6 = AMDN._noise_constraints_6(arrays, all_occ, occ_threshold)
+        nc_7 = AMDN._noise_constraints_7(obs_tracelist, arrays, all_occ)
+        nc_8 = AMDN._noise_constraints_8(arrays, all_occ, occ_threshold)
         if debug:
             print("\nNoise constraints 6:")
             AMDN._debug_simple_pprint(nc_6, to_obs)
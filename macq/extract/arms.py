@@ -1,18 +1,32 @@
 """.. include:: ../../docs/extract/arms.md"""
 
 from collections import Counter, defaultdict
-from dataclasses import dataclass
-from typing import Dict, Hashable, List, Set, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from itertools import repeat
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 from warnings import warn
 
-from nnf import And, Or, Var
-from nnf import false as nnffalse
+import numpy as np
 
 from ..observation import Observation, ObservedTraceList, PartialObservation
 from ..trace import Action, Fluent
-from ..utils.pysat import RC2, WCNF, to_wcnf
+from ..utils.pysat import WCNF, IncrementalMaxSAT, MaxSATSolver, write_wcnf
 from . import LearnedAction, LearnedFluent, Model
-from .exceptions import IncompatibleObservationToken, InvalidMaxSATModel
+from .exceptions import IncompatibleObservationToken
 
 
 @dataclass
@@ -39,14 +53,319 @@ class Relation:
         return hash(self.var())
 
 
+# a pysat clause: the disjunction of its literals (negative for negated variables)
+Clause = Tuple[int, ...]
+
+
+class Membership(NamedTuple):
+    """The proposition that a relation is in a list of an action."""
+
+    relation: Relation
+    role: str  # "pre" | "add" | "del"
+    action: LearnedAction
+
+
+class Relevance(NamedTuple):
+    """The proposition that a relation explains an ordered pair of actions."""
+
+    relation: Relation
+    first: LearnedAction
+    second: LearnedAction
+
+
+class ARMSVariables:
+    """The pool of the integer (pysat) variables of the ARMS constraints.
+
+    Every `Membership` and `Relevance` proposition over the relations and
+    actions of the pool has a variable. The variables are numbered from the
+    positions of their relation, role and actions, so pools built from the same
+    relations and actions agree without sharing any state (for instance across
+    processes), and a variable is decoded back to its proposition by position.
+
+    Attributes:
+        relations (List[Relation]):
+            The relations, in order.
+        actions (List[LearnedAction]):
+            The actions, in order.
+        relation_ids (Dict[Relation, int]):
+            The position of each relation.
+        action_ids (Dict[LearnedAction, int]):
+            The position of each action.
+    """
+
+    ROLES = ("pre", "add", "del")
+    PRE, ADD, DEL = range(3)
+
+    def __init__(self, relations: Iterable[Relation], actions: Iterable[LearnedAction]):
+        """Initializes the pool of the variables over relations and actions.
+
+        Args:
+            relations (Iterable[Relation]):
+                The relations. Duplicates are ignored.
+            actions (Iterable[LearnedAction]):
+                The actions. Duplicates are ignored.
+        """
+        self.relations = list(dict.fromkeys(relations))
+        self.actions = list(dict.fromkeys(actions))
+        self.relation_ids = {r: i for i, r in enumerate(self.relations)}
+        self.action_ids = {a: i for i, a in enumerate(self.actions)}
+        # whether relation r is relevant to action a, at r * len(actions) + a
+        self._matches = [r.matches(a) for r in self.relations for a in self.actions]
+        self._memberships = len(self.relations) * len(self.actions) * len(self.ROLES)
+
+    def __len__(self):
+        return self._memberships + len(self.relations) * len(self.actions) ** 2
+
+    def matches(self, relation_id: int, action_id: int) -> bool:
+        """Determines if a relation is related to an action, by position."""
+        return self._matches[relation_id * len(self.actions) + action_id]
+
+    def var(self, relation_id: int, role: int, action_id: int) -> int:
+        """The variable of a `Membership`, by the positions of its parts."""
+        return 1 + (relation_id * len(self.actions) + action_id) * 3 + role
+
+    def membership(self, relation: Relation, role: str, action: LearnedAction) -> int:
+        """The variable of the proposition that `relation` is in the `role` list
+        ("pre", "add" or "del") of `action`."""
+        return self.var(
+            self.relation_ids[relation],
+            self.ROLES.index(role),
+            self.action_ids[action],
+        )
+
+    def relevance(
+        self, relation: Relation, first: LearnedAction, second: LearnedAction
+    ) -> int:
+        """The variable of the proposition that `relation` explains the action
+        pair (`first`, `second`)."""
+        n = len(self.actions)
+        r = self.relation_ids[relation]
+        return (
+            1
+            + self._memberships
+            + (r * n + self.action_ids[first]) * n
+            + self.action_ids[second]
+        )
+
+    def __getitem__(self, var: int) -> Union[Membership, Relevance]:
+        """Decodes a variable back to its proposition."""
+        if not 0 < var <= len(self):
+            raise KeyError(var)
+        i = var - 1
+        n = len(self.actions)
+        if i < self._memberships:
+            i, role = divmod(i, 3)
+            r, a = divmod(i, n)
+            return Membership(self.relations[r], self.ROLES[role], self.actions[a])
+        i, second = divmod(i - self._memberships, n)
+        r, first = divmod(i, n)
+        return Relevance(self.relations[r], self.actions[first], self.actions[second])
+
+
+@dataclass
+class _Step2Cache:
+    """The step 2 constraints kept across the iterations of `ARMS._arms`.
+
+    Only the unlearned actions change between iterations, so the constraints of
+    an action, a trace or an action pair are kept until one of their actions is
+    learned (or, for a trace, until its states are updated in step 5).
+
+    Attributes:
+        action (Dict[LearnedAction, List[Clause]]):
+            The action constraints of each action.
+        info (Dict[int, Tuple[List[Clause], Dict[Clause, int]]]):
+            The information constraints and I3 support counts of each trace.
+        trace_actions (Dict[int, Set[LearnedAction]]):
+            The actions the information constraints of each trace refer to.
+        plan (Dict[Tuple[LearnedAction, LearnedAction], Optional[Clause]]):
+            The plan constraint of each frequent action pair.
+    """
+
+    action: Dict[LearnedAction, List[Clause]] = field(default_factory=dict)
+    info: Dict[int, Tuple[List[Clause], Dict[Clause, int]]] = field(
+        default_factory=dict
+    )
+    trace_actions: Dict[int, Set[LearnedAction]] = field(default_factory=dict)
+    plan: Dict[Tuple[LearnedAction, LearnedAction], Optional[Clause]] = field(
+        default_factory=dict
+    )
+
+    def forget(self, learned: Set[LearnedAction], traces: Set[int]):
+        """Drops the constraints that refer to the learned actions, and the
+        information constraints of the given traces."""
+        for action in learned:
+            self.action.pop(action, None)
+        for i, actions in list(self.trace_actions.items()):
+            if i in traces or not actions.isdisjoint(learned):
+                del self.info[i]
+                del self.trace_actions[i]
+        for ai, aj in list(self.plan):
+            if ai in learned or aj in learned:
+                del self.plan[(ai, aj)]
+
+
+def _serial_map(fn: Callable, *iterables) -> list:
+    """Applies a function to the work units in this process."""
+    return list(map(fn, *iterables))
+
+
+@contextmanager
+def _process_map(workers: Optional[int]) -> Iterator[Callable]:
+    """Yields a function that applies a function to the work units on a pool of
+    `workers` processes, shut down on exit (or `_serial_map` for one worker)."""
+    if workers is None or workers <= 1:
+        yield _serial_map
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+
+        def mapper(fn: Callable, units: list, *iterables) -> list:
+            chunksize = max(1, len(units) // (4 * workers))
+            return list(pool.map(fn, units, *iterables, chunksize=chunksize))
+
+        yield mapper
+
+
+def _clause(*literals: int) -> Clause:
+    """Builds a clause in a canonical form, so equal clauses compare equal."""
+    return tuple(sorted(set(literals)))
+
+
+def _implication(a: int, b: int) -> Clause:
+    return _clause(-a, b)
+
+
+def _action_constraints(
+    action: LearnedAction,
+    relations: List[Relation],
+    variables: ARMSVariables,
+    debug: bool = False,
+) -> List[Clause]:
+    """Builds the action constraints of a single action (see `ARMS.step2A`)."""
+    constraints: List[Clause] = []
+    a = variables.action_ids[action]
+    var = variables.var
+    for relation in relations:
+        r = variables.relation_ids[relation]
+        # A relation is relevant to an action if they share parameter types
+        if variables.matches(r, a):
+            if debug:
+                print(
+                    f'relation ({relation.var()}) is relevant to action "{action.details()}"\n'
+                    "A1:\n"
+                    f"  {relation.var()}∈ add ⇒ {relation.var()}∉ pre\n"
+                    f"  {relation.var()}∈ pre ⇒ {relation.var()}∉ add\n"
+                    "A2:\n"
+                    f"  {relation.var()}∈ del ⇒ {relation.var()}∈ pre\n"
+                )
+            pre = var(r, ARMSVariables.PRE, a)
+            add = var(r, ARMSVariables.ADD, a)
+            delete = var(r, ARMSVariables.DEL, a)
+
+            # A1
+            # relation in action.add => relation not in action.precond
+            # relation in action.precond => relation not in action.add
+            constraints.append(_implication(add, -pre))
+            constraints.append(_implication(pre, -add))
+
+            # A2
+            # relation in action.del => relation in action.precond
+            constraints.append(_implication(delete, pre))
+    return constraints
+
+
+def _trace_info_constraints(
+    obs_trace_i: int,
+    obs_trace: List[Observation],
+    relations: Dict[Fluent, Relation],
+    actions: Dict[Action, LearnedAction],
+    variables: ARMSVariables,
+    debug: bool = False,
+) -> Tuple[List[Clause], Dict[Clause, int]]:
+    """Builds the information constraints of a single trace (see `ARMS.step2I`)."""
+    constraints: List[Clause] = []
+    support_counts: Dict[Clause, int] = defaultdict(int)
+    relation_ids = {f: variables.relation_ids[r] for f, r in relations.items()}
+    action_ids = {a: variables.action_ids[la] for a, la in actions.items()}
+    var, matches = variables.var, variables.matches
+    PRE, ADD, DEL = ARMSVariables.PRE, ARMSVariables.ADD, ARMSVariables.DEL
+    # the actions of obs_trace[: i - 1], built up in a single forward pass, and
+    # the I1 clause of each relation over them (cleared when a new action joins)
+    prefix_actions: Dict[int, None] = {}
+    i1_clauses: Dict[int, Clause] = {}
+    for i, obs in enumerate(obs_trace):
+        if i > 1:
+            a = obs_trace[i - 2].action
+            if a is not None and a in action_ids and action_ids[a] not in prefix_actions:
+                prefix_actions[action_ids[a]] = None
+                i1_clauses.clear()
+        if obs.state is not None and i > 0:
+            n = i - 1
+            if debug:
+                print(
+                    f"\nStep {i} of observation list {obs_trace_i} contains state information."
+                )
+            for fluent, val in obs.state.items():
+                r = relation_ids[fluent]
+                # Information constraints only apply to true relations
+                if val:
+                    if debug:
+                        relation = relations[fluent]
+                        print(
+                            f"  Fluent {fluent} is true.\n"
+                            f"    ({relation.var()})∈ ("
+                            f"{' ∪ '.join([f'add_{{ {actions[obs_trace[ik].action].details()} }}' for ik in range(0,n+1) if obs_trace[ik].action in actions] )}"  # type: ignore
+                            ")"
+                        )
+                    # I1
+                    # relation in the add list of an action <= n (i-1)
+                    i1 = i1_clauses.get(r)
+                    if i1 is None:
+                        i1 = i1_clauses[r] = _clause(
+                            *(var(r, ADD, ai) for ai in prefix_actions if matches(r, ai))
+                        )
+
+                    # I2
+                    # relation not in del list of action n (i-1)
+                    i2 = None
+                    a_n = obs_trace[i - 1].action
+                    if a_n in action_ids and a_n is not None:
+                        i2 = -var(r, DEL, action_ids[a_n])
+
+                    if i1:
+                        constraints.append(i1)
+                    if i2:
+                        constraints.append((i2,))
+
+                    # I3
+                    # count occurences
+                    if (
+                        i < len(obs_trace) - 1
+                        and obs.action in action_ids
+                        and obs.action is not None  # for the linter
+                        and matches(r, action_ids[obs.action])
+                    ):
+                        # corresponding constraint is related to the current action's precondition list
+                        support_counts[(var(r, PRE, action_ids[obs.action]),)] += 1
+                    elif (
+                        a_n in action_ids
+                        and a_n is not None
+                        and matches(r, action_ids[a_n])
+                    ):
+                        # corresponding constraint is related to the previous action's add list
+                        support_counts[(var(r, ADD, action_ids[a_n]),)] += 1
+    return constraints, support_counts
+
+
 @dataclass
 class ARMSConstraints:
-    """A dataclass to hold all the constraints and weight information."""
+    """A dataclass to hold all the constraints and weight information, as
+    clauses over the variables of `variables`."""
 
-    action: List[Or[Var]]
-    info: List[Or[Var]]
-    info3: Dict[Or[Var], int]
-    plan: Dict[Or[Var], int]
+    action: List[Clause]
+    info: List[Clause]
+    info3: Dict[Clause, int]
+    plan: Dict[Clause, int]
+    variables: ARMSVariables
 
 
 class ARMS:
@@ -74,6 +393,10 @@ class ARMS:
         threshold: float = 0.6,
         info3_default: int = 30,
         plan_default: int = 30,
+        workers: int = None,
+        incremental: bool = False,
+        solver: Optional[MaxSATSolver] = None,
+        wcnf_path: Optional[str] = None,
     ):
         """
         Arguments:
@@ -97,7 +420,31 @@ class ARMS:
                 The default weight for I3 constraints with probability below the threshold.
             plan_default (int):
                 The default weight for plan constraints with probability below the threshold.
+            workers (int):
+                Optional; The number of processes to build the action and information
+                constraints with. Defaults to None (build them in this process).
+            incremental (bool):
+                Optional; Whether to keep one MAX-SAT solver across iterations,
+                updating its clauses instead of solving each iteration's problem
+                from scratch. The solutions are optimal either way, but may differ
+                where several are. Defaults to False.
+            solver (MaxSATSolver):
+                Optional; The solver for each iteration's MAX-SAT problem, for
+                example one with a time limit. Cannot be combined with
+                `incremental`. Defaults to an RC2 solver without a time limit.
+            wcnf_path (str):
+                Optional; A path to write each iteration's MAX-SAT problem to, as
+                a DIMACS WCNF file along with its decode mapping (see
+                `macq.utils.pysat.write_wcnf`). "{iteration}" in the path is
+                replaced by the iteration number.
+
+        Raises:
+            ValueError:
+                If both `incremental` and `solver` are given.
         """
+        if incremental and solver is not None:
+            raise ValueError("An incremental ARMS run uses its own solver.")
+
         if obs_tracelist.type is not PartialObservation:
             raise IncompatibleObservationToken(obs_tracelist.type, ARMS)
 
@@ -107,18 +454,24 @@ class ARMS:
         fluents = obs_tracelist.get_fluents()
         # get fluents from initial state
         # call algorithm to get actions
-        actions = ARMS._arms(
-            obs_tracelist,
-            upper_bound,
-            fluents,
-            min_support,
-            action_weight,
-            info_weight,
-            threshold,
-            info3_default,
-            plan_default,
-            debug,
-        )
+        # the debug output is interactive, so it is always built in this process
+        with _process_map(None if debug else workers) as mapper:
+            actions = ARMS._arms(
+                obs_tracelist,
+                upper_bound,
+                fluents,
+                min_support,
+                action_weight,
+                info_weight,
+                threshold,
+                info3_default,
+                plan_default,
+                debug,
+                mapper,
+                incremental,
+                solver,
+                wcnf_path,
+            )
 
         # learned_fluents = set(map(lambda f: LearnedFluent(f.name, f.objects), fluents))
         learned_fluents = set()
@@ -144,9 +497,16 @@ class ARMS:
         info3_default: int,
         plan_default: int,
         debug: bool,
+        mapper: Callable = _serial_map,
+        incremental: bool = False,
+        solver: Optional[MaxSATSolver] = None,
+        wcnf_path: Optional[str] = None,
     ) -> Set[LearnedAction]:
-        """The main driver for the ARMS algorithm."""
+        """The main driver for the ARMS algorithm. The step 2 work units of every
+        iteration are built with `mapper`."""
         learned_actions = set()  # The set of learned action models Θ
+        # step 2 constraints kept across iterations
+        cache = _Step2Cache()
         # pointers to the earliest unlearned action for each observation list
         early_actions = [0] * len(obs_tracelist)
 
@@ -159,11 +519,18 @@ class ARMS:
         for obs_action, learned_action in action_map.items():
             action_map_rev[learned_action].append(obs_action)
 
-        count = 1
+        # the variables of every action, so they stay the same as actions are learned
+        variables = ARMSVariables(
+            ARMS._relations(fluents).values(), connected_actions.keys()
+        )
+        if incremental:
+            solver = IncrementalMaxSAT(len(variables))
+
+        count = 0
         while action_map_rev:
+            count += 1
             if debug:
                 print("Iteration", count)
-                count += 1
 
             debug2 = ARMS.debug_menu("Debug step 2?") if debug else False
             constraints, relation_map = ARMS.step2(
@@ -173,6 +540,9 @@ class ARMS:
                 fluents,
                 min_support,
                 debug2,
+                cache=cache,
+                variables=variables,
+                mapper=mapper,
             )
             if debug2:
                 input("Press enter to continue...")
@@ -193,8 +563,10 @@ class ARMS:
             )
             if debug3:
                 input("Press enter to continue...")
+            if wcnf_path is not None:
+                write_wcnf(wcnf_path.format(iteration=count), max_sat, decode)
 
-            model = ARMS.step4(max_sat, decode)
+            model = ARMS.step4(max_sat, decode, solver)
 
             debug5 = ARMS.debug_menu("Debug step 5?") if debug else False
             # Mutates the LearnedAction (keys) of action_map_rev
@@ -208,6 +580,7 @@ class ARMS:
 
             # Progress observed states if early actions have been learned
             setA = set()
+            updated_traces = set()
             for action in action_map_rev.keys():
                 for i, obs_trace in enumerate(obs_tracelist):
                     obs_action: Action = obs_trace[early_actions[i]].action
@@ -225,6 +598,7 @@ class ARMS:
                                 if set(fluent.objects).issubset(obs_action.obj_params):
                                     obs_trace[early_actions[i] + 1].state[fluent] = True
                                     early_actions[i] += 1
+                                    updated_traces.add(i)
                         # Set del effects false
                         for delete in action.delete:
                             candidates = relation_map_rev[delete]
@@ -234,6 +608,7 @@ class ARMS:
                                         fluent
                                     ] = False
                                     early_actions[i] += 1
+                                    updated_traces.add(i)
 
                 if debug:
                     print()
@@ -252,6 +627,8 @@ class ARMS:
                         )
                     setA.add(action)
 
+            cache.forget(setA, updated_traces)
+
             # Update Λ by Λ − A
             for action in setA:
                 action_keys = action_map_rev[action]
@@ -309,6 +686,24 @@ class ARMS:
 
         return connected_actions, action_map
 
+    @staticmethod
+    def _relations(fluents: Set[Fluent]) -> Dict[Fluent, Relation]:
+        """Maps fluents to relations."""
+        # relations are fluents but with instantiated objects replaced by the object type
+        relations: Dict[Fluent, Relation] = dict(
+            map(
+                lambda f: (
+                    f,
+                    Relation(
+                        f.name,
+                        [obj.obj_type for obj in f.objects],
+                    ),
+                ),
+                fluents,
+            )
+        )
+        return relations
+
     @staticmethod
     def step2(
         obs_tracelist: ObservedTraceList,
@@ -317,6 +712,10 @@ class ARMS:
         fluents: Set[Fluent],
         min_support: int,
         debug: bool,
+        workers: int = None,
+        cache: Optional[_Step2Cache] = None,
+        variables: Optional[ARMSVariables] = None,
+        mapper: Optional[Callable] = None,
     ) -> Tuple[ARMSConstraints, Dict[Fluent, Relation]]:
         """(Step 2) Generate action constraints, information constraints, and plan constraints.
 
@@ -325,33 +724,49 @@ class ARMS:
         mining algorithm to find the frequent sets of connected actions and
         relations. Here connected means the actions and relations must share
         some common parameters.
+
+        The action constraints are built per action and the information
+        constraints per trace. These work units are independent, so they can be
+        built by a pool of `workers` processes (or with a `mapper` such as one
+        over a pool shared by every iteration), and with a `cache` only the
+        units not kept from a previous iteration are built. The clauses are
+        over the variables of `variables` (by default, a pool over the relations
+        of `fluents` and the actions of `connected_actions`), which must not
+        change while a cache is in use.
         """
 
-        # Map fluents to relations
-        # relations are fluents but with instantiated objects replaced by the object type
-        relations: Dict[Fluent, Relation] = dict(
-            map(
-                lambda f: (
-                    f,
-                    Relation(
-                        f.name,
-                        [obj.obj_type for obj in f.objects],
-                    ),
-                ),
-                fluents,
-            )
-        )
+        relations = ARMS._relations(fluents)
+        if variables is None:
+            variables = ARMSVariables(relations.values(), connected_actions)
 
-        debuga = ARMS.debug_menu("Debug action constraints?") if debug else False
+        with ExitStack() as stack:
+            # the debug output is interactive, so it is always built in this process
+            if debug:
+                mapper = _serial_map
+            elif mapper is None:
+                mapper = stack.enter_context(_process_map(workers))
 
-        action_constraints = ARMS.step2A(
-            connected_actions, set(relations.values()), debuga
-        )
+            debuga = ARMS.debug_menu("Debug action constraints?") if debug else False
 
-        debugi = ARMS.debug_menu("Debug info constraints?") if debug else False
-        info_constraints, info_support_counts = ARMS.step2I(
-            obs_tracelist, relations, action_map, debugi
-        )
+            action_constraints = ARMS.step2A(
+                connected_actions,
+                set(relations.values()),
+                debuga,
+                variables=variables,
+                mapper=mapper,
+                cache=cache,
+            )
+
+            debugi = ARMS.debug_menu("Debug info constraints?") if debug else False
+            info_constraints, info_support_counts = ARMS.step2I(
+                obs_tracelist,
+                relations,
+                action_map,
+                debugi,
+                variables=variables,
+                mapper=mapper,
+                cache=cache,
+            )
 
         debugp = ARMS.debug_menu("Debug plan constraints?") if debug else False
         plan_constraints = ARMS.step2P(
@@ -361,6 +776,8 @@ class ARMS:
             set(relations.values()),
             min_support,
             debugp,
+            variables=variables,
+            cache=cache,
         )
 
         return (
@@ -369,6 +786,7 @@ class ARMS:
                 info_constraints,
                 info_support_counts,
                 plan_constraints,
+                variables,
             ),
             relations,
         )
@@ -378,7 +796,10 @@ class ARMS:
         connected_actions: Dict[LearnedAction, Dict[LearnedAction, Set]],
         relations: Set[Relation],
         debug: bool,
-    ) -> List[Or[Var]]:
+        variables: Optional[ARMSVariables] = None,
+        mapper: Callable = _serial_map,
+        cache: Optional[_Step2Cache] = None,
+    ) -> List[Clause]:
         """Action constraints.
 
         A1. The intersection of the precondition and add lists of all actions must be empty.
@@ -391,65 +812,24 @@ class ARMS:
         if debug:
             print("\nBuilding action constraints...\n")
 
-        def implication(a: Var, b: Var):
-            return Or([a.negate(), b])
-
-        constraints: List[Or[Var]] = []
-        actions = set(connected_actions.keys())
-        for action in actions:
-            for relation in relations:
-                # A relation is relevant to an action if they share parameter types
-                if relation.matches(action):
-                    if debug:
-                        print(
-                            f'relation ({relation.var()}) is relevant to action "{action.details()}"\n'
-                            "A1:\n"
-                            f"  {relation.var()}∈ add ⇒ {relation.var()}∉ pre\n"
-                            f"  {relation.var()}∈ pre ⇒ {relation.var()}∉ add\n"
-                            "A2:\n"
-                            f"  {relation.var()}∈ del ⇒ {relation.var()}∈ pre\n"
-                        )
-
-                    # A1
-                    # relation in action.add => relation not in action.precond
-                    # relation in action.precond => relation not in action.add
-
-                    # (BREAK) marks unambiguous breakpoints for parsing later
-                    constraints.append(
-                        implication(
-                            Var(
-                                f"{relation.var()} (BREAK) in (BREAK) add (BREAK) {action.details()}"
-                            ),
-                            Var(
-                                f"{relation.var()} (BREAK) in (BREAK) pre (BREAK) {action.details()}"
-                            ).negate(),
-                        )
-                    )
-                    constraints.append(
-                        implication(
-                            Var(
-                                f"{relation.var()} (BREAK) in (BREAK) pre (BREAK) {action.details()}"
-                            ),
-                            Var(
-                                f"{relation.var()} (BREAK) in (BREAK) add (BREAK) {action.details()}"
-                            ).negate(),
-                        )
-                    )
-
-                    # A2
-                    # relation in action.del => relation in action.precond
-                    constraints.append(
-                        implication(
-                            Var(
-                                f"{relation.var()} (BREAK) in (BREAK) del (BREAK) {action.details()}"
-                            ),
-                            Var(
-                                f"{relation.var()} (BREAK) in (BREAK) pre (BREAK) {action.details()}"
-                            ),
-                        )
-                    )
-
-        return constraints
+        relations = list(relations)
+        actions = list(set(connected_actions.keys()))
+        if variables is None:
+            variables = ARMSVariables(relations, actions)
+        units = actions
+        if cache is not None:
+            units = [a for a in actions if a not in cache.action]
+        results = mapper(
+            _action_constraints,
+            units,
+            repeat(relations),
+            repeat(variables),
+            repeat(debug),
+        )
+        if cache is None:
+            return [c for action_constraints in results for c in action_constraints]
+        cache.action.update(zip(units, results))
+        return [c for action in actions for c in cache.action[action]]
 
     @staticmethod
     def step2I(
@@ -457,7 +837,10 @@ class ARMS:
         relations: Dict[Fluent, Relation],
         actions: Dict[Action, LearnedAction],
         debug: bool,
-    ) -> Tuple[List[Or[Var]], Dict[Or[Var], int]]:
+        variables: Optional[ARMSVariables] = None,
+        mapper: Callable = _serial_map,
+        cache: Optional[_Step2Cache] = None,
+    ) -> Tuple[List[Clause], Dict[Clause, int]]:
         """Information constraints.
 
         Suppose we observe a relation p to be true between two actions
@@ -480,130 +863,82 @@ class ARMS:
         """
         if debug:
             print("\nBuilding information constraints...")
-        constraints: List[Or[Var]] = []
-        support_counts: Dict[Or[Var], int] = defaultdict(int)
-        obs_trace: List[Observation]
-        for obs_trace_i, obs_trace in enumerate(obs_tracelist):
-            for i, obs in enumerate(obs_trace):
-                if obs.state is not None and i > 0:
-                    n = i - 1
-                    if debug:
-                        print(
-                            f"\nStep {i} of observation list {obs_trace_i} contains state information."
-                        )
-                    for fluent, val in obs.state.items():
-                        relation = relations[fluent]
-                        # Information constraints only apply to true relations
-                        if val:
-                            if debug:
-                                print(
-                                    f"  Fluent {fluent} is true.\n"
-                                    f"    ({relation.var()})∈ ("
-                                    f"{' ∪ '.join([f'add_{{ {actions[obs_trace[ik].action].details()} }}' for ik in range(0,n+1) if obs_trace[ik].action in actions] )}"  # type: ignore
-                                    ")"
-                                )
-                            # I1
-                            # relation in the add list of an action <= n (i-1)
-                            i1: List[Var] = []
-                            for obs_i in obs_trace[: i - 1]:
-                                if obs_i.action in actions and obs_i.action is not None:
-                                    ai = actions[obs_i.action]
-                                    if relation.matches(ai):
-                                        i1.append(
-                                            Var(
-                                                f"{relation.var()} (BREAK) in (BREAK) add (BREAK) {ai.details()}"
-                                            )
-                                        )
-
-                            # I2
-                            # relation not in del list of action n (i-1)
-                            i2 = None
-                            a_n = obs_trace[i - 1].action
-                            if a_n in actions and a_n is not None:
-                                i2 = Var(
-                                    f"{relation.var()} (BREAK) in (BREAK) del (BREAK) {actions[a_n].details()}"
-                                ).negate()
-
-                            if i1:
-                                constraints.append(Or(i1))
-                            if i2:
-                                constraints.append(Or([i2]))
-
-                            # I3
-                            # count occurences
-                            if (
-                                i < len(obs_trace) - 1
-                                and obs.action in actions
-                                and obs.action is not None  # for the linter
-                                and relation.matches(actions[obs.action])
-                            ):
-                                # corresponding constraint is related to the current action's precondition list
-                                support_counts[
-                                    Or(
-                                        [
-                                            Var(
-                                                f"{relation.var()} (BREAK) in (BREAK) pre (BREAK) {actions[obs.action].details()}"
-                                            )
-                                        ]
-                                    )
-                                ] += 1
-                            elif (
-                                a_n in actions
-                                and a_n is not None
-                                and relation.matches(actions[a_n])
-                            ):
-                                # corresponding constraint is related to the previous action's add list
-                                support_counts[
-                                    Or(
-                                        [
-                                            Var(
-                                                f"{relation.var()} (BREAK) in (BREAK) add (BREAK) {actions[a_n].details()}"
-                                            )
-                                        ]
-                                    )
-                                ] += 1
-
+        if variables is None:
+            variables = ARMSVariables(relations.values(), actions.values())
+        units = range(len(obs_tracelist))
+        if cache is not None:
+            units = [i for i in units if i not in cache.info]
+        results = mapper(
+            _trace_info_constraints,
+            list(units),
+            [obs_tracelist[i] for i in units],
+            repeat(relations),
+            repeat(actions),
+            repeat(variables),
+            repeat(debug),
+        )
+        if cache is None:
+            trace_results = results
+        else:
+            for i, result in zip(units, results):
+                cache.info[i] = result
+                cache.trace_actions[i] = {
+                    actions[obs.action]
+                    for obs in obs_tracelist[i]
+                    if obs.action is not None and obs.action in actions
+                }
+            trace_results = [cache.info[i] for i in range(len(obs_tracelist))]
+
+        constraints: List[Clause] = []
+        support_counts: Dict[Clause, int] = defaultdict(int)
+        for trace_constraints, trace_counts in trace_results:
+            constraints.extend(trace_constraints)
+            for constraint, count in trace_counts.items():
+                support_counts[constraint] += count
         return constraints, support_counts
 
     @staticmethod
     def _apriori(
         action_lists: List[List[LearnedAction]], minsup: int
     ) -> Dict[Tuple[LearnedAction, LearnedAction], int]:
-        """An implementation of the Apriori algorithm to find frequent ordered pairs of actions."""
-        counts = Counter(
-            [action for action_list in action_lists for action in action_list]
-        )
-        # L1 = {actions that appear >minsup}
-        L1 = set(
-            frozenset([action])
-            for action in filter(lambda k: counts[k] >= minsup, counts.keys())
-        )  # large 1-itemsets
-
-        # Only going up to L2, so no loop or generalized algorithm needed
-        # apriori-gen step
-        C2 = set([i.union(j) for i in L1 for j in L1 if len(i.union(j)) == 2])
-        # Since L1 contains 1-itemsets where each item is frequent, C2 can
-        # only contain valid sets and pruning is not required
-
-        # Get all possible ordered action pairs
-        C2_ordered = set()
-        for pair in C2:
-            pair = list(pair)
-            C2_ordered.add((pair[0], pair[1]))
-            C2_ordered.add((pair[1], pair[0]))
-
-        # Count pair occurences and generate L2
+        """An implementation of the Apriori algorithm to find frequent ordered pairs of actions.
+
+        The support of an ordered pair (ai, aj) is the number of occurrences of
+        ai that are followed by aj later in the same action list. It is counted
+        in one pass per list: aj follows the occurrences of ai before the last
+        occurrence of aj, so the supports of every pair ending in aj are the
+        action counts of the list prefix up to it.
+        """
+        ids: Dict[LearnedAction, int] = {}
+        id_lists = [
+            np.array([ids.setdefault(a, len(ids)) for a in action_list], dtype=np.int64)
+            for action_list in action_lists
+        ]
+        n = len(ids)
+        actions = list(ids)
+
+        # L1 = {actions that appear >minsup} (large 1-itemsets)
+        counts = np.zeros(n, dtype=np.int64)
+        for action_ids in id_lists:
+            counts += np.bincount(action_ids, minlength=n)
+        frequent = np.flatnonzero(counts >= minsup)
+
+        # Only going up to L2, so no loop or generalized algorithm needed.
+        # pair_counts[i, j] is the support of (actions[i], actions[j])
+        pair_counts = np.zeros((n, n), dtype=np.int64)
+        for action_ids in id_lists:
+            last = np.full(n, -1, dtype=np.int64)
+            np.maximum.at(last, action_ids, np.arange(len(action_ids)))
+            for j in np.flatnonzero(last > 0):
+                pair_counts[:, j] += np.bincount(action_ids[: last[j]], minlength=n)
+
+        # Since L1 contains 1-itemsets where each item is frequent, the
+        # candidate pairs are the ordered pairs of distinct frequent actions
         frequent_pairs = {}
-        for ai, aj in C2_ordered:
-            count = 0
-            for action_list in action_lists:
-                a1_indecies = [i for i, e in enumerate(action_list) if e == ai]
-                if a1_indecies:
-                    for i in a1_indecies:
-                        if aj in action_list[i + 1 :]:
-                            count += 1
-            if count >= minsup:
-                frequent_pairs[(ai, aj)] = count
+        for i in frequent.tolist():
+            for j in frequent.tolist():
+                if i != j and pair_counts[i, j] >= minsup:
+                    frequent_pairs[(actions[i], actions[j])] = int(pair_counts[i, j])
 
         return frequent_pairs
 
@@ -615,7 +950,9 @@ class ARMS:
         relations: Set[Relation],
         min_support: int,
         debug: bool,
-    ) -> Dict[Or[Var], int]:
+        variables: Optional[ARMSVariables] = None,
+        cache: Optional[_Step2Cache] = None,
+    ) -> Dict[Clause, int]:
         """Plan constraints.
 
         P1. Every precondition \(p\) of every action \(b\) must be in the add
@@ -665,38 +1002,56 @@ class ARMS:
             print("Frequent pairs:")
             print(frequent_pairs)
 
-        # constraints: Dict[And[Or[Var]], int] = {}
-        constraints: Dict[Or[Var], int] = {}
+        if variables is None:
+            variables = ARMSVariables(relations, connected_actions)
+        constraints: Dict[Clause, int] = {}
         for ai, aj in frequent_pairs.keys():
-            connectors = set()
-            # get list of relevant relations from connected_actions
-            if ai in connected_actions and aj in connected_actions[ai]:
-                connectors.update(connected_actions[ai][aj])
-            if aj in connected_actions and ai in connected_actions[aj]:
-                connectors.update(connected_actions[aj][ai])
-
-            # if the actions are not related they are not a valid pair for a plan constraint.
-            if not connectors:
-                continue
-
-            # for each relation, save constraint
-            relevant_relations = {p for p in relations if connectors.issubset(p.types)}
-            # relation_constraints: List[Or[And[Var]]] = []
-            relation_constraints: List[Var] = []
-            for relation in relevant_relations:
-                relation_constraints.append(
-                    Var(
-                        f"{relation.var()} (BREAK) relevant (BREAK) {ai.details()} (BREAK) {aj.details()}"
-                    )
+            if cache is not None and (ai, aj) in cache.plan:
+                constraint = cache.plan[(ai, aj)]
+            else:
+                constraint = ARMS._plan_constraint(
+                    ai, aj, connected_actions, relations, variables, debug
                 )
-                if debug:
-                    print(
-                        f"{relation.var()} might explain action pair ({ai.details()}, {aj.details()})"
-                    )
-            constraints[Or(relation_constraints)] = frequent_pairs[(ai, aj)]
+                if cache is not None:
+                    cache.plan[(ai, aj)] = constraint
+            if constraint is not None:
+                constraints[constraint] = frequent_pairs[(ai, aj)]
 
         return constraints
 
+    @staticmethod
+    def _plan_constraint(
+        ai: LearnedAction,
+        aj: LearnedAction,
+        connected_actions: Dict[LearnedAction, Dict[LearnedAction, Set]],
+        relations: Set[Relation],
+        variables: ARMSVariables,
+        debug: bool,
+    ) -> Optional[Clause]:
+        """Builds the plan constraint of an action pair, or None if the actions
+        are not related."""
+        connectors = set()
+        # get list of relevant relations from connected_actions
+        if ai in connected_actions and aj in connected_actions[ai]:
+            connectors.update(connected_actions[ai][aj])
+        if aj in connected_actions and ai in connected_actions[aj]:
+            connectors.update(connected_actions[aj][ai])
+
+        # if the actions are not related they are not a valid pair for a plan constraint.
+        if not connectors:
+            return None
+
+        # for each relation, save constraint
+        relevant_relations = {p for p in relations if connectors.issubset(p.types)}
+        relation_constraints: List[int] = []
+        for relation in relevant_relations:
+            relation_constraints.append(variables.relevance(relation, ai, aj))
+            if debug:
+                print(
+                    f"{relation.var()} might explain action pair ({ai.details()}, {aj.details()})"
+                )
+        return _clause(*relation_constraints)
+
     @staticmethod
     def step3(
         constraints: ARMSConstraints,
@@ -725,9 +1080,10 @@ class ARMS:
             constraints.action + constraints.info + info3_constraints + plan_constraints
         )
 
-        constraints_w_weights: Dict[Or[Var], int] = {}
+        constraints_w_weights: Dict[Clause, int] = {}
         for constraint, weight in zip(all_constraints, all_weights):
-            if constraint == nnffalse:
+            # an empty clause is false
+            if not constraint:
                 continue
             if constraint not in constraints_w_weights:
                 constraints_w_weights[constraint] = weight
@@ -740,10 +1096,15 @@ class ARMS:
                     weight, constraints_w_weights[constraint]
                 )
 
-        problem: And[Or[Var]] = And(list(constraints_w_weights.keys()))
-        weights = list(constraints_w_weights.values())
-
-        wcnf, decode = to_wcnf(problem, weights)
+        wcnf = WCNF()
+        decode: Dict[int, Hashable] = {}
+        variables = constraints.variables
+        for constraint, weight in constraints_w_weights.items():
+            wcnf.append(list(constraint), weight=weight)
+            for literal in constraint:
+                var = abs(literal)
+                if var not in decode:
+                    decode[var] = variables[var]
         return wcnf, decode
 
     @staticmethod
@@ -757,6 +1118,9 @@ class ARMS:
         # denominator. My best interpretation is then to use the max support
         # count as the denominator to calculate the support rate.
 
+        if not support_counts:
+            # e.g. no frequent pairs are left once their actions are learned
+            return []
         z_sigma_p = max(support_counts)
 
         def get_support_rate(count):
@@ -766,19 +1130,26 @@ class ARMS:
         return list(map(get_support_rate, support_counts))
 
     @staticmethod
-    def step4(max_sat: WCNF, decode: Dict[int, Hashable]) -> Dict[Hashable, bool]:
-        """(Step 4) Solve the MAX-SAT problem built in Step 3."""
-        solver = RC2(max_sat)
-
-        encoded_model = solver.compute()
-
-        if not isinstance(encoded_model, list):
-            # should never be reached
-            raise InvalidMaxSATModel(encoded_model)
+    def step4(
+        max_sat: WCNF,
+        decode: Dict[int, Hashable],
+        solver: Optional[Union[MaxSATSolver, IncrementalMaxSAT]] = None,
+    ) -> Dict[Hashable, bool]:
+        """(Step 4) Solve the MAX-SAT problem built in Step 3.
+
+        If an incremental `solver` is given, the problem is solved as an update
+        of the one it solved last.
+        """
+        if solver is None:
+            solver = MaxSATSolver()
+        encoded_model = solver.solve(max_sat)
 
-        # decode the model (back to nnf vars)
+        # decode the model (back to propositions), skipping the variables of
+        # the pool that no constraint uses
         model: Dict[Hashable, bool] = {
-            decode[abs(clause)]: clause > 0 for clause in encoded_model
+            decode[abs(literal)]: literal > 0
+            for literal in encoded_model
+            if abs(literal) in decode
         }
 
         return model
@@ -790,7 +1161,8 @@ class ARMS:
         debug: bool,
     ):
         """(Step 5) Extract the learned action effects from the solved model."""
-        action_map = {a.details(): a for a in actions}
+        # propositions refer to equal, but not necessarily the same, actions
+        action_map = {a: a for a in actions}
         negative_constraints = defaultdict(set)
         plan_constraints: List[Tuple[str, LearnedAction, LearnedAction]] = []
 
@@ -799,12 +1171,10 @@ class ARMS:
         # models, however this is not a part of the paper and therefore not
         # implemented.
         for constraint, val in model.items():
-            constraint = str(constraint).split(" (BREAK) ")
-            relation = constraint[0]
-            ctype = constraint[1]  # constraint type
-            if ctype == "in":
-                effect = constraint[2]
-                action = action_map[constraint[3]]
+            relation = constraint.relation.var()
+            if isinstance(constraint, Membership):
+                effect = constraint.role
+                action = action_map[constraint.action]
                 if debug:
                     print(
                         f"Learned constraint: {relation} in {effect}_{action.details()}"
@@ -831,8 +1201,8 @@ class ARMS:
                     negative_constraints[(relation, action)].add(effect)
 
             else:  # store plan constraint
-                ai = action_map[constraint[2]]
-                aj = action_map[constraint[3]]
+                ai = action_map[constraint.first]
+                aj = action_map[constraint.second]
                 plan_constraints.append((relation, ai, aj))
                 if debug:
                     print(f"{relation} possibly explains action pair ({ai}, {aj})")
@@ -19,6 +19,13 @@ class InvalidMaxSATModel(Exception):
         super().__init__(message)
 
 
+class MaxSATTimeout(Exception):
+    def __init__(self, timeout, message=None):
+        if message is None:
+            message = f"The MAX-SAT solver found no model within the time limit of {timeout} seconds."
+        super().__init__(message)
+
+
 class ConstraintContradiction(Exception):
     def __init__(self, relation, effect, action, message=None):
         if message is None:
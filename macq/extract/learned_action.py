@@ -25,7 +25,7 @@ class LearnedAction:
 
     def __hash__(self):
         # Order of obj_params is important!
-        return hash(self.details())
+        return hash((self.name, tuple(self.obj_params)))
 
     def details(self):
         # obj_params can be either a list of strings or a list of PlanningObject depending on the token type and extraction method used to learn the action
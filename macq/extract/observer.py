@@ -1,21 +1,27 @@
 """.. include:: ../../docs/extract/observer.md"""
 
-from collections import defaultdict
-from dataclasses import dataclass
-from typing import List, Set
+from __future__ import annotations
 
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from itertools import chain
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+
 from ..observation import IdentityObservation, ObservedTraceList
+from ..trace import Action, State, StateDelta, DeltaTrace, FluentIndex, CompactState
+from ..trace.trace_arrays import state_matrix
 from . import LearnedAction, Model
 from .exceptions import IncompatibleObservationToken
 from .learned_fluent import LearnedFluent
 from .model import Model
 
 
-@dataclass
-class DeltaObservation:
-    added: Set[str]
-    deleted: Set[str]
+# The delta between a pre-state and a post-state. Shares its type with the
+# deltas stored by a `DeltaTrace`, so `DeltaTrace.get_delta` can be used in
+# place of `Observer.get_delta` when the trace is available.
+DeltaObservation = StateDelta
 
 
 class Observer:
@@ -31,73 +37,39 @@ class Observer:
     that changed state from a pre-state to a post-state of an action. Add this
     effects are fluents that went from False to True, delete effects are
     fluents that went from True to False.
+
+    To keep a model up to date as traces arrive, use `IncrementalObserver`.
     """
 
-    def __new__(cls, obs_tracelist: ObservedTraceList, **kwargs):
+    def __new__(cls, obs_tracelist: ObservedTraceList, workers: int = None, **kwargs):
         """Creates a new Model object.
 
         Args:
             observations (ObservationList):
                 The state observations to extract the model from.
+            workers (int):
+                Optional; The number of processes to observe the traces with.
+                The traces are split into contiguous shards whose partial
+                models are merged, which gives the same model as observing
+                them in this process. Defaults to None (observe in this
+                process).
         Raises:
             IncompatibleObservationToken:
                 Raised if the observations are not identity observation.
         """
         if obs_tracelist.type is not IdentityObservation:
             raise IncompatibleObservationToken(obs_tracelist.type, Observer)
-        fluents = Observer._get_fluents(obs_tracelist)
-        actions = Observer._get_actions(obs_tracelist)
-        return Model(fluents, actions)
-
-    @staticmethod
-    def _get_fluents(obs_tracelist: ObservedTraceList):
-        """Retrieves the set of fluents in the observations."""
-        fluents = set()
-        obs_trace: List[IdentityObservation]
-        for obs_trace in obs_tracelist:
-            for obs in obs_trace:
-                # Update fluents with the fluents in this observation
-                fluents.update(
-                    LearnedFluent(f.name, [o.details() for o in f.objects])
-                    for f in obs.state.keys()
-                )
-        return fluents
-
-    @staticmethod
-    def _get_actions(obs_tracelist: ObservedTraceList):
-        """Retrieves and augments the set of actions in the observations."""
-        # Get the unique actions and the relevant traces
-        action_obs = defaultdict(list)
-        obs_trace: List[IdentityObservation]
-        for obs_trace in obs_tracelist:
-            for obs in obs_trace:
-                action = obs.action
-                if action:  # Final step has no action
-                    action_obs[action].append(obs_trace)
-
-        action_pre_states = defaultdict(set)
-        # Get transitions for each action
-        action_transitions = obs_tracelist.get_all_transitions()
-        for action, transitions in action_transitions.items():
-            # Create a LearnedAction for the current action
-            model_action = LearnedAction(
-                action.name, action.obj_params, cost=action.cost
-            )
-
-            for pre, post in transitions:
-                # Add all action pre-states to a set
-                action_pre_states[model_action].add(pre.state)
-                # Update the action's effects
-                delta = Observer.get_delta(pre.state, post.state)
-                model_action.update_add({str(f) for f in delta.added})
-                model_action.update_delete({str(f) for f in delta.deleted})
+        if workers is None or workers == 1:
+            observer = IncrementalObserver()
+            observer.update_traces(obs_tracelist)
+            return observer.model()
 
-        for action, pre_states in action_pre_states.items():
-            # Find the (positive) intersection of the pre-states
-            precond = set.intersection(*map(Observer._filter_positive, pre_states))
-            action.update_precond({str(f) for f in precond})
-
-        return {action for action in action_pre_states}
+        traces = list(obs_tracelist)
+        size = max(1, -(-len(traces) // workers))
+        shards = [traces[i : i + size] for i in range(0, len(traces), size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            partials = list(pool.map(_observe_shard, shards))
+        return IncrementalObserver().merge(*partials).model()
 
     @staticmethod
     def get_delta(pre: dict, post: dict):
@@ -115,6 +87,17 @@ class Observer:
             state and True in `other`. The deleted set contains the list of
             fluents that were True in this state and False in `other`.
         """
+        if (
+            isinstance(pre, CompactState)
+            and isinstance(post, CompactState)
+            and pre.index is post.index
+        ):
+            fluents_of = pre.index.fluents_of
+            pre_true, post_true = pre.true_mask, post.true_mask
+            return DeltaObservation(
+                set(fluents_of(post_true & ~pre_true & pre.keys_mask)),
+                set(fluents_of(pre_true & ~post_true)),
+            )
         added = set()
         deleted = set()
         for f in pre:
@@ -127,8 +110,302 @@ class Observer:
     @staticmethod
     def _filter_positive(state):
         """Returns the set of true fluents in a state."""
-        true_fluents = set()
-        for fluent, is_true in state.items():
-            if is_true:
-                true_fluents.add(fluent)
-        return true_fluents
+        if isinstance(state, CompactState):
+            return set(state.index.fluents_of(state.true_mask))
+        return {fluent for fluent, is_true in state.items() if is_true}
+
+
+def _observe_shard(traces: List[List[IdentityObservation]]) -> IncrementalObserver:
+    """Observes a shard of traces, in a worker process."""
+    observer = IncrementalObserver()
+    observer.update_traces(traces)
+    return observer
+
+
+def _row_masks(matrix: np.ndarray) -> List[int]:
+    """Packs each row of a boolean matrix into a bitset."""
+    packed = np.packbits(matrix, axis=1, bitorder="little")
+    return [int.from_bytes(row.tobytes(), "little") for row in packed]
+
+
+@dataclass
+class _ActionMasks:
+    """The running observer statistics of an action, as fluent bitsets.
+
+    Attributes:
+        action (Action):
+            The first observed occurrence of the action.
+        precond (int):
+            The fluents true in every pre-state of the action.
+        add (int):
+            The fluents that went from false to true in some transition.
+        delete (int):
+            The fluents that went from true to false in some transition.
+        count (int):
+            The number of transitions of the action.
+    """
+
+    action: Action
+    precond: int
+    add: int = 0
+    delete: int = 0
+    count: int = 0
+
+
+class IncrementalObserver:
+    """Observer model extraction that consumes observations as they arrive.
+
+    Rather than keeping the observations, the observer keeps, for every action,
+    the intersection of the true fluents of its pre-states and the unions of
+    its add and delete effects as bitsets over a `FluentIndex`, and updates
+    them one transition at a time. `model` builds the same model `Observer`
+    extracts from all the observations seen so far.
+
+    Observers of separate shards of the observations can be merged into the
+    observer of all of them, so shards can be observed by separate processes
+    (or machines, as observers can be pickled) and combined afterwards.
+
+    Attributes:
+        fluent_index (FluentIndex):
+            The fluent table the bitsets refer to.
+    """
+
+    def __init__(self, fluent_index: FluentIndex = None):
+        """Initializes an IncrementalObserver with no observations.
+
+        Args:
+            fluent_index (FluentIndex):
+                Optional; The fluent table to use. Passing the table shared by
+                the compact states of the observations lets their bitsets be
+                used as they are. Defaults to a new table.
+        """
+        self.fluent_index = fluent_index if fluent_index is not None else FluentIndex()
+        # the fluents observed in any state
+        self._observed = 0
+        self._actions: Dict[Action, _ActionMasks] = {}
+
+    def _masks(self, state: State) -> Tuple[int, int]:
+        """The bitsets of the fluents present and true in a state."""
+        if isinstance(state, CompactState) and state.index is self.fluent_index:
+            keys, true = state.keys_mask, state.true_mask
+        else:
+            keys = true = 0
+            add = self.fluent_index.add
+            for f, v in state.items():
+                bit = 1 << add(f)
+                keys |= bit
+                if v:
+                    true |= bit
+        self._observed |= keys
+        return keys, true
+
+    def update_transition(self, pre: State, action: Action, post: State):
+        """Updates the model with a single transition.
+
+        Args:
+            pre (State):
+                The state before the action.
+            action (Action):
+                The action taken.
+            post (State):
+                The state after the action.
+        """
+        pre_keys, pre_true = self._masks(pre)
+        post_true = self._masks(post)[1]
+        self._update_group(
+            action,
+            pre_true,
+            post_true & ~pre_true & pre_keys,
+            pre_true & ~post_true,
+            1,
+        )
+
+    def _update_group(
+        self, action: Action, precond: int, add: int, delete: int, count: int
+    ):
+        masks = self._actions.get(action)
+        if masks is None:
+            masks = self._actions[action] = _ActionMasks(action, precond)
+        masks.precond &= precond
+        masks.add |= add
+        masks.delete |= delete
+        masks.count += count
+
+    def update(self, trace: Iterable):
+        """Updates the model with the transitions of a trace.
+
+        Args:
+            trace (Iterable):
+                The observations of the trace, in order, such as a list of
+                `IdentityObservation`s or a `Trace`. Each element needs a
+                `state` and an `action`; the action of the last is ignored.
+                The effects of a `DeltaTrace` are read from its stored deltas
+                rather than by comparing its states.
+        """
+        self.update_traces([trace])
+
+    def _update_delta_trace(self, trace: DeltaTrace):
+        """Updates the model with the transitions of a `DeltaTrace`, using
+        `DeltaTrace.get_delta` for the effects of each action."""
+        mask = self.fluent_index.mask
+        last = len(trace) - 1
+        for i, step in enumerate(trace):
+            pre_keys, pre_true = self._masks(step.state)
+            if i == last or step.action is None:
+                continue
+            delta = trace.get_delta(i)
+            # as in `update_transition`: added fluents that were present, and
+            # true fluents that became false, unknown or absent
+            self._update_group(
+                step.action,
+                pre_true,
+                mask(delta.added) & pre_keys,
+                mask(chain(delta.deleted, delta.unknown, delta.removed)) & pre_true,
+                1,
+            )
+
+    def update_traces(self, traces: Iterable[Iterable], chunk_size: int = 4096):
+        """Updates the model with the transitions of several traces at once.
+
+        The states of the traces are stacked into boolean matrices, so that
+        the effects of every transition (add = not pre and post, delete = pre
+        and not post) and the per-action reductions (an AND over the pre-states
+        for the preconditions, an OR over the transitions for the effects) run
+        as NumPy array operations rather than per fluent.
+
+        The traces are consumed one at a time and folded into the model in
+        chunks of about `chunk_size` states (a longer trace is split between
+        chunks), so memory does not grow with the number of observations. As
+        the reductions are associative, the chunking does not change the model.
+
+        Args:
+            traces (Iterable[Iterable]):
+                The traces, each as accepted by `update`.
+            chunk_size (int):
+                Optional; The number of states to stack at a time. Defaults to
+                4096.
+        """
+        states, actions = [], []
+        for trace in traces:
+            if isinstance(trace, DeltaTrace):
+                self._update_delta_trace(trace)
+                continue
+            steps = list(trace)
+            if not steps:
+                continue
+            # windows of chunk_size transitions, sharing their boundary state
+            for start in range(0, max(len(steps) - 1, 1), chunk_size):
+                window = steps[start : start + chunk_size + 1]
+                states.extend(obs.state for obs in window)
+                actions.extend(obs.action for obs in window[:-1])
+                # no transition from the last state of a window to the next one
+                actions.append(None)
+                if len(states) >= chunk_size:
+                    self._update_chunk(states, actions)
+                    states, actions = [], []
+        self._update_chunk(states, actions)
+
+    def _update_chunk(self, states: List[State], actions: List[Action]):
+        """Folds stacked states into the model, where `actions[i]` is the action
+        taken in `states[i]`, or None if there is no transition from it."""
+        if not states:
+            return
+
+        index = self.fluent_index
+        present = state_matrix(states, index, select="present")
+        true = state_matrix(states, index, select="true")
+        self._observed |= _row_masks(present.any(axis=0)[None, :])[0]
+
+        vocabulary: Dict[Action, int] = {}
+        ids = np.array(
+            [
+                -1 if a is None else vocabulary.setdefault(a, len(vocabulary))
+                for a in actions
+            ],
+            dtype=np.int64,
+        )[:-1]
+        transitions = np.flatnonzero(ids >= 0)
+        if not len(transitions):
+            return
+        # the transitions of each action, in contiguous runs
+        order = transitions[np.argsort(ids[transitions], kind="stable")]
+        pre, post = true[order], true[order + 1]
+        run_ids = ids[order]
+        starts = np.flatnonzero(np.r_[True, run_ids[1:] != run_ids[:-1]])
+        counts = np.diff(np.r_[starts, len(order)])
+
+        precond = np.logical_and.reduceat(pre, starts, axis=0)
+        add = np.logical_or.reduceat(post & ~pre & present[order], starts, axis=0)
+        delete = np.logical_or.reduceat(pre & ~post, starts, axis=0)
+
+        vocabulary_list = list(vocabulary)
+        for action_id, p, a, d, n in zip(
+            run_ids[starts].tolist(),
+            _row_masks(precond),
+            _row_masks(add),
+            _row_masks(delete),
+            counts.tolist(),
+        ):
+            self._update_group(vocabulary_list[action_id], p, a, d, n)
+
+    def _translator(self, other: IncrementalObserver) -> Callable[[int], int]:
+        """A function translating bitsets over the fluent table of `other` to
+        bitsets over this one."""
+        theirs = other.fluent_index.fluents
+        # a prefix of the table needs no translation, as positions never change
+        if theirs == self.fluent_index.fluents[: len(theirs)]:
+            return lambda mask: mask
+        return lambda mask: self.fluent_index.mask(other.fluent_index.fluents_of(mask))
+
+    def merge(self, *others: IncrementalObserver) -> IncrementalObserver:
+        """Merges observers of separate observations.
+
+        Merging is associative, and the merged observer holds the same
+        statistics as a single observer updated with the observations of every
+        merged observer. The representative occurrence of each action is taken
+        from the first observer that saw it, so merging shards in their order
+        gives exactly the model of observing them in one process.
+
+        Args:
+            *others (IncrementalObserver):
+                The observers to merge with this one, in order.
+
+        Returns:
+            A new `IncrementalObserver`; the merged observers are not changed.
+        """
+        merged = IncrementalObserver(FluentIndex(self.fluent_index))
+        for observer in (self, *others):
+            remap = merged._translator(observer)
+            merged._observed |= remap(observer._observed)
+            for masks in observer._actions.values():
+                merged._update_group(
+                    masks.action,
+                    remap(masks.precond),
+                    remap(masks.add),
+                    remap(masks.delete),
+                    masks.count,
+                )
+        return merged
+
+    def model(self) -> Model:
+        """Builds the model of the observations seen so far.
+
+        Returns:
+            The extracted `Model`.
+        """
+        fluents_of = self.fluent_index.fluents_of
+        fluents = {
+            LearnedFluent(f.name, [o.details() for o in f.objects])
+            for f in fluents_of(self._observed)
+        }
+        actions = set()
+        for masks in self._actions.values():
+            action = masks.action
+            model_action = LearnedAction(
+                action.name, action.obj_params, cost=action.cost
+            )
+            model_action.update_precond({str(f) for f in fluents_of(masks.precond)})
+            model_action.update_add({str(f) for f in fluents_of(masks.add)})
+            model_action.update_delete({str(f) for f in fluents_of(masks.delete)})
+            actions.add(model_action)
+        return Model(fluents, actions)
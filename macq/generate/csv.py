@@ -1,7 +1,14 @@
+import csv
+from itertools import islice
+from typing import Dict, Iterator, Tuple
+import numpy as np
+
 # from ..trace import (
 from macq.trace import (
     Action,
     Fluent,
+    FluentIndex,
+    CompactState,
     State,
     Step,
     Trace,
@@ -9,7 +16,121 @@ from macq.trace import (
 )
 
 
-def load(fname: str, act_col: str, plan_id_col: str = None):
+def _read_plans(
+    fname: str,
+    act_col: str,
+    plan_id_col: str = None,
+    fluent_index: FluentIndex = None,
+    chunk_size: int = 10000,
+) -> Iterator[Tuple[str, Trace]]:
+    """Reads a trace file chunk by chunk, yielding each run of consecutive rows
+    with the same plan ID as a trace, along with the plan ID."""
+    with open(fname, "r", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+
+        assert act_col in header, f"'{act_col}' not in header"
+        if plan_id_col is None:
+            # every row belongs to the same plan
+            plan_id_col = "plan_id"
+            plan_i = None
+        else:
+            assert plan_id_col in header, f"'{plan_id_col}' not in header"
+            plan_i = header.index(plan_id_col)
+        act_i = header.index(act_col)
+
+        # parse the header (and build the fluents) once
+        fluent_cols = [
+            i for i, h in enumerate(header) if h not in [act_col, plan_id_col]
+        ]
+        fluents = [Fluent(header[i], []) for i in fluent_cols]
+        actions: Dict[str, Action] = {}
+        if fluent_index is not None:
+            positions = [fluent_index.add(fl) for fl in fluents]
+            width = len(fluent_index)
+            keys = fluent_index.mask(fluents)
+
+        plan_id, trace = None, None
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                break
+            # cells past the end of the header are ignored
+            chunk = [row[: len(header)] for row in rows if row]
+            if not chunk:
+                continue
+            for row in chunk:
+                assert len(row) == len(header), "Rows should not be shorter than the header"
+            cells = np.array(chunk)
+            values = cells[:, fluent_cols]
+            bits = values == "1"
+            assert np.all(bits | (values == "0")), "Fluent columns should be 0 or 1"
+
+            if fluent_index is not None:
+                wide = np.zeros((len(chunk), width), dtype=bool)
+                wide[:, positions] = bits
+                packed = np.packbits(wide, axis=1, bitorder="little")
+                true_masks = [int.from_bytes(r.tobytes(), "little") for r in packed]
+                states = (
+                    CompactState(fluent_index, keys=keys, true=t, false=keys & ~t)
+                    for t in true_masks
+                )
+            else:
+                states = (State(dict(zip(fluents, r))) for r in bits.tolist())
+
+            plan_ids = cells[:, plan_i].tolist() if plan_i is not None else None
+            for i, (state, row) in enumerate(zip(states, chunk)):
+                row_plan = plan_ids[i] if plan_ids is not None else 0
+                if trace is None or row_plan != plan_id:
+                    if trace is not None:
+                        yield plan_id, trace
+                    plan_id, trace = row_plan, Trace()
+                name = row[act_i]
+                act = actions.get(name)
+                if act is None:
+                    act = actions[name] = Action(name, [])
+                trace.append(Step(state, act, len(trace)))
+
+        if trace is not None:
+            yield plan_id, trace
+
+
+def iter_traces(
+    fname: str,
+    act_col: str,
+    plan_id_col: str = None,
+    fluent_index: FluentIndex = None,
+    chunk_size: int = 10000,
+) -> Iterator[Trace]:
+    """Streams the traces of a CSV trace file, one plan at a time.
+
+    The file is read in chunks of rows, so memory use does not grow with the
+    size of the file. Rows of the same plan are expected to be consecutive; a
+    plan ID that reappears later in the file starts a new trace. The CSV file
+    should have the same properties as for `load`.
+
+    Args:
+        fname (str):
+            The name of the trace file to load.
+        act_col (str):
+            The name of the column in the trace file that contains the action names.
+        plan_id_col (str, optional):
+            The name of the column in the trace file that contains the plan ID.
+            Defaults to None.
+        fluent_index (FluentIndex, optional):
+            If provided, the states are built as `CompactState`s over this
+            fluent table. Defaults to None.
+        chunk_size (int, optional):
+            The number of rows to parse at a time. Defaults to 10000.
+
+    Returns:
+        An iterator over the traces, in the order of the file.
+    """
+    for _, trace in _read_plans(fname, act_col, plan_id_col, fluent_index, chunk_size):
+        yield trace
+
+
+def load(fname: str, act_col: str, plan_id_col: str = None, compact: bool = False):
     """Loads a trace file as a CSV into a `TraceList`.
 
     The CSV file should have the following properties:
@@ -26,55 +147,26 @@ def load(fname: str, act_col: str, plan_id_col: str = None):
         plan_id_col (str, optional):
             The name of the column in the trace file that contains the plan ID.
             Defaults to None.
+        compact (bool, optional):
+            Whether to store the states as `CompactState`s over the trace list's
+            `fluent_index`. Defaults to False.
 
     Returns:
         `TraceList`:
             The loaded trace list.
     """
-    with open(fname, "r") as f:
-        lines = [l.strip().split(",") for l in f.readlines()]
-
-    # Make sure we have at least one plan specified
-    if plan_id_col is None:
-        plan_id_col = "plan_id"
-        lines[0].append(plan_id_col)
-        for i in range(1, len(lines)):
-            lines[i].append(0)
-
-    assert act_col in lines[0], f"'{act_col}' not in header"
-    assert plan_id_col in lines[0], f"'{plan_id_col}' not in header"
-
-    # Turn the csv into a list of dictionaries with the header row as keys
-    data = [dict(zip(lines[0], line)) for line in lines[1:]]
-
-    # Assert all data outside of the action column is 0 or 1
-    for line in data:
-        for key in line:
-            if key not in [plan_id_col, act_col]:
-                assert line[key] in ["0", "1"], "Fluent columns should be 0 or 1"
-
-    # Separate the data based on the plan ID
-    plans = {}
-
-    for line in data:
-        if line[plan_id_col] not in plans:
-            plans[line[plan_id_col]] = []
-        plans[line[plan_id_col]].append(line)
-
-    # Turn the plan data into a list of traces
-    traces = TraceList()
-    for plan_id in plans:
-        trace = Trace()
-        for i, bitvec in enumerate(plans[plan_id]):
-            state = State(
-                {
-                    Fluent(f, []): bitvec[f] == "1"
-                    for f in bitvec
-                    if f not in [act_col, plan_id_col]
-                }
-            )
-            act = Action(bitvec[act_col], [])
-            step = Step(state, act, i)
-            trace.append(step)
-        traces.append(trace)
+    traces = TraceList(fluent_index=FluentIndex() if compact else None)
+    plans: Dict[str, Trace] = {}
+    for plan_id, trace in _read_plans(
+        fname, act_col, plan_id_col, traces.fluent_index
+    ):
+        if plan_id in plans:
+            # the rows of a plan were not consecutive
+            existing = plans[plan_id]
+            for step in trace:
+                step.index = len(existing)
+                existing.append(step)
+        else:
+            plans[plan_id] = trace
+            traces.append(trace)
     return traces
@@ -38,6 +38,7 @@ class FDRandomWalkSampling(VanillaSampling):
         init_h: int = None,
         num_traces: int = 1,
         seed: int = None,
+        compact_states: bool = False,
     ):
         """
         Initializes a the fd random walk sampler.
@@ -59,6 +60,8 @@ class FDRandomWalkSampling(VanillaSampling):
                 The number of traces to generate. Defaults to 1.
             seed (int):
                 The seed for the random number generator.
+            compact_states (bool):
+                Option to generate states in the compact (bitset) representation.
         """
 
         super().__init__(
@@ -67,6 +70,7 @@ class FDRandomWalkSampling(VanillaSampling):
             problem_id=problem_id,
             observe_pres_effs=observe_pres_effs,
             ignore_static_fluents=ignore_static_fluents,
+            compact_states=compact_states,
             num_traces=num_traces,
             seed=seed,
             max_time=max_time,
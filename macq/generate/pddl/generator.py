@@ -23,7 +23,17 @@ from tarski.util import SymbolIndex
 
 from .planning_domains_api import get_problem, get_plan
 from ..plan import Plan
-from ...trace import Action, State, PlanningObject, Fluent, Trace, Step
+from ...trace import (
+    Action,
+    State,
+    PlanningObject,
+    Fluent,
+    Trace,
+    Step,
+    FluentIndex,
+    CompactState,
+    InternPool,
+)
 
 
 class PlanningDomainsAPIError(Exception):
@@ -65,6 +75,12 @@ class Generator:
             The grounded instance of the problem.
         grounded_fluents (list):
             A list of all grounded (macq) fluents extracted from the given problem definition.
+        pool (InternPool):
+            The registry of canonical objects and fluents used by this generator, so that
+            every state and action refers to one instance per fluent.
+        fluent_index (FluentIndex | None):
+            The fluent table shared by the generated states, if states are generated in
+            the compact representation.
         op_dict (dict):
             The problem's ground operators, formatted to a dictionary for easy access during plan generation.
         observe_pres_effs (bool):
@@ -77,8 +93,9 @@ class Generator:
         prob: str = None,
         problem_id: int = None,
         observe_pres_effs: bool = False,
-        ignore_static_fluents: bool = True # defaults to true to not break any pre-implemented scripts that
+        ignore_static_fluents: bool = True, # defaults to true to not break any pre-implemented scripts that
            # did not consider this argument.
+        compact_states: bool = False,
     ):
         """Creates a basic PDDL state trace generator. Takes either the raw filenames
         of the domain and problem or a problem ID.
@@ -93,6 +110,9 @@ class Generator:
             observe_pres_effs (bool):
                 Option to observe action preconditions and effects upon generation.
             ignore_static_fluents (bool): option to ignore static fluents when generating traces. (default: True)
+            compact_states (bool):
+                Option to generate states as `CompactState`s over a single shared fluent table
+                instead of a `dict` of every grounded fluent per state.
         """
         # get attributes
         self.ignore_static_fluents = ignore_static_fluents
@@ -111,11 +131,16 @@ class Generator:
             reader.parse_domain_string(dom)
             self.problem = reader.parse_instance_string(prob)
         self.lang = self.problem.language
+        self.pool = InternPool()
         # ground the problem
         operators = ground_problem_schemas_into_plain_operators(self.problem)
         self.instance = GroundForwardSearchModel(self.problem, operators)
         self.grounded_fluents = self.__get_all_grounded_fluents()
         self.op_dict = self.__get_op_dict()
+        self.fluent_index = None
+        if compact_states:
+            self.fluent_index = FluentIndex(self.grounded_fluents)
+            self.__grounded_mask = self.fluent_index.mask(self.grounded_fluents)
 
     def extract_action_typing(self):
         """Retrieves a dictionary mapping all of this problem's actions and the types
@@ -220,7 +245,8 @@ class Generator:
                 The supplied atom, defined using the tarski Atom class.
 
         Returns:
-            A fluent, defined using the macq Fluent class.
+            A fluent, defined using the macq Fluent class. Equal atoms are converted to
+            the same (canonical) fluent instance.
         """
         # ignore functions for now
         if not isinstance(atom, Atom):
@@ -231,9 +257,8 @@ class Generator:
         for term in terms:
             if isinstance(fluent_name, BuiltinPredicateSymbol):
                 fluent_name = fluent_name.value
-            objects.append(PlanningObject(term.sort.name, term.name))
-        fluent = Fluent(fluent_name, objects)
-        return fluent
+            objects.append(self.pool.planning_object(term.sort.name, term.name))
+        return self.pool.fluent(fluent_name, objects)
 
     def tarski_state_to_macq(self, tarski_state: Model):
         """Converts a state as defined by tarski to a state as defined by macq.
@@ -245,18 +270,42 @@ class Generator:
         Returns:
             A state, defined using the macq State class.
         """
+        if self.fluent_index is not None:
+            return self.__tarski_state_to_compact(tarski_state)
         state_fluents = {}
         true_fluents = set()
         for f in tarski_state.as_atoms():
             fluent = self.__tarski_atom_to_macq_fluent(f)
             # ignore functions for now
             if fluent:
-                true_fluents.add(str(fluent))
+                true_fluents.add(fluent)
         for grounded_fluent in self.grounded_fluents:
-            state_fluents[grounded_fluent] = str(grounded_fluent) in true_fluents
+            state_fluents[grounded_fluent] = grounded_fluent in true_fluents
 
         return State(state_fluents)
 
+    def __tarski_state_to_compact(self, tarski_state: Model):
+        """Converts a state as defined by tarski to a macq `CompactState` over this
+        generator's fluent table. Only the true atoms of the state are visited.
+
+        Args:
+            tarski_state (Model):
+                The supplied state, defined using the tarski Model class.
+
+        Returns:
+            A state, defined using the macq CompactState class.
+        """
+        true = 0
+        for f in tarski_state.as_atoms():
+            fluent = self.__tarski_atom_to_macq_fluent(f)
+            # ignore functions for now
+            if fluent:
+                position = self.fluent_index.positions.get(fluent)
+                if position is not None:
+                    true |= 1 << position
+        keys = self.__grounded_mask
+        return CompactState(self.fluent_index, keys=keys, true=true, false=keys & ~true)
+
     def tarski_act_to_macq(self, tarski_act: PlainOperator):
         """Converts an action as defined by tarski to an action as defined by macq.
 
@@ -39,6 +39,7 @@ class RandomGoalSampling(VanillaSampling):
         max_time: float = 30,
         observe_pres_effs: bool = False,
         ignore_static_fluents: bool = True,  # defaults to true to not break any pre-implemented scripts
+        compact_states: bool = False,
     ):
         """
         Initializes a random goal state trace sampler using the plan length, number of traces,
@@ -65,6 +66,8 @@ class RandomGoalSampling(VanillaSampling):
                 The maximum time allowed for a trace to be generated.
             observe_pres_effs (bool):
                 Option to observe action preconditions and effects upon generation.
+            compact_states (bool):
+                Option to generate states in the compact (bitset) representation.
         """
         if subset_size_perc < 0 or subset_size_perc > 1:
             raise PercentError()
@@ -79,6 +82,7 @@ class RandomGoalSampling(VanillaSampling):
             num_traces=num_traces,
             observe_pres_effs=observe_pres_effs,
             ignore_static_fluents=ignore_static_fluents,
+            compact_states=compact_states,
             max_time=max_time,
         )
 
@@ -181,7 +185,7 @@ class RandomGoalSampling(VanillaSampling):
         Returns:
             A TraceList with the generated traces.
         """
-        traces = TraceList()
+        traces = TraceList(fluent_index=self.fluent_index)
         # retrieve goals and their respective plans
         self.goals_inits_plans = self.goal_sampling()
         # iterate through all plans corresponding to the goals, generating traces
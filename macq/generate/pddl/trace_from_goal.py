@@ -9,6 +9,7 @@ class TraceFromGoal(Generator):
         problem_id: int = None,
         observe_pres_effs: bool = False,
         ignore_static_fluents: bool = True,  # defaults to true to not break any pre-implemented scripts
+        compact_states: bool = False,
 
     ):
         """
@@ -24,13 +25,16 @@ class TraceFromGoal(Generator):
                 The ID of the problem to access.
             observe_pres_effs (bool):
                 Option to observe action preconditions and effects upon generation.
+            compact_states (bool):
+                Option to generate states in the compact (bitset) representation.
         """
         super().__init__(
             dom=dom,
             prob=prob,
             problem_id=problem_id,
             observe_pres_effs=observe_pres_effs,
-            ignore_static_fluents=ignore_static_fluents
+            ignore_static_fluents=ignore_static_fluents,
+            compact_states=compact_states,
         )
         self.trace = self.generate_trace()
 
@@ -44,6 +44,7 @@ class VanillaSampling(Generator):
         num_traces: int = 0,
         seed: int = None,
         max_time: float = 30,
+        compact_states: bool = False,
     ):
         """
         Initializes a vanilla state trace sampler using the plan length, number of traces,
@@ -64,13 +65,16 @@ class VanillaSampling(Generator):
                 The length of each generated trace. Defaults to 1.
             num_traces (int):
                 The number of traces to generate. Defaults to 1.
+            compact_states (bool):
+                Option to generate states in the compact (bitset) representation.
         """
         super().__init__(
             dom=dom,
             prob=prob,
             problem_id=problem_id,
             observe_pres_effs=observe_pres_effs,
-            ignore_static_fluents=ignore_static_fluents
+            ignore_static_fluents=ignore_static_fluents,
+            compact_states=compact_states,
         )
         if max_time <= 0:
             raise InvalidTime()
@@ -93,7 +97,7 @@ class VanillaSampling(Generator):
         Returns:
             A TraceList object with the list of traces generated.
         """
-        traces = TraceList()
+        traces = TraceList(fluent_index=self.fluent_index)
         traces.generator = self.generate_single_trace_setup(
             num_seconds=self.max_time, plan_len=self.plan_len
         )
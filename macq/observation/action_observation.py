@@ -23,7 +23,7 @@ class ActionObservation(Observation):
         Observation.__init__(self, index=step.index)
 
         self.state = None # stateless representation
-        self.action = None if step.action is None else step.action.clone()
+        self.action = None if step.action is None else step.action.shared_clone()
 
     def __eq__(self, other):
         return (
@@ -43,3 +43,13 @@ class ActionObservation(Observation):
             return self.state.holds(value)
         else:
             raise InvalidQueryParameter(ActionObservation, key)
+
+    def _index_values(self, key: str):
+        if key == "action":
+            return [None if self.action is None else self.action.details()]
+        elif key == "fluent_holds":
+            if self.state is None:
+                return [None]
+            return self.state.held_names()
+        else:
+            raise InvalidQueryParameter(ActionObservation, key)
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from typing import Optional, List
-from ..trace import Step, State
+from ..trace import Step, State, StateView
 from . import Observation, InvalidQueryParameter
 
 
@@ -8,7 +8,14 @@ class IdentityObservation(Observation):
     """The Identity Observation Token.
 
     The identity observation stores the step unmodified. Inherits the base Observation
-    class.
+    class. The state is a copy-on-write view of the step's state, so tokens do not
+    copy the states of the trace.
+
+    A token is not a snapshot of the trace: writes to the token's state never
+    reach the trace, but changes made to the trace's states after tokenizing
+    are seen by the existing tokens (for the fluents the token has not
+    overridden). Tokenize again, or tokenize a copy of the traces, to keep
+    observations of a trace that will be modified.
     """
 
     state: State
@@ -40,8 +47,8 @@ class IdentityObservation(Observation):
         """
         super().__init__(index=step.index, **kwargs)
 
-        self.state = step.state.clone()
-        self.action = None if step.action is None else step.action.clone()
+        self.state = StateView.of(step.state)
+        self.action = None if step.action is None else step.action.shared_clone()
 
     def __hash__(self):
         return super().__hash__()
@@ -62,3 +69,11 @@ class IdentityObservation(Observation):
             return self.state.holds(value)
         else:
             raise InvalidQueryParameter(IdentityObservation, key)
+
+    def _index_values(self, key: str):
+        if key == "action":
+            return [None if self.action is None else self.action.details()]
+        elif key == "fluent_holds":
+            return self.state.held_names()
+        else:
+            raise InvalidQueryParameter(IdentityObservation, key)
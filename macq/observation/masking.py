@@ -0,0 +1,81 @@
+import random
+from typing import List, Set
+import numpy as np
+from ..trace import Fluent, FluentIndex, State
+from ..trace.trace_arrays import state_matrix
+
+
+def numpy_rng() -> np.random.Generator:
+    """Creates a NumPy generator seeded from the global random generator, so that
+    seeding `random` (as per-trace tokenization does) also seeds the masks."""
+    return np.random.default_rng(random.getrandbits(64))
+
+
+def random_subset_masks(
+    candidates: np.ndarray, percent: float, rng: np.random.Generator
+) -> np.ndarray:
+    """Draws a random subset of the candidate columns of every row at once.
+
+    Each row gets `int(n * percent)` of its `n` candidate columns, chosen
+    uniformly at random, the same as shuffling the candidates and taking a
+    prefix.
+
+    Args:
+        candidates (np.ndarray):
+            The `bool` matrix of columns that may be chosen in each row.
+        percent (float):
+            The fraction of the candidates of each row to choose (0-1).
+        rng (np.random.Generator):
+            The random generator to draw with.
+
+    Returns:
+        A `bool` matrix with the chosen columns of each row set.
+    """
+    counts = (candidates.sum(axis=1) * percent).astype(int)
+    keys = rng.random(candidates.shape)
+    # non-candidates sort after every candidate
+    keys[~candidates] = 2.0
+    order = np.argsort(keys, axis=1)
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(candidates.shape[1])[None, :], axis=1)
+    return ranks < counts[:, None]
+
+
+def trace_subsets(
+    states: List[State],
+    percent: float,
+    select: str = "present",
+    exclude: List[Set[Fluent]] = None,
+) -> List[Set[Fluent]]:
+    """Draws a random subset of the fluents of every state of a trace at once.
+
+    Args:
+        states (List[State]):
+            The states of the trace.
+        percent (float):
+            The fraction of the fluents of each state to choose (0-1).
+        select ("present" | "known"):
+            Optional; The fluents to choose from: every fluent of a state, or
+            only those with a known value. Defaults to "present".
+        exclude (List[Set[Fluent]]):
+            Optional; The fluents of each state that may not be chosen.
+
+    Returns:
+        The chosen fluents of each state.
+    """
+    # compact states over the same table are read straight from their bitsets
+    first = states[0] if states else None
+    index = getattr(first, "index", None)
+    if not isinstance(index, FluentIndex):
+        index = FluentIndex()
+    candidates = state_matrix(states, index, select=select)
+    if exclude is not None:
+        positions = index.positions
+        for row, excluded in zip(candidates, exclude):
+            for f in excluded:
+                j = positions.get(f)
+                if j is not None:
+                    row[j] = False
+    masks = random_subset_masks(candidates, percent, numpy_rng())
+    fluents = index.fluents
+    return [{fluents[j] for j in np.flatnonzero(row)} for row in masks]
@@ -1,7 +1,9 @@
 import random
+from typing import Iterable, Set
 from . import Observation
-from ..trace import Step
+from ..trace import Step, Fluent, StateView
 from ..utils import PercentError
+from .masking import trace_subsets
 
 
 class NoisyObservation(Observation):
@@ -13,7 +15,13 @@ class NoisyObservation(Observation):
     This token can be used to create states that are noisy but fully observable.
     """
 
-    def __init__(self, step: Step, percent_noisy: float = 0, replace: bool = False):
+    def __init__(
+        self,
+        step: Step,
+        percent_noisy: float = 0,
+        replace: bool = False,
+        noisy: Set[Fluent] = None,
+    ):
         """
         Creates an NoisyObservation object, storing the state and action.
 
@@ -25,6 +33,8 @@ class NoisyObservation(Observation):
             replace (bool):
                 Option to replace noisy fluents with the values of other existing fluents instead
                 of just flipping their values.
+            noisy (Set[Fluent]):
+                The set of (visible) fluents to make noisy, in place of a random subset.
         """
 
         super().__init__(index=step.index)
@@ -32,13 +42,53 @@ class NoisyObservation(Observation):
         if percent_noisy > 1 or percent_noisy < 0:
             raise PercentError()
 
-        step = self.random_noisy_subset(step, percent_noisy, replace)
+        step = self.random_noisy_subset(step, percent_noisy, replace, noisy)
+
+        self.state = step.state
+        self.action = None if step.action is None else step.action.shared_clone()
 
-        self.state = step.state.clone()
-        self.action = None if step.action is None else step.action.clone()
+    @classmethod
+    def tokenize_trace(
+        cls,
+        steps: Iterable[Step],
+        percent_noisy: float = 0,
+        replace: bool = False,
+        **kwargs,
+    ):
+        """Tokenizes the steps of a trace, drawing the random subsets of fluents
+        to make noisy for every step at once.
+
+        Args:
+            steps (Iterable[Step]):
+                The steps of the trace.
+            percent_noisy (float):
+                The percentage of fluents to randomly make noisy in each observation.
+            replace (bool):
+                Option to replace noisy fluents with the values of other existing fluents instead
+                of just flipping their values.
+            **kwargs:
+                Any extra arguments to be supplied to the token __init__.
+
+        Returns:
+            The list of tokens, one per step.
+        """
+        steps = list(steps)
+        if not 0 < percent_noisy <= 1:
+            return super().tokenize_trace(
+                steps, percent_noisy=percent_noisy, replace=replace, **kwargs
+            )
+        noisy = trace_subsets([step.state for step in steps], percent_noisy, "known")
+        return [
+            cls(step=step, percent_noisy=percent_noisy, replace=replace, noisy=n, **kwargs)
+            for step, n in zip(steps, noisy)
+        ]
 
     def random_noisy_subset(
-        self, step: Step, percent_noisy: float, replace: bool = False
+        self,
+        step: Step,
+        percent_noisy: float,
+        replace: bool = False,
+        noisy: Set[Fluent] = None,
     ):
         """Generates a random subset of fluents corresponding to the percent provided
         and flips their value to create noise.
@@ -51,25 +101,23 @@ class NoisyObservation(Observation):
             replace (bool):
                 Option to replace noisy fluents with the values of other existing fluents instead
                 of just flipping their values.
+            noisy (Set[Fluent]):
+                The set of (visible) fluents to make noisy, in place of a random subset.
 
         Returns:
-            A new `Step` with the noisy fluents in place.
+            A new `Step` whose state is a view of the step's state with the noisy
+            fluents in place.
         """
         # hidden fluents cannot be made noisy; only use visible fluents
-        state = step.state.clone()
-        invisible_f = {f for f in state if state[f] is None}
-        visible_f = state.clone()
-        for f in invisible_f:
-            del visible_f[f]
-        noisy_f = self.extract_fluent_subset(visible_f, percent_noisy)
+        state = StateView.of(step.state)
+        visible_f = [f for f, v in state.items() if v is not None]
+        if noisy is None:
+            noisy = set(self.extract_fluent_subset(visible_f, percent_noisy))
         if not replace:
-            for f in state:
-                state[f] = not state[f] if f in noisy_f else state[f]
+            for f in noisy:
+                state[f] = not state[f]
         else:
             for f in state:
-                state[f] = (
-                    state[random.choice(list(visible_f.keys()))]
-                    if f in noisy_f
-                    else state[f]
-                )
+                if f in noisy:
+                    state[f] = state[random.choice(visible_f)]
         return Step(state, step.action, step.index)
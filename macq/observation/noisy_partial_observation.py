@@ -1,7 +1,8 @@
 from macq.observation.noisy_observation import NoisyObservation
 from ..trace import Step, Fluent
 from . import PartialObservation
-from typing import Set
+from .masking import trace_subsets
+from typing import Iterable, Set
 
 
 class NoisyPartialObservation(PartialObservation, NoisyObservation):
@@ -19,6 +20,7 @@ class NoisyPartialObservation(PartialObservation, NoisyObservation):
         hide: Set[Fluent] = None,
         percent_noisy: float = 0,
         replace: bool = False,
+        noisy: Set[Fluent] = None,
     ):
         """
         Creates an NoisyPartialObservation object.
@@ -35,6 +37,8 @@ class NoisyPartialObservation(PartialObservation, NoisyObservation):
             replace (bool):
                 Option to replace noisy fluents with the values of other existing fluents instead
                 of just flipping their values.
+            noisy (Set[Fluent]):
+                The set of (visible) fluents to make noisy, in place of a random subset.
         """
         # get state and action with missing fluents (updates self.state and self.action)
         PartialObservation.__init__(
@@ -46,4 +50,64 @@ class NoisyPartialObservation(PartialObservation, NoisyObservation):
             step=Step(self.state, self.action, step.index),
             percent_noisy=percent_noisy,
             replace=replace,
+            noisy=noisy,
         )
+
+    @classmethod
+    def tokenize_trace(
+        cls,
+        steps: Iterable[Step],
+        percent_missing: float = 0,
+        hide: Set[Fluent] = None,
+        percent_noisy: float = 0,
+        replace: bool = False,
+    ):
+        """Tokenizes the steps of a trace, drawing the random subsets of fluents
+        to hide, then those to make noisy among the fluents left visible, for
+        every step at once.
+
+        Args:
+            steps (Iterable[Step]):
+                The steps of the trace.
+            percent_missing (float):
+                The percentage of fluents to randomly hide in each observation.
+            hide (Set[Fluent]):
+                The set of fluents to explicitly hide in each observation.
+            percent_noisy (float):
+                The percentage of fluents to randomly make noisy in each observation.
+            replace (bool):
+                Option to replace noisy fluents with the values of other existing fluents instead
+                of just flipping their values.
+
+        Returns:
+            The list of tokens, one per step.
+        """
+        steps = list(steps)
+        states = [step.state for step in steps]
+        hide = set(hide or ())
+        if 0 < percent_missing < 1:
+            hidden = [h | hide for h in trace_subsets(states, percent_missing)]
+        else:
+            hidden = [hide] * len(steps)
+        if percent_missing < 1 and 0 < percent_noisy <= 1:
+            noisy = trace_subsets(states, percent_noisy, "known", exclude=hidden)
+        else:
+            noisy = [None] * len(steps)
+
+        tokens = []
+        for step, hidden_f, noisy_f in zip(steps, hidden, noisy):
+            if hidden_f and percent_missing < 1:
+                missing = dict(percent_missing=0, hide=hidden_f)
+            else:
+                # nothing drawn (or given) to hide in this step
+                missing = dict(percent_missing=percent_missing, hide=hide or None)
+            tokens.append(
+                cls(
+                    step=step,
+                    percent_noisy=percent_noisy,
+                    replace=replace,
+                    noisy=noisy_f,
+                    **missing,
+                )
+            )
+        return tokens
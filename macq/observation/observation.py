@@ -1,8 +1,8 @@
 from warnings import warn
 from json import dumps
-from typing import Union
+from typing import Iterable, List, Union
 import random
-from ..trace import State, Action
+from ..trace import State, Action, Step
 
 
 class InvalidQueryParameter(Exception):
@@ -41,11 +41,28 @@ class Observation:
         else:
             warn("Creating an Observation token without an index.")
 
+    @classmethod
+    def tokenize_trace(cls, steps: Iterable[Step], **kwargs) -> List["Observation"]:
+        """Tokenizes the steps of a trace.
+
+        Tokens that draw random subsets of fluents override this to draw them
+        for every step of the trace at once.
+
+        Args:
+            steps (Iterable[Step]):
+                The steps of the trace.
+            **kwargs:
+                Any extra arguments to be supplied to the token __init__.
+
+        Returns:
+            The list of tokens, one per step.
+        """
+        return [cls(step=step, **kwargs) for step in steps]
+
     def __hash__(self):
-        string = str(self)
-        if string == "Observation\n":
+        if self.index is None and not self.state and not self.action:
             warn("Observation has no unique information. Generating a generic hash.")
-        return hash(string)
+        return hash((self.index, self.state, self.action))
 
     def __str__(self):
         out = "Observation\n"
@@ -67,6 +84,11 @@ class Observation:
     def _matches(self, *_):
         raise NotImplementedError()
 
+    def _index_values(self, key: str) -> Iterable:
+        """The values of the query parameter `key` that this token matches, used to
+        index the token. Tokens that cannot list them are queried one by one."""
+        raise NotImplementedError()
+
     def extract_fluent_subset(self, state: State, percent: float):
         """Randomly extracts a subset of fluents from a state, according to the percentage given.
 
@@ -80,6 +102,8 @@ class Observation:
             The random subset of fluents.
         """
         num_new_f = int(len(state) * (percent))
+        if num_new_f == 0:
+            return []
 
         # shuffle keys and take an appropriate subset of them
         extracted_f = list(state)
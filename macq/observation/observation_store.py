@@ -0,0 +1,232 @@
+from __future__ import annotations
+import pickle
+from typing import Dict, List, Optional, Type, TYPE_CHECKING
+import numpy as np
+from ..trace import (
+    Action,
+    State,
+    PartialState,
+    FluentIndex,
+    CompactState,
+    CompactPartialState,
+    StateView,
+)
+from ..trace.trace_arrays import state_matrix
+
+if TYPE_CHECKING:
+    from . import ObservedTraceList
+
+MAGIC = b"MACQOBS\x00"
+VERSION = 1
+# the token attributes stored as columns
+_COLUMNS = ("index", "state", "action")
+
+
+class InvalidObservationStore(Exception):
+    """Raised when a file is not a valid observation store."""
+
+    def __init__(self, message):
+        super().__init__(message)
+
+
+def _state_type(state) -> type:
+    """The type a state is rebuilt as: views and compact states are rebuilt as
+    the plain state they stand for."""
+    if isinstance(state, (StateView, CompactState)):
+        return PartialState if isinstance(state, PartialState) else State
+    return type(state)
+
+
+def _positions(values: list, vocabulary: list, ids: Dict[object, int]) -> List[int]:
+    """The position of each value in `vocabulary`, adding the missing values."""
+    positions = []
+    for v in values:
+        i = ids.get(v)
+        if i is None:
+            i = ids[v] = len(vocabulary)
+            vocabulary.append(v)
+        positions.append(i)
+    return positions
+
+
+def write_observations(path: str, obs_lists: ObservedTraceList):
+    """Writes an observation list to a binary file.
+
+    The tokens are stored column-wise in a NumPy `.npz` archive: the bit-packed
+    masks of the fluents present, true and false in each token's state, the
+    action id, index, token type and state type of each token, and the row
+    offset of each trace. Any other attribute of the tokens (such as the
+    parallel action set of a disordered parallel token) and of the observation
+    list itself (such as the probability tables of a
+    `DisorderedParallelActionsObservationLists`) is pickled along with the
+    fluent and action vocabularies.
+
+    Args:
+        path (str):
+            The path of the file to write.
+        obs_lists (ObservedTraceList):
+            The observation list to write.
+    """
+    offsets = [0]
+    tokens = []
+    for obs_trace in obs_lists:
+        tokens.extend(obs_trace)
+        offsets.append(len(tokens))
+
+    states = [obs.state for obs in tokens]
+    rows = [{} if s is None else s for s in states]
+    index = FluentIndex()
+    present = state_matrix(rows, index, select="present")
+    true = state_matrix(rows, index, select="true")
+    known = state_matrix(rows, index, select="known")
+
+    actions: List[Action] = []
+    action_ids = _positions([obs.action for obs in tokens], actions, {None: -1})
+    state_types: List[type] = []
+    state_kinds = _positions(
+        [None if s is None else _state_type(s) for s in states],
+        state_types,
+        {None: -1},
+    )
+    token_types: List[type] = []
+    token_kinds = _positions([type(obs) for obs in tokens], token_types, {})
+
+    extras: Dict[str, list] = {}
+    indices = [obs.index for obs in tokens]
+    if not all(isinstance(i, int) for i in indices):
+        extras["index"] = indices
+        indices = []
+    names = {k for obs in tokens for k in vars(obs) if k not in _COLUMNS}
+    for name in sorted(names):
+        extras[name] = [getattr(obs, name, None) for obs in tokens]
+
+    list_attributes = {
+        k: v for k, v in vars(obs_lists).items() if k not in ("observations", "_index")
+    }
+    meta = {
+        "list_type": type(obs_lists),
+        "type": getattr(obs_lists, "type", None),
+        "list_attributes": list_attributes,
+        "fluents": list(index.fluents),
+        "actions": actions,
+        "state_types": state_types,
+        "token_types": token_types,
+        "extras": extras,
+    }
+
+    def packed(matrix: np.ndarray) -> np.ndarray:
+        return np.packbits(matrix, axis=1, bitorder="little")
+
+    with open(path, "wb") as f:
+        np.savez(
+            f,
+            magic=np.frombuffer(MAGIC, dtype=np.uint8),
+            version=np.array(VERSION),
+            offsets=np.array(offsets, dtype=np.int64),
+            indices=np.array(indices, dtype=np.int64),
+            action_ids=np.array(action_ids, dtype=np.int32),
+            state_kinds=np.array(state_kinds, dtype=np.int16),
+            token_kinds=np.array(token_kinds, dtype=np.int16),
+            present=packed(present),
+            true=packed(true),
+            false=packed(known & ~true),
+            meta=np.frombuffer(pickle.dumps(meta), dtype=np.uint8),
+        )
+
+
+def _build_states(
+    data, fluents: list, state_types: List[type], compact: bool
+) -> List[Optional[State]]:
+    """Rebuilds the state of every token from the masks of an observation store."""
+    kinds = data["state_kinds"].tolist()
+    width = len(fluents)
+    packed = [data[name] for name in ("present", "true", "false")]
+    present, true, false = (
+        np.unpackbits(m, axis=1, count=width, bitorder="little").astype(bool)
+        for m in packed
+    )
+    # states that assign every fluent of the vocabulary
+    full = present.all(axis=1) & (true | false).all(axis=1)
+    if compact:
+        index = FluentIndex(fluents)
+        compact_types = {State: CompactState, PartialState: CompactPartialState}
+        masks = [[int.from_bytes(row.tobytes(), "little") for row in m] for m in packed]
+
+    states = []
+    for i, kind in enumerate(kinds):
+        if kind < 0:
+            states.append(None)
+            continue
+        state_type = state_types[kind]
+        if compact and state_type in compact_types:
+            keys, t, f = (m[i] for m in masks)
+            states.append(compact_types[state_type](index, keys=keys, true=t, false=f))
+        elif full[i]:
+            states.append(state_type(dict(zip(fluents, true[i].tolist()))))
+        else:
+            cols = np.flatnonzero(present[i])
+            values = [
+                True if t else False if f else None
+                for t, f in zip(true[i, cols].tolist(), false[i, cols].tolist())
+            ]
+            states.append(state_type(dict(zip([fluents[j] for j in cols], values))))
+    return states
+
+
+def read_observations(path: str, compact: bool = False) -> ObservedTraceList:
+    """Reads an observation list written by `write_observations`.
+
+    The file is unpickled, so it should only be read if it is trusted.
+
+    Args:
+        path (str):
+            The path of the file to read.
+        compact (bool):
+            Optional; Whether to rebuild the states as `CompactState`s over a
+            shared `FluentIndex`. Defaults to False.
+
+    Returns:
+        The observation list, of the type it was written from.
+    """
+    try:
+        data = np.load(path)
+    except (OSError, ValueError) as e:
+        raise InvalidObservationStore(f"{path} is not an observation store.") from e
+    if not isinstance(data, np.lib.npyio.NpzFile):
+        raise InvalidObservationStore(f"{path} is not an observation store.")
+    with data:
+        if "magic" not in data or data["magic"].tobytes() != MAGIC:
+            raise InvalidObservationStore(f"{path} is not an observation store.")
+        version = int(data["version"])
+        if version != VERSION:
+            raise InvalidObservationStore(
+                f"Unsupported observation store version {version}."
+            )
+        meta = pickle.loads(data["meta"].tobytes())
+        offsets = data["offsets"].tolist()
+        indices = data["indices"].tolist()
+        action_ids = data["action_ids"].tolist()
+        token_kinds = data["token_kinds"].tolist()
+        states = _build_states(data, meta["fluents"], meta["state_types"], compact)
+
+    actions = meta["actions"]
+    token_types: List[Type] = meta["token_types"]
+    extras = meta["extras"]
+    tokens = []
+    for i, (a, kind) in enumerate(zip(action_ids, token_kinds)):
+        # the tokens were already drawn, so they are restored without __init__
+        token = token_types[kind].__new__(token_types[kind])
+        token.index = indices[i] if indices else None
+        token.state = states[i]
+        token.action = actions[a] if a >= 0 else None
+        for name, values in extras.items():
+            setattr(token, name, values[i])
+        tokens.append(token)
+
+    obs_lists = meta["list_type"].__new__(meta["list_type"])
+    vars(obs_lists).update(meta["list_attributes"])
+    obs_lists.type = meta["type"]
+    obs_lists.observations = [
+        tokens[start:end] for start, end in zip(offsets, offsets[1:])
+    ]
+    return obs_lists
@@ -1,14 +1,18 @@
 from __future__ import annotations
-from collections import defaultdict
-from collections.abc import MutableSequence
+import random
+from collections import defaultdict, OrderedDict
+from collections.abc import MutableSequence, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from warnings import warn
-from typing import Callable, Dict, List, Type, Set, TYPE_CHECKING
+from typing import Callable, Dict, List, Tuple, Type, Set, TYPE_CHECKING
 from inspect import cleandoc
 from rich.console import Console
 from rich.table import Table
 from rich.text import Text
 
 from . import Observation
+from .observation_store import write_observations, read_observations
 from ..trace import Action, Fluent
 
 # Prevents circular importing
@@ -36,11 +40,90 @@ class TokenTypeMismatch(Exception):
         super().__init__(message)
 
 
+def _trace_seed(seed, i: int) -> str:
+    """The seed the `i`-th trace is tokenized with."""
+    return f"{seed}-{i}"
+
+
+def _tokenize_trace(trace, Token: Type[Observation], seed, kwargs: dict):
+    """Tokenizes a trace with the global random generator seeded with `seed`,
+    restoring the generator's state afterwards."""
+    rng_state = random.getstate()
+    random.seed(seed)
+    try:
+        return trace.tokenize(Token, **kwargs)
+    finally:
+        random.setstate(rng_state)
+
+
+class _LazyObservations(Sequence):
+    """The tokens of a trace list, built when a trace is accessed.
+
+    Every trace is tokenized with its own seed, so the tokens of a trace are the
+    same each time they are built. The most recently used traces are kept in a
+    cache of at most `cache_size` traces.
+    """
+
+    def __init__(
+        self,
+        trace_list: TraceList,
+        Token: Type[Observation],
+        cache_size: int,
+        seed,
+        kwargs: dict,
+    ):
+        self.trace_list = trace_list
+        self.Token = Token
+        self.cache_size = cache_size
+        self.seed = seed
+        self.kwargs = kwargs
+        self._cache: OrderedDict[int, List[Observation]] = OrderedDict()
+
+    def __len__(self):
+        return len(self.trace_list)
+
+    def __getitem__(self, key: int):
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("observation list index out of range")
+
+        tokens = self._cache.get(key)
+        if tokens is not None:
+            self._cache.move_to_end(key)
+            return tokens
+        tokens = _tokenize_trace(
+            self.trace_list[key], self.Token, _trace_seed(self.seed, key), self.kwargs
+        )
+        if self.cache_size:
+            self._cache[key] = tokens
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
 class ObservedTraceList(MutableSequence):
     """A sequence of observations.
 
     A `list`-like object, where each element is a list of `Observation`s.
 
+    In lazy mode, the tokens of a trace are only built when the trace is
+    accessed, and are dropped again unless they fit in the cache, so that
+    single-pass extraction does not hold every token in memory. Each trace is
+    tokenized with its own random seed, so its tokens are the same on every
+    access. Modifying a lazy observation list builds all of its tokens.
+
+    Queries are answered from an index of the token positions matching each
+    value of a query parameter, built on the first query for that parameter.
+    Modifying the list resets the index; tokens changed in place are not
+    re-indexed.
+
     Attributes:
         observations (List[List[Observation]]):
             The internal list of lists of `Observation` objects.
@@ -50,14 +133,46 @@ class ObservedTraceList(MutableSequence):
 
     observations: List[List[Observation]]
     type: Type[Observation]
+    # the positions of the tokens matching each value of each query parameter
+    _index: Dict[str, Dict[object, List[Tuple[int, int]]]] = None
 
     def __init__(
         self,
         trace_list: TraceList = None,
         Token: Type[Observation] = None,
         observations: List[List[Observation]] = None,
+        lazy: bool = False,
+        cache_size: int = 0,
+        seed=None,
+        workers: int = None,
         **kwargs,
     ):
+        """Initializes an ObservedTraceList by tokenizing a trace list, or from
+        existing observations.
+
+        Args:
+            trace_list (TraceList):
+                Optional; The traces to tokenize.
+            Token (Type[Observation]):
+                Optional; The type of token to tokenize the traces with.
+            observations (List[List[Observation]]):
+                Optional; Existing observations.
+            lazy (bool):
+                Optional; Whether to tokenize each trace only when it is
+                accessed. Defaults to False.
+            cache_size (int):
+                Optional; In lazy mode, the number of tokenized traces to keep.
+                Defaults to 0.
+            seed:
+                Optional; In lazy or parallel mode, the seed the per-trace seeds
+                are derived from. Defaults to a random seed.
+            workers (int):
+                Optional; The number of processes to tokenize the traces with.
+                Defaults to None (tokenize in this process, without per-trace
+                seeds).
+            **kwargs:
+                Any extra arguments to be supplied to the Token __init__.
+        """
         if trace_list is not None:
             if not Token and not observations:
                 raise MissingToken()
@@ -65,8 +180,16 @@ class ObservedTraceList(MutableSequence):
             if Token:
                 self.type = Token
 
+            if lazy and not observations:
+                if seed is None:
+                    seed = random.getrandbits(64)
+                self.observations = _LazyObservations(
+                    trace_list, self.type, cache_size, seed, kwargs
+                )
+                return
+
             self.observations = []
-            self.tokenize(trace_list, **kwargs)
+            self.tokenize(trace_list, workers=workers, seed=seed, **kwargs)
 
             if observations:
                 self.extend(observations)
@@ -85,10 +208,22 @@ class ObservedTraceList(MutableSequence):
             self.observations = []
             self.type = Observation
 
+    @property
+    def lazy(self) -> bool:
+        """Whether the tokens are built when they are accessed."""
+        return isinstance(self.observations, _LazyObservations)
+
+    def _materialize(self):
+        """Builds every token of a lazy observation list, so it can be modified."""
+        if self.lazy:
+            self.observations = list(self.observations)
+
     def __getitem__(self, key: int):
         return self.observations[key]
 
     def __setitem__(self, key: int, value: List[Observation]):
+        self._materialize()
+        self._index = None
         self.observations[key] = value
         if self.type == Observation:
             self.type = type(value[0])
@@ -96,6 +231,8 @@ class ObservedTraceList(MutableSequence):
             raise TokenTypeMismatch(self.type, type(value[0]))
 
     def __delitem__(self, key: int):
+        self._materialize()
+        self._index = None
         del self.observations[key]
 
     def __iter__(self):
@@ -105,12 +242,46 @@ class ObservedTraceList(MutableSequence):
         return len(self.observations)
 
     def insert(self, key: int, value: List[Observation]):
+        self._materialize()
+        self._index = None
         self.observations.insert(key, value)
         if self.type == Observation:
             self.type = type(value[0])
         elif type(value[0]) != self.type:
             raise TokenTypeMismatch(self.type, type(value[0]))
 
+    def save(self, path: str):
+        """Writes the observations to a binary file, to be read back with `load`.
+
+        The states are stored as bit-packed columns alongside the action id of
+        each token; see `write_observations` for the format.
+
+        Args:
+            path (str):
+                The path of the file to write.
+        """
+        write_observations(path, self)
+
+    @staticmethod
+    def load(path: str, compact: bool = False) -> ObservedTraceList:
+        """Reads observations written by `save`.
+
+        The tokens are restored as they were written, without tokenizing again,
+        and the observation list has the type it was saved from. The file is
+        unpickled, so only trusted files should be loaded.
+
+        Args:
+            path (str):
+                The path of the file to read.
+            compact (bool):
+                Optional; Whether to rebuild the states as `CompactState`s over a
+                shared `FluentIndex`. Defaults to False.
+
+        Returns:
+            The loaded observation list.
+        """
+        return read_observations(path, compact=compact)
+
     def get_actions(self) -> Set[Action]:
         actions: Set[Action] = set()
         for obs_trace in self:
@@ -128,18 +299,96 @@ class ObservedTraceList(MutableSequence):
                     fluents.update(list(obs.state.keys()))
         return fluents
 
-    def tokenize(self, trace_list: TraceList, **kwargs):
-        for trace in trace_list:
-            tokens = trace.tokenize(self.type, **kwargs)
-            self.append(tokens)
+    def tokenize(self, trace_list: TraceList, workers: int = None, seed=None, **kwargs):
+        """Tokenizes the traces of a trace list and appends their tokens.
+
+        Args:
+            trace_list (TraceList):
+                The traces to tokenize.
+            workers (int):
+                Optional; The number of processes to tokenize the traces with.
+                Each trace is tokenized with a seed derived from `seed` and its
+                position, so the tokens do not depend on the number of workers.
+                Defaults to None (tokenize in this process with the global
+                random generator).
+            seed:
+                Optional; The seed the per-trace seeds are derived from when
+                `workers` is given. Defaults to a random seed.
+            **kwargs:
+                Any extra arguments to be supplied to the Token __init__.
+        """
+        if workers is None:
+            for trace in trace_list:
+                tokens = trace.tokenize(self.type, **kwargs)
+                self.append(tokens)
+            return
+
+        if seed is None:
+            seed = random.getrandbits(64)
+        seeds = [_trace_seed(seed, i) for i in range(len(trace_list))]
+        if workers == 1:
+            tokenized = map(
+                _tokenize_trace, trace_list, repeat(self.type), seeds, repeat(kwargs)
+            )
+            self.extend(tokenized)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tokenized = pool.map(
+                _tokenize_trace,
+                trace_list,
+                repeat(self.type),
+                seeds,
+                repeat(kwargs),
+                chunksize=max(1, len(trace_list) // (4 * workers)),
+            )
+            self.extend(tokenized)
+
+    def _positions(self, key: str) -> Dict[object, List[Tuple[int, int]]]:
+        """The (trace, token) positions of the tokens matching each value of the
+        query parameter `key`, indexing the tokens on first use."""
+        if self._index is None:
+            self._index = {}
+        positions = self._index.get(key)
+        if positions is None:
+            positions = defaultdict(list)
+            for i, obs_trace in enumerate(self):
+                for j, obs in enumerate(obs_trace):
+                    for value in obs._index_values(key):
+                        positions[value].append((i, j))
+            self._index[key] = positions
+        return positions
+
+    def _query_positions(self, query: dict) -> List[Tuple[int, int]]:
+        """The sorted positions of the tokens matching every parameter of `query`."""
+        matching = None
+        for key, value in query.items():
+            found = self._positions(key).get(value, ())
+            matching = set(found) if matching is None else matching & set(found)
+        if matching is None:
+            # an empty query matches every token
+            return [
+                (i, j) for i, obs_trace in enumerate(self) for j in range(len(obs_trace))
+            ]
+        return sorted(matching)
 
     def fetch_observations(self, query: dict) -> List[Set[Observation]]:
-        matches: List[Set[Observation]] = []
-        for i, obs_trace in enumerate(self.observations):
-            matches.append(set())
-            for obs in obs_trace:
-                if obs.matches(query):
-                    matches[i].add(obs)
+        matches: List[Set[Observation]] = [set() for _ in range(len(self))]
+        try:
+            positions = self._query_positions(query)
+        except NotImplementedError:
+            # the tokens cannot be indexed; match them one by one
+            for i, obs_trace in enumerate(self.observations):
+                for obs in obs_trace:
+                    if obs.matches(query):
+                        matches[i].add(obs)
+            return matches
+
+        obs_trace, trace_i = None, None
+        for i, j in positions:
+            if i != trace_i:
+                obs_trace, trace_i = self[i], i
+            matches[i].add(obs_trace[j])
         return matches
 
     def fetch_observation_windows(
@@ -162,11 +411,28 @@ class ObservedTraceList(MutableSequence):
     def get_all_transitions(self) -> Dict[Action, List[List[Observation]]]:
         actions = self.get_actions()
         try:
+            details = {action: action.details() for action in actions}
+        except AttributeError:
+            details = {action: str(action) for action in actions}
+        try:
+            positions = self._positions("action")
+        except NotImplementedError:
             return {
-                action: self.get_transitions(action.details()) for action in actions
+                action: self.get_transitions(details[action]) for action in actions
             }
-        except AttributeError:
-            return {action: self.get_transitions(str(action)) for action in actions}
+
+        # the windows of the tokens of each action, in a single pass
+        windows = defaultdict(list)
+        for value, found in positions.items():
+            if value is None:
+                continue
+            obs_trace, trace_i = None, None
+            for i, j in found:
+                if i != trace_i:
+                    obs_trace, trace_i = self[i], i
+                obs = obs_trace[j]
+                windows[value].append(obs_trace[obs.index - 1 : obs.index + 1])
+        return {action: windows[details[action]] for action in actions}
 
     def print(self, view="details", filter_func=lambda _: True, wrap=None):
         """Pretty prints the trace list in the specified view.
@@ -1,9 +1,10 @@
 from warnings import warn
-from typing import Set
+from typing import Iterable, Set
 from ..utils import PercentError
-from ..trace import Step, Fluent
-from ..trace import PartialState
+from ..trace import Step, Fluent, State
+from ..trace import PartialState, CompactState, CompactPartialState, PartialStateView
 from . import Observation, InvalidQueryParameter
+from .masking import trace_subsets
 
 
 class PartialObservation(Observation):
@@ -40,12 +41,14 @@ class PartialObservation(Observation):
         # state information available without having to check every mapping in
         # the state (slow in large domains).
         if percent_missing < 1:
-            step = self.hide_random_subset(step, percent_missing)
-        if hide:
-            step = self.hide_subset(step, hide)
+            if percent_missing > 0 or not hide:
+                step = self.hide_random_subset(step, percent_missing)
+            if hide:
+                step = self.hide_subset(step, hide)
 
-        self.state = None if percent_missing == 1 else step.state.clone()
-        self.action = None if step.action is None else step.action.clone()
+        # hiding always builds a new state, so it need not be cloned
+        self.state = None if percent_missing == 1 else step.state
+        self.action = None if step.action is None else step.action.shared_clone()
 
     def __eq__(self, other):
         return (
@@ -54,6 +57,47 @@ class PartialObservation(Observation):
             and self.action == other.action
         )
 
+    @classmethod
+    def tokenize_trace(
+        cls,
+        steps: Iterable[Step],
+        percent_missing: float = 0,
+        hide: Set[Fluent] = None,
+        **kwargs,
+    ):
+        """Tokenizes the steps of a trace, drawing the random subsets of fluents
+        to hide for every step at once.
+
+        Args:
+            steps (Iterable[Step]):
+                The steps of the trace.
+            percent_missing (float):
+                The percentage of fluents to randomly hide in each observation.
+            hide (Set[Fluent]):
+                The set of fluents to explicitly hide in each observation.
+            **kwargs:
+                Any extra arguments to be supplied to the token __init__.
+
+        Returns:
+            The list of tokens, one per step.
+        """
+        steps = list(steps)
+        if not 0 < percent_missing < 1:
+            return super().tokenize_trace(
+                steps, percent_missing=percent_missing, hide=hide, **kwargs
+            )
+        tokens = []
+        hidden = trace_subsets([step.state for step in steps], percent_missing)
+        for step, hidden_f in zip(steps, hidden):
+            if hidden_f:
+                tokens.append(cls(step=step, hide=hidden_f.union(hide or ()), **kwargs))
+            else:
+                # nothing drawn to hide in this step
+                tokens.append(
+                    cls(step=step, percent_missing=percent_missing, hide=hide, **kwargs)
+                )
+        return tokens
+
     def hide_random_subset(self, step: Step, percent_missing: float):
         """Hides a random subset of the fluents in the step.
         Args:
@@ -64,11 +108,8 @@ class PartialObservation(Observation):
         Returns:
             A Step whose state is a PartialState with the random fluents hidden.
         """
-        new_fluents = {}
-        hidden_f = self.extract_fluent_subset(step.state, percent_missing)
-        for f in step.state:
-            new_fluents[f] = None if f in hidden_f else step.state[f]
-        return Step(PartialState(new_fluents), step.action, step.index)
+        hidden_f = set(self.extract_fluent_subset(step.state, percent_missing))
+        return self.hide_subset(step, hidden_f)
 
     def hide_subset(self, step: Step, hide: Set[Fluent]):
         """Hides the specified set of fluents in the observation.
@@ -79,11 +120,33 @@ class PartialObservation(Observation):
                 The set of fluents that will be hidden.
         Returns:
             A Step whose state is a PartialState with the specified fluents hidden.
+            The state is a view of the step's state, or a compact partial state
+            if the step's state is compact.
         """
-        new_fluents = {}
-        for f in step.state.fluents:
-            new_fluents[f] = None if f in hide else step.state[f]
-        return Step(PartialState(new_fluents), step.action, step.index)
+        state = step.state
+        if isinstance(state, CompactState):
+            positions = state.index.positions
+            mask = 0
+            for f in hide:
+                position = positions.get(f)
+                if position is not None:
+                    mask |= 1 << position
+            mask = ~(mask & state.keys_mask)
+            hidden = CompactPartialState(
+                state.index,
+                keys=state.keys_mask,
+                true=state.true_mask & mask,
+                false=state.false_mask & mask,
+            )
+            return Step(hidden, step.action, step.index)
+
+        if not isinstance(state, State):
+            # plain mappings are copied
+            new_fluents = {f: None if f in hide else v for f, v in state.items()}
+            return Step(PartialState(new_fluents), step.action, step.index)
+
+        hidden = PartialStateView(state, {f: None for f in hide if state.has_key(f)})
+        return Step(hidden, step.action, step.index)
 
     def _matches(self, key: str, value: str):
         if key == "action":
@@ -96,3 +159,13 @@ class PartialObservation(Observation):
             return self.state.holds(value)
         else:
             raise InvalidQueryParameter(PartialObservation, key)
+
+    def _index_values(self, key: str):
+        if key == "action":
+            return [None if self.action is None else self.action.details()]
+        elif key == "fluent_holds":
+            if self.state is None:
+                return [None]
+            return self.state.held_names()
+        else:
+            raise InvalidQueryParameter(PartialObservation, key)
@@ -1,9 +1,15 @@
 from .action import Action, PlanningObject
 from .fluent import Fluent
+from .intern_pool import InternPool
 from .state import State
 from .partial_state import PartialState
+from .compact_state import FluentIndex, CompactState, CompactPartialState
+from .state_view import StateView, PartialStateView
 from .step import Step
+from .trace_arrays import TraceArrays
 from .trace import Trace, SAS
+from .delta_trace import DeltaTrace, StateDelta
+from .trace_store import TraceStore
 from .trace_list import TraceList
 from .disordered_parallel_actions_observation_lists import (
     DisorderedParallelActionsObservationLists,
@@ -15,11 +21,21 @@ __all__ = [
     "Action",
     "PlanningObject",
     "Fluent",
+    "InternPool",
     "State",
     "PartialState",
+    "FluentIndex",
+    "CompactState",
+    "CompactPartialState",
+    "StateView",
+    "PartialStateView",
     "Step",
+    "TraceArrays",
     "Trace",
     "SAS",
+    "DeltaTrace",
+    "StateDelta",
+    "TraceStore",
     "TraceList",
     "DisorderedParallelActionsObservationLists",
     "ActionPair",
@@ -7,7 +7,8 @@ class Action:
 
     An Action represents a grounded action in a Trace or a Model. The action's
     `precond`, `add`, and `delete` attributes characterize a Model, and are
-    found during model extraction.
+    found during model extraction. The name and parameters of an action should
+    not change once it is created, as its hash is cached.
 
     Attributes:
         name (str):
@@ -62,15 +63,26 @@ class Action:
         return string
 
     def __eq__(self, other):
-        return (
+        return self is other or (
             isinstance(other, Action)
             and self.name == other.name
             and self.obj_params == other.obj_params
         )
 
+    _hash = None
+
     def __hash__(self):
         # Order of obj_params is important!
-        return hash(self.details())
+        if self._hash is None:
+            self._hash = hash((self.name, tuple(self.obj_params)))
+        return self._hash
+
+    def __getstate__(self):
+        # string hashes differ between processes, so drop the cached hash
+        state = self.__dict__.copy()
+        state.pop("_hash", None)
+        state.pop("_shared_clone", None)
+        return state
 
     def details(self):
         string = f"{self.name} {' '.join([o.details() for o in self.obj_params])}"
@@ -84,6 +96,15 @@ class Action:
 
         return Action(self.name, self.obj_params.copy(), self.cost)
 
+    _shared_clone = None
+
+    def shared_clone(self):
+        """A clone of the action that is made once and then shared, for the
+        observation tokens of every step that takes this action."""
+        if self._shared_clone is None:
+            self._shared_clone = self.clone()
+        return self._shared_clone
+
     def _serialize(self):
         return self.name
 
@@ -0,0 +1,355 @@
+from __future__ import annotations
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+from . import Fluent, State, PartialState
+
+
+def _bit_positions(mask: int) -> Iterator[int]:
+    """Yields the positions of the set bits in `mask`, lowest first."""
+    # bin() is linear in the size of the mask, so scanning its digits is
+    # cheaper than repeatedly shifting the (arbitrary precision) integer.
+    for i, bit in enumerate(bin(mask)[:1:-1]):
+        if bit == "1":
+            yield i
+
+
+class FluentIndex:
+    """An interned table of fluents.
+
+    Assigns each fluent a fixed bit position so that states over the same
+    fluents can be stored as packed bitsets. A single index is meant to be
+    shared by every state of a `TraceList`. The table is append-only: positions
+    never change once assigned.
+
+    Attributes:
+        fluents (List[Fluent]):
+            The fluents in the table, ordered by position.
+        positions (Dict[Fluent, int]):
+            A mapping of each fluent to its position in the table.
+        name_masks (Dict[str, int]):
+            A mapping of each fluent name to the bitset of the fluents with
+            that name.
+    """
+
+    def __init__(self, fluents: Iterable[Fluent] = None):
+        """Initializes a FluentIndex with an optional collection of fluents.
+
+        Args:
+            fluents (Iterable[Fluent]):
+                Optional; The fluents to add to the table, in order.
+        """
+        self.fluents: List[Fluent] = []
+        self.positions: Dict[Fluent, int] = {}
+        self.name_masks: Dict[str, int] = {}
+        if fluents is not None:
+            for f in fluents:
+                self.add(f)
+
+    def __len__(self):
+        return len(self.fluents)
+
+    def __iter__(self):
+        return iter(self.fluents)
+
+    def __contains__(self, fluent: Fluent):
+        return fluent in self.positions
+
+    def __getitem__(self, position: int):
+        return self.fluents[position]
+
+    def add(self, fluent: Fluent) -> int:
+        """Adds a fluent to the table if it is not already present.
+
+        Args:
+            fluent (Fluent):
+                The fluent to add.
+
+        Returns:
+            The position of the fluent in the table.
+        """
+        position = self.positions.get(fluent)
+        if position is None:
+            position = len(self.fluents)
+            self.positions[fluent] = position
+            self.fluents.append(fluent)
+            # atomic states use the string of a fluent in its place
+            if isinstance(fluent, Fluent):
+                names = self.name_masks
+                names[fluent.name] = names.get(fluent.name, 0) | 1 << position
+        return position
+
+    def position(self, fluent: Fluent) -> int:
+        """Returns the position of a fluent in the table.
+
+        Raises:
+            KeyError: If the fluent is not in the table.
+        """
+        return self.positions[fluent]
+
+    def mask(self, fluents: Iterable[Fluent]) -> int:
+        """Builds a bitset with the bits of the given fluents set."""
+        mask = 0
+        for f in fluents:
+            mask |= 1 << self.add(f)
+        return mask
+
+    def fluents_of(self, mask: int) -> Iterator[Fluent]:
+        """Iterates over the fluents whose bits are set in `mask`."""
+        fluents = self.fluents
+        for i in _bit_positions(mask):
+            yield fluents[i]
+
+    @property
+    def full_mask(self) -> int:
+        """The bitset with every fluent in the table set."""
+        return (1 << len(self.fluents)) - 1
+
+
+class _CompactFluents(MutableMapping):
+    """A dict-like view of a `CompactState`, standing in for `State.fluents`."""
+
+    def __init__(self, state: CompactState):
+        self._state = state
+
+    def __getitem__(self, key: Fluent):
+        return self._state[key]
+
+    def __setitem__(self, key: Fluent, value):
+        self._state[key] = value
+
+    def __delitem__(self, key: Fluent):
+        del self._state[key]
+
+    def __iter__(self):
+        return iter(self._state)
+
+    def __len__(self):
+        return len(self._state)
+
+    def copy(self):
+        return self._state.copy()
+
+    def __repr__(self):
+        return repr(self._state.copy())
+
+
+class CompactState(State):
+    """A State stored as packed bitsets over a shared `FluentIndex`.
+
+    Behaves like a `State` (the same dict-like API), but rather than keeping a
+    `dict` per state only three integers are stored: the set of fluents present
+    in the state, the set of true fluents and the set of false fluents. Present
+    fluents that are neither true nor false are unknown (`None`), which is how
+    `CompactPartialState` represents hidden fluents.
+
+    Attributes:
+        index (FluentIndex):
+            The fluent table shared by the states of a trace list.
+    """
+
+    __slots__ = ("index", "_keys", "_true", "_false")
+
+    def __init__(
+        self,
+        index: FluentIndex,
+        fluents: Dict[Fluent, Union[bool, None]] = None,
+        keys: int = 0,
+        true: int = 0,
+        false: int = 0,
+    ):
+        """Initializes a CompactState from a fluent-value mapping or raw bitsets.
+
+        Args:
+            index (FluentIndex):
+                The fluent table the bitsets refer to. Fluents of `fluents` that
+                are missing from the table are added to it.
+            fluents (dict):
+                Optional; A mapping of `Fluent` objects to their value in this
+                state.
+            keys (int):
+                Optional; The bitset of fluents present in the state.
+            true (int):
+                Optional; The bitset of fluents that are true in the state.
+            false (int):
+                Optional; The bitset of fluents that are false in the state.
+        """
+        self.index = index
+        self._hash = None
+        self._keys = keys
+        self._true = true
+        self._false = false
+        if fluents:
+            self.update(fluents)
+
+    @classmethod
+    def from_state(cls, state: State, index: FluentIndex) -> CompactState:
+        """Packs an existing state into a compact state over `index`."""
+        if isinstance(state, CompactState) and state.index is index:
+            return state.clone()
+        keys = true = false = 0
+        add = index.add
+        for f, v in state.items():
+            bit = 1 << add(f)
+            keys |= bit
+            if v is not None:
+                if v:
+                    true |= bit
+                else:
+                    false |= bit
+        return cls(index, keys=keys, true=true, false=false)
+
+    @property
+    def fluents(self):
+        return _CompactFluents(self)
+
+    @property
+    def true_mask(self) -> int:
+        """The bitset of fluents that are true in this state."""
+        return self._true
+
+    @property
+    def false_mask(self) -> int:
+        """The bitset of fluents that are false in this state."""
+        return self._false
+
+    @property
+    def keys_mask(self) -> int:
+        """The bitset of fluents present in this state."""
+        return self._keys
+
+    def __eq__(self, other):
+        if isinstance(other, CompactState) and other.index is self.index:
+            return (
+                self._keys == other._keys
+                and self._true == other._true
+                and self._false == other._false
+            )
+        return isinstance(other, State) and dict(self.items()) == dict(other.items())
+
+    def __hash__(self):
+        return super().__hash__()
+
+    def __getstate__(self):
+        slots = {k: getattr(self, k) for k in ("index", "_keys", "_true", "_false")}
+        slots["_hash"] = None
+        return None, slots
+
+    def __len__(self):
+        return bin(self._keys).count("1")
+
+    def __setitem__(self, key: Fluent, value: Optional[bool]):
+        self._hash = None
+        bit = 1 << self.index.add(key)
+        self._keys |= bit
+        self._true &= ~bit
+        self._false &= ~bit
+        if value is not None:
+            if value:
+                self._true |= bit
+            else:
+                self._false |= bit
+
+    def _bit(self, key: Fluent) -> int:
+        position = self.index.positions.get(key)
+        if position is None or not (self._keys >> position) & 1:
+            raise KeyError(key)
+        return 1 << position
+
+    def __getitem__(self, key: Fluent):
+        return self._value(self._bit(key))
+
+    def __delitem__(self, key: Fluent):
+        bit = ~self._bit(key)
+        self._hash = None
+        self._keys &= bit
+        self._true &= bit
+        self._false &= bit
+
+    def __iter__(self):
+        return self.index.fluents_of(self._keys)
+
+    def __contains__(self, key):
+        return self[key]
+
+    def clear(self):
+        self._hash = None
+        self._keys = self._true = self._false = 0
+
+    def copy(self):
+        return dict(self.items())
+
+    def has_key(self, k):
+        position = self.index.positions.get(k)
+        return position is not None and bool((self._keys >> position) & 1)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def keys(self):
+        return self.fluents.keys()
+
+    def values(self):
+        return [v for _, v in self.items()]
+
+    def items(self):
+        fluents = self.index.fluents
+        n = self._keys.bit_length()
+        # lowest bit first, padded so every present position can be indexed
+        true = bin(self._true)[:1:-1].ljust(n, "0")
+        false = bin(self._false)[:1:-1].ljust(n, "0")
+        items = []
+        for i in _bit_positions(self._keys):
+            if true[i] == "1":
+                items.append((fluents[i], True))
+            elif false[i] == "1":
+                items.append((fluents[i], False))
+            else:
+                items.append((fluents[i], None))
+        return items
+
+    def _value(self, bit: int) -> Optional[bool]:
+        if self._true & bit:
+            return True
+        if self._false & bit:
+            return False
+        return None
+
+    def _name_bit(self, name: str) -> int:
+        # the fluents are ordered by position, so the last one with the name
+        # is the highest bit of the name that is present
+        mask = self.index.name_masks.get(name, 0) & self._keys
+        return 1 << (mask.bit_length() - 1) if mask else 0
+
+    def _name_index(self) -> Dict[str, Fluent]:
+        fluents = self.index.fluents
+        names = {}
+        for name in self.index.name_masks:
+            bit = self._name_bit(name)
+            if bit:
+                names[name] = fluents[bit.bit_length() - 1]
+        return names
+
+    def holds(self, fluent: str):
+        bit = self._name_bit(fluent)
+        if bit:
+            return self._value(bit)
+
+    def held_names(self) -> List[str]:
+        name_bit = self._name_bit
+        return [name for name in self.index.name_masks if self._true & name_bit(name)]
+
+    def clone(self, atomic=False):
+        if atomic:
+            return super().clone(atomic=True)
+        return type(self)(self.index, keys=self._keys, true=self._true, false=self._false)
+
+
+class CompactPartialState(CompactState, PartialState):
+    """A PartialState stored as packed bitsets over a shared `FluentIndex`.
+
+    Hidden fluents are present in the state but set in neither the true nor the
+    false bitset.
+    """
+
+    __slots__ = ()
@@ -0,0 +1,304 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from . import Action, Fluent, State, Step, Trace, CompactState
+
+_MISSING = object()
+
+
+@dataclass
+class StateDelta:
+    """The change between two consecutive states.
+
+    Attributes:
+        added (Set[Fluent]):
+            The fluents that became true.
+        deleted (Set[Fluent]):
+            The fluents that became false.
+        unknown (Set[Fluent]):
+            The fluents that became unknown (`None`), for partial states.
+        removed (Set[Fluent]):
+            The fluents that are no longer present in the state.
+    """
+
+    added: Set[Fluent]
+    deleted: Set[Fluent]
+    unknown: Set[Fluent] = frozenset()
+    removed: Set[Fluent] = frozenset()
+
+    @staticmethod
+    def between(pre: State, post: State) -> StateDelta:
+        """Computes the delta that turns `pre` into `post`."""
+        if (
+            isinstance(pre, CompactState)
+            and isinstance(post, CompactState)
+            and pre.index is post.index
+        ):
+            fluents_of = pre.index.fluents_of
+            unknown = post.keys_mask & ~(post.true_mask | post.false_mask)
+            pre_unknown = pre.keys_mask & ~(pre.true_mask | pre.false_mask)
+            return StateDelta(
+                frozenset(fluents_of(post.true_mask & ~pre.true_mask)),
+                frozenset(fluents_of(post.false_mask & ~pre.false_mask)),
+                frozenset(fluents_of(unknown & ~pre_unknown)),
+                frozenset(fluents_of(pre.keys_mask & ~post.keys_mask)),
+            )
+
+        added, deleted, unknown = set(), set(), set()
+        pre_fluents = pre.fluents
+        new_keys = 0
+        for f, v in post.items():
+            before = pre_fluents.get(f, _MISSING)
+            if before is _MISSING:
+                new_keys += 1
+            elif (before is None) == (v is None) and (v is None or bool(before) == bool(v)):
+                continue
+            if v is None:
+                unknown.add(f)
+            elif v:
+                added.add(f)
+            else:
+                deleted.add(f)
+        removed = ()
+        # every key of pre is still present unless post lost some of them
+        if len(pre) + new_keys != len(post):
+            removed = (f for f in pre if not post.has_key(f))
+        # stored deltas are immutable (and the empty frozenset is shared)
+        return StateDelta(
+            frozenset(added), frozenset(deleted), frozenset(unknown), frozenset(removed)
+        )
+
+    def apply(self, state: State):
+        """Applies the delta to `state`, in place."""
+        for f in self.added:
+            state[f] = True
+        for f in self.deleted:
+            state[f] = False
+        for f in self.unknown:
+            state[f] = None
+        for f in self.removed:
+            del state[f]
+
+
+class DeltaTrace(Trace):
+    """A state trace that stores states as deltas.
+
+    Only every `keyframe_interval`-th state is stored in full; every other step
+    stores the `StateDelta` from the previous state. Consecutive states usually
+    differ in only the few fluents an action touches, so this cuts the memory
+    of long traces by roughly the number of fluents per state.
+
+    Steps are reconstructed when they are accessed, so they are new objects on
+    every access and modifying a returned step does not change the trace; use
+    item assignment instead. Appending and popping are incremental, while other
+    in-place modifications re-encode the trace.
+
+    Attributes:
+        keyframe_interval (int):
+            The number of steps between two fully stored states.
+        fluents (set):
+            The set of fluents in the trace.
+        actions (set):
+            The set of actions in the trace.
+    """
+
+    def __init__(self, steps: List[Step] = None, keyframe_interval: int = 32):
+        """Initializes a DeltaTrace with an optional list of steps.
+
+        Args:
+            steps (list):
+                Optional; The list of steps in the trace. Defaults to an empty
+                `list`.
+            keyframe_interval (int):
+                Optional; The number of steps between two fully stored states.
+                Defaults to 32.
+        """
+        if keyframe_interval < 1:
+            raise ValueError("The keyframe interval must be at least 1.")
+        self.keyframe_interval = keyframe_interval
+        self.clear()
+        if steps:
+            self.extend(steps)
+
+    @classmethod
+    def from_trace(cls, trace: Trace, keyframe_interval: int = 32) -> DeltaTrace:
+        """Delta-encodes an existing trace."""
+        return cls(list(trace), keyframe_interval=keyframe_interval)
+
+    @property
+    def steps(self) -> List[Step]:
+        """The reconstructed list of steps. Builds every state; prefer iterating."""
+        return list(self)
+
+    @staticmethod
+    def _same_step(a: Step, b: Step) -> bool:
+        return (
+            isinstance(b, Step)
+            and a.index == b.index
+            and a.action == b.action
+            and a.state == b.state
+        )
+
+    def _state_at(self, i: int) -> State:
+        k = i - i % self.keyframe_interval
+        state = self._keyframes[k].clone()
+        for j in range(k + 1, i + 1):
+            self._deltas[j].apply(state)
+        return state
+
+    def _step_at(self, i: int) -> Step:
+        return Step(self._state_at(i), self._actions[i], self._indices[i])
+
+    def _rebuild(self, steps: List[Step]):
+        self.clear()
+        self.extend(steps)
+
+    def get_delta(self, i: int) -> StateDelta:
+        """Retrieves the stored change caused by the action of step `i`, that is,
+        the delta between the states of steps `i` and `i + 1`.
+
+        Args:
+            i (int):
+                The position of the step in the trace.
+
+        Returns:
+            The `StateDelta` between the states of steps `i` and `i + 1`.
+        """
+        if i < 0:
+            i += len(self)
+        return self._deltas[i + 1]
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Trace)
+            and len(self) == len(other)
+            and all(map(self._same_step, self, other))
+        )
+
+    def __len__(self):
+        return len(self._actions)
+
+    def __setitem__(self, key: int, value: Step):
+        steps = self.steps
+        steps[key] = value
+        self._rebuild(steps)
+
+    def __getitem__(self, key: int):
+        if isinstance(key, slice):
+            return [self._step_at(i) for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("trace index out of range")
+        return self._step_at(key)
+
+    def __delitem__(self, key: int):
+        steps = self.steps
+        del steps[key]
+        self._rebuild(steps)
+
+    def __iter__(self):
+        state = None
+        for i, (action, index) in enumerate(zip(self._actions, self._indices)):
+            if i in self._keyframes:
+                state = self._keyframes[i].clone()
+            else:
+                state = state.clone()
+                self._deltas[i].apply(state)
+            yield Step(state, action, index)
+
+    def __reversed__(self):
+        return reversed(self.steps)
+
+    def __contains__(self, step: Step):
+        return any(self._same_step(s, step) for s in self)
+
+    def append(self, step: Step):
+        i = len(self._actions)
+        if i:
+            delta = StateDelta.between(self._last, step.state)
+            self._deltas.append(delta)
+        else:
+            self._deltas.append(None)
+        self._last = step.state.clone()
+        if i % self.keyframe_interval == 0:
+            self._keyframes[i] = self._last.clone()
+        self._actions.append(step.action)
+        self._indices.append(step.index)
+        self._add_actions_and_fluents(step)
+        self._index_appended(step.action)
+
+    def clear(self):
+        self._keyframes: Dict[int, State] = {}
+        self._deltas: List[Optional[StateDelta]] = []
+        self._actions: List[Optional[Action]] = []
+        self._indices: List[int] = []
+        self._last: Optional[State] = None
+        self._reinit_actions_and_fluents()
+
+    def copy(self):
+        return self.steps
+
+    def count(self, value: Step):
+        return sum(1 for s in self if self._same_step(s, value))
+
+    def extend(self, iterable: Iterable[Step]):
+        for step in iterable:
+            self.append(step)
+
+    def index(self, value: Step):
+        for i, s in enumerate(self):
+            if self._same_step(s, value):
+                return i
+        raise ValueError(f"{value} is not in trace")
+
+    def insert(self, index: int, item: Step):
+        steps = self.steps
+        steps.insert(index, item)
+        self._rebuild(steps)
+
+    def pop(self):
+        i = len(self) - 1
+        if i < 0:
+            raise IndexError("pop from empty trace")
+        result = self._step_at(i)
+        del self._actions[i], self._indices[i], self._deltas[i]
+        self._keyframes.pop(i, None)
+        self._last = self._state_at(i - 1) if i else None
+        self._remove_actions_and_fluents(result)
+        self._index_popped(result.action)
+        return result
+
+    def remove(self, value: Step):
+        i = self.index(value)
+        if i == len(self) - 1:
+            self.pop()
+        else:
+            del self[i]
+
+    def reverse(self):
+        steps = self.steps
+        steps.reverse()
+        self._rebuild(steps)
+
+    def sort(self, reverse: bool = False, key: Callable = lambda e: e.action.cost):
+        steps = self.steps
+        steps.sort(reverse=reverse, key=key)
+        self._rebuild(steps)
+
+    def _iter_actions(self):
+        return iter(self._actions)
+
+    def get_total_cost(self):
+        return sum(action.cost for action in self._actions if action)
+
+    def get_slice_cost(self, start: int, end: int):
+        if start < 1 or end < 1 or start > len(self) or end > len(self):
+            raise self.InvalidCostRange(
+                "Range supplied goes out of the feasible range."
+            )
+        if start > end:
+            raise self.InvalidCostRange(
+                "The start boundary must be smaller than the end boundary."
+            )
+        return sum(action.cost for action in self._actions[start - 1 : end] if action)
@@ -21,10 +21,7 @@ class ActionPair:
 
     def __hash__(self):
         # order of actions is irrelevant; {a_x, a_y} == {a_y, a_x}
-        sum = 0
-        for a in self.actions:
-            sum += hash(a.details())
-        return sum
+        return hash(frozenset(self.actions))
 
     def __repr__(self):
         string = ""
@@ -30,7 +30,9 @@ class PlanningObject:
         return hash(self.name)
 
     def __eq__(self, other):
-        return isinstance(other, PlanningObject) and self.name == other.name
+        return self is other or (
+            isinstance(other, PlanningObject) and self.name == other.name
+        )
 
     def details(self):
         return " ".join([self.obj_type, self.name])
@@ -45,6 +47,9 @@ class PlanningObject:
 class Fluent:
     """Fluents of a planning domain.
 
+    Fluents are treated as immutable once created: the hash is computed from the
+    name and objects on first use and cached.
+
     Attributes:
         name (str):
             The name of the fluent.
@@ -66,9 +71,19 @@ class Fluent:
         self.name = name
         self.objects = objects
 
+    _hash = None
+
     def __hash__(self):
         # Order of objects is important!
-        return hash(str(self))
+        if self._hash is None:
+            self._hash = hash((self.name, tuple(self.objects)))
+        return self._hash
+
+    def __getstate__(self):
+        # string hashes differ between processes, so drop the cached hash
+        state = self.__dict__.copy()
+        state.pop("_hash", None)
+        return state
 
     def __repr__(self):
         return (
@@ -78,8 +93,9 @@ class Fluent:
         )
 
     def __eq__(self, other):
-        return (
+        return self is other or (
             isinstance(other, Fluent)
+            and hash(self) == hash(other)
             and self.name == other.name
             and self.objects == other.objects
         )
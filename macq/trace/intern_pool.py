@@ -0,0 +1,68 @@
+from typing import Dict, List, Tuple
+from .fluent import PlanningObject, Fluent
+
+
+class InternPool:
+    """A registry of canonical `PlanningObject` and `Fluent` instances.
+
+    Returns the same instance every time an object or fluent with the same key
+    is requested, so equal fluents share one object (and one cached hash) no
+    matter how many states refer to them. A pool is meant to be scoped to a
+    single generator or trace list.
+
+    Attributes:
+        objects (Dict[Tuple[str, str], PlanningObject]):
+            The canonical objects, keyed by (type, name).
+        fluents (Dict[Tuple[str, Tuple[PlanningObject, ...]], Fluent]):
+            The canonical fluents, keyed by (name, objects).
+    """
+
+    def __init__(self):
+        self.objects: Dict[Tuple[str, str], PlanningObject] = {}
+        self.fluents: Dict[Tuple[str, Tuple[PlanningObject, ...]], Fluent] = {}
+
+    def __len__(self):
+        return len(self.fluents)
+
+    def planning_object(self, obj_type: str, name: str) -> PlanningObject:
+        """Returns the canonical object with the given type and name.
+
+        Args:
+            obj_type (str):
+                The type of the object.
+            name (str):
+                The name of the object.
+
+        Returns:
+            The canonical `PlanningObject`.
+        """
+        key = (obj_type, name)
+        obj = self.objects.get(key)
+        if obj is None:
+            obj = self.objects[key] = PlanningObject(obj_type, name)
+        return obj
+
+    def fluent(self, name: str, objects: List[PlanningObject]) -> Fluent:
+        """Returns the canonical fluent with the given name and objects.
+
+        Args:
+            name (str):
+                The name of the fluent.
+            objects (List[PlanningObject]):
+                The objects the fluent applies to. Order is important.
+
+        Returns:
+            The canonical `Fluent`.
+        """
+        key = (name, tuple(objects))
+        fluent = self.fluents.get(key)
+        if fluent is None:
+            fluent = self.fluents[key] = Fluent(
+                name, [self.planning_object(o.obj_type, o.name) for o in objects]
+            )
+        return fluent
+
+    def intern(self, fluent: Fluent) -> Fluent:
+        """Returns the canonical instance of an existing fluent, registering it
+        (with canonical objects) if it is new."""
+        return self.fluent(fluent.name, fluent.objects)
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Dict
+from typing import Dict, List
 from rich.text import Text
 from . import Fluent
 
@@ -8,13 +8,20 @@ class State:
     """State in a trace.
 
     A dict-like object. Maps `Fluent` objects to boolean values, representing
-    the state for a `Step` in a `Trace`.
+    the state for a `Step` in a `Trace`. The hash of a state is cached and reset
+    whenever the state is modified through its own methods, so `fluents` should
+    not be mutated directly once the state has been hashed. The same holds for
+    the name index used by `holds`, which is shared by the clones of a state.
 
     Attributes:
         fluents (dict):
             A mapping of `Fluent` objects to their value in this state.
     """
 
+    # subclasses that declare `__slots__` as well (like `CompactState`) have no
+    # per-instance `__dict__`
+    __slots__ = ("fluents", "_hash", "_names")
+
     def __init__(self, fluents: Dict[Fluent, bool] = None):
         """Initializes State with an optional fluent-value mapping.
 
@@ -24,6 +31,8 @@ class State:
                 state. Defaults to an empty `dict`.
         """
         self.fluents = fluents if fluents is not None else {}
+        self._hash = None
+        self._names = None
 
     def __eq__(self, other):
         return isinstance(other, State) and self.fluents == other.fluents
@@ -32,18 +41,35 @@ class State:
         return ", ".join([str(fluent) for (fluent, value) in self.items() if value])
 
     def __hash__(self):
-        return hash(str(self.details()))
+        if self._hash is None:
+            self._hash = hash(frozenset(self.items()))
+        return self._hash
+
+    def __getstate__(self):
+        # string hashes differ between processes, so drop the cached hash
+        slots = {"_hash": None, "_names": None}
+        try:
+            # subclasses may replace the slot with a property
+            slots["fluents"] = State.fluents.__get__(self)
+        except AttributeError:
+            pass
+        return getattr(self, "__dict__", None), slots
 
     def __len__(self):
         return len(self.fluents)
 
     def __setitem__(self, key: Fluent, value: bool):
+        self._hash = None
+        if key not in self.fluents:
+            self._names = None
         self.fluents[key] = value
 
     def __getitem__(self, key: Fluent):
         return self.fluents[key]
 
     def __delitem__(self, key: Fluent):
+        self._hash = None
+        self._names = None
         del self.fluents[key]
 
     def __iter__(self):
@@ -53,6 +79,8 @@ class State:
         return self.fluents[key]
 
     def clear(self):
+        self._hash = None
+        self._names = None
         return self.fluents.clear()
 
     def copy(self):
@@ -62,6 +90,8 @@ class State:
         return k in self.fluents
 
     def update(self, *args, **kwargs):
+        self._hash = None
+        self._names = None
         return self.fluents.update(*args, **kwargs)
 
     def keys(self):
@@ -84,16 +114,30 @@ class State:
     def clone(self, atomic=False):
         if atomic:
             return AtomicState({str(fluent): value for fluent, value in self.items()})
-        return State(self.fluents.copy())
+        state = State(self.fluents.copy())
+        # the clone has the same fluents, so it can share the name index
+        state._names = self._names
+        return state
+
+    def _name_index(self) -> Dict[str, Fluent]:
+        """Maps each fluent name to the fluent `holds` checks for it: the last
+        fluent of the state with that name. Built on first use."""
+        if self._names is None:
+            self._names = {f.name: f for f in self.keys()}
+        return self._names
 
     def holds(self, fluent: str):
-        fluents = dict(map(lambda f: (f.name, f), self.keys()))
-        if fluent in fluents.keys():
-            return self[fluents[fluent]]
+        f = self._name_index().get(fluent)
+        if f is not None:
+            return self[f]
+
+    def held_names(self) -> List[str]:
+        """The fluent names for which `holds` is true in this state."""
+        return [name for name, f in self._name_index().items() if self[f]]
 
 
 class AtomicState(State):
     """A State where the fluents are represented by strings."""
 
     def __init__(self, fluents: Dict[str, bool] = None):
-        self.fluents = fluents if fluents is not None else {}
+        super().__init__(fluents)
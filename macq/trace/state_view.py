@@ -0,0 +1,205 @@
+from __future__ import annotations
+from collections.abc import MutableMapping
+from typing import Dict, Optional
+from . import Fluent, State, PartialState
+
+# marks a fluent of the base state that was deleted from the view
+_DELETED = object()
+_MISSING = object()
+
+
+class _ViewFluents(MutableMapping):
+    """A dict-like view of a `StateView`, standing in for `State.fluents`."""
+
+    def __init__(self, state: StateView):
+        self._state = state
+
+    def __getitem__(self, key: Fluent):
+        return self._state[key]
+
+    def __setitem__(self, key: Fluent, value):
+        self._state[key] = value
+
+    def __delitem__(self, key: Fluent):
+        del self._state[key]
+
+    def __iter__(self):
+        return iter(self._state)
+
+    def __len__(self):
+        return len(self._state)
+
+    def copy(self):
+        return self._state.copy()
+
+    def __repr__(self):
+        return repr(self._state.copy())
+
+
+class StateView(State):
+    """A copy-on-write view of another state.
+
+    Reads go to the base state unless the fluent is overridden; writes and
+    deletions are recorded as overrides and never change the base state. A view
+    of a state without overrides costs a single object, however large the state.
+
+    The view is live rather than a snapshot: changes made to the base state
+    afterwards are seen through the view, for every fluent it does not
+    override.
+
+    Attributes:
+        base (State):
+            The state being viewed.
+    """
+
+    def __init__(self, base: State, overrides: Dict[Fluent, Optional[bool]] = None):
+        """Initializes a StateView of a state.
+
+        Args:
+            base (State):
+                The state to view. Views of views share the innermost base.
+            overrides (dict):
+                Optional; A mapping of fluents to the value they take in the
+                view instead of their value in `base`.
+        """
+        self._hash = None
+        self._names = None
+        self._overrides = None
+        # whether fluents were added to or deleted from the base state
+        self._reshaped = False
+        if isinstance(base, StateView):
+            if base._overrides:
+                self._overrides = base._overrides.copy()
+            self._reshaped = base._reshaped
+            base = base.base
+        self.base = base
+        if overrides:
+            self.update(overrides)
+
+    @classmethod
+    def of(cls, state: State) -> StateView:
+        """Creates a view of `state` that is partial if `state` is."""
+        if isinstance(state, PartialState):
+            return PartialStateView(state)
+        return StateView(state)
+
+    @property
+    def fluents(self):
+        return _ViewFluents(self)
+
+    def __eq__(self, other):
+        if isinstance(other, StateView) and not other._overrides:
+            other = other.base
+        if not self._overrides:
+            return self.base == other
+        return isinstance(other, State) and dict(self.items()) == dict(other.items())
+
+    def __hash__(self):
+        if not self._overrides:
+            return hash(self.base)
+        return super().__hash__()
+
+    def __len__(self):
+        if not self._reshaped:
+            return len(self.base)
+        return sum(1 for _ in self)
+
+    def __setitem__(self, key: Fluent, value: Optional[bool]):
+        self._hash = None
+        if self._overrides is None:
+            self._overrides = {}
+        if not self.has_key(key):
+            self._names = None
+            self._reshaped = True
+        self._overrides[key] = value
+
+    def __getitem__(self, key: Fluent):
+        if self._overrides:
+            value = self._overrides.get(key, _MISSING)
+            if value is _DELETED:
+                raise KeyError(key)
+            if value is not _MISSING:
+                return value
+        return self.base[key]
+
+    def __delitem__(self, key: Fluent):
+        if not self.has_key(key):
+            raise KeyError(key)
+        self._hash = None
+        self._names = None
+        self._reshaped = True
+        if self._overrides is None:
+            self._overrides = {}
+        self._overrides[key] = _DELETED
+
+    def __iter__(self):
+        if not self._reshaped:
+            return iter(self.base)
+        return self._iter_reshaped()
+
+    def _iter_reshaped(self):
+        overrides = self._overrides
+        for f in self.base:
+            if overrides.get(f) is not _DELETED:
+                yield f
+        for f, v in overrides.items():
+            if v is not _DELETED and not self.base.has_key(f):
+                yield f
+
+    def __contains__(self, key):
+        return self[key]
+
+    def clear(self):
+        for f in list(self):
+            del self[f]
+
+    def copy(self):
+        return dict(self.items())
+
+    def has_key(self, k):
+        if self._overrides and k in self._overrides:
+            return self._overrides[k] is not _DELETED
+        return self.base.has_key(k)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def keys(self):
+        if not self._reshaped:
+            return self.base.keys()
+        return list(self)
+
+    def values(self):
+        if not self._overrides:
+            return self.base.values()
+        return [v for _, v in self.items()]
+
+    def items(self):
+        if not self._overrides:
+            return self.base.items()
+        return [(f, self[f]) for f in self]
+
+    def clone(self, atomic=False):
+        if atomic:
+            return super().clone(atomic=True)
+        return type(self)(self)
+
+    def _name_index(self) -> Dict[str, Fluent]:
+        if not self._reshaped:
+            return self.base._name_index()
+        return super()._name_index()
+
+    def holds(self, fluent: str):
+        if not self._overrides:
+            return self.base.holds(fluent)
+        return super().holds(fluent)
+
+    def held_names(self):
+        if not self._overrides:
+            return self.base.held_names()
+        return super().held_names()
+
+
+class PartialStateView(StateView, PartialState):
+    """A copy-on-write view of a state in which some fluents may be unknown."""
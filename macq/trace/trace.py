@@ -1,12 +1,13 @@
-from collections import defaultdict
+from collections import Counter, defaultdict
 from dataclasses import dataclass
-from typing import List, Type, Iterable, Callable, Set
+from typing import List, Type, Iterable, Iterator, Callable, Set
 from inspect import cleandoc
+import numpy as np
 from warnings import warn
 from rich.table import Table
 from rich.text import Text
 from rich.console import Console
-from . import Action, Step, State
+from . import Action, Step, State, TraceArrays
 from ..observation import Observation, NoisyPartialDisorderedParallelObservation
 from ..utils import TokenizationError
 
@@ -18,11 +19,7 @@ class SAS:
     post_state: State
 
     def __hash__(self):
-        return hash(
-            str(self.pre_state.details())
-            + self.action.details()
-            + str(self.post_state.details())
-        )
+        return hash((self.pre_state, self.action, self.post_state))
 
 
 class Trace:
@@ -30,6 +27,12 @@ class Trace:
 
     A `list`-like object, where each element is a step of the state trace.
 
+    The trace keeps count of the steps each fluent and action occurs in, and
+    of the positions of each action, so the per-action queries and removals do
+    not rescan the trace. These are updated by the trace's own modification
+    methods; replace a step (item assignment) rather than modifying its state
+    in place.
+
     Attributes:
         steps (list):
             The list of Step objcts constituting the trace.
@@ -54,7 +57,7 @@ class Trace:
                 `list`.
         """
         self.steps = steps if steps is not None else []
-        self.__reinit_actions_and_fluents()
+        self._reinit_actions_and_fluents()
 
     def __eq__(self, other):
         return isinstance(other, Trace) and self.steps == other.steps
@@ -63,13 +66,30 @@ class Trace:
         return len(self.steps)
 
     def __setitem__(self, key: int, value: Step):
+        if isinstance(key, slice):
+            # the steps are read twice, so an iterator is consumed up front
+            value = list(value)
+        old = self.steps[key]
         self.steps[key] = value
+        if isinstance(key, slice):
+            for step in old:
+                self._remove_actions_and_fluents(step)
+            for step in value:
+                self._add_actions_and_fluents(step)
+        else:
+            self._remove_actions_and_fluents(old)
+            self._add_actions_and_fluents(value)
+        self._positions = None
 
     def __getitem__(self, key: int):
         return self.steps[key]
 
     def __delitem__(self, key: int):
+        old = self.steps[key]
         del self.steps[key]
+        for step in old if isinstance(key, slice) else [old]:
+            self._remove_actions_and_fluents(step)
+        self._positions = None
 
     def __iter__(self):
         return iter(self.steps)
@@ -82,12 +102,12 @@ class Trace:
 
     def append(self, step: Step):
         self.steps.append(step)
-        self.__update_actions_and_fluents(step)
+        self._add_actions_and_fluents(step)
+        self._index_appended(step.action)
 
     def clear(self):
         self.steps.clear()
-        self.fluents = set()
-        self.actions = set()
+        self._reinit_actions_and_fluents()
 
     def copy(self):
         return self.steps.copy()
@@ -96,31 +116,41 @@ class Trace:
         return self.steps.count(value)
 
     def extend(self, iterable: Iterable[Step]):
-        self.steps.extend(iterable)
         for step in iterable:
-            self.__update_actions_and_fluents(step)
+            self.append(step)
 
     def index(self, value: Step):
         return self.steps.index(value)
 
     def insert(self, index: int, item: Step):
+        at_end = index >= len(self.steps)
         self.steps.insert(index, item)
-        self.__update_actions_and_fluents(item)
+        self._add_actions_and_fluents(item)
+        if at_end:
+            self._index_appended(item.action)
+        else:
+            self._positions = None
 
     def pop(self):
         result = self.steps.pop()
-        self.__reinit_actions_and_fluents()
+        self._remove_actions_and_fluents(result)
+        self._index_popped(result.action)
         return result
 
     def remove(self, value: Step):
-        self.steps.remove(value)
-        self.__reinit_actions_and_fluents()
+        i = self.steps.index(value)
+        if i == len(self.steps) - 1:
+            self.pop()
+        else:
+            del self[i]
 
     def reverse(self):
         self.steps.reverse()
+        self._positions = None
 
     def sort(self, reverse: bool = False, key: Callable = lambda e: e.action.cost):
         self.steps.sort(reverse=reverse, key=key)
+        self._positions = None
 
     def details(self, wrap=False):
         indent = " " * 2
@@ -187,15 +217,10 @@ class Trace:
             )
         )
 
-        for fluent in fluents:
-            step_str = ""
-            for step in self:
-                if step.state[fluent]:
-                    step_str += "[green]"
-                else:
-                    step_str += "[red]"
-                step_str += "■"
-
+        # one column of the state matrix per fluent, in display order
+        columns = TraceArrays.from_traces([self], fluents).states.T
+        for fluent, column in zip(fluents, columns):
+            step_str = "".join(np.where(column, "[green]■", "[red]■"))
             colorgrid.add_row(str(fluent), step_str)
 
         return colorgrid
@@ -237,38 +262,94 @@ class Trace:
         print()
 
     def get_static_fluents(self):
-        fstates = defaultdict(list)
-        for step in self:
-            for f, v in step.state.items():
-                fstates[f].append(v)
+        return {
+            f
+            for f, count in self._fluent_counts.items()
+            if self._true_counts[f] in (0, count)
+        }
 
-        static = set()
-        for f, states in fstates.items():
-            if all(states) or not any(states):
-                static.add(f)
+    def _add_actions_and_fluents(self, step: Step):
+        """Counts the fluents and action of a step that was added to this trace.
 
-        return static
+        Args:
+            step (Step):
+                The step to extract the possible new fluents and actions from.
+        """
+        for f, v in step.state.items():
+            if f not in self._fluent_counts:
+                self.fluents.add(f)
+            self._fluent_counts[f] += 1
+            if v:
+                self._true_counts[f] += 1
+        if step.action:
+            if step.action not in self._action_counts:
+                self.actions.add(step.action)
+            self._action_counts[step.action] += 1
 
-    def __update_actions_and_fluents(self, step: Step):
-        """Updates the actions and fluents stored in this trace with any new ones from
-        the provided step.
+    def _remove_actions_and_fluents(self, step: Step):
+        """Uncounts the fluents and action of a step that was removed from this
+        trace, dropping those that no longer occur in any step.
 
         Args:
             step (Step):
-                The step to extract the possible new fluents and actions from.
+                The removed step.
         """
-        self.fluents.update(step.state.keys())
+        for f, v in step.state.items():
+            if v:
+                self._true_counts[f] -= 1
+            self._fluent_counts[f] -= 1
+            if self._fluent_counts[f] <= 0:
+                del self._fluent_counts[f]
+                self._true_counts.pop(f, None)
+                self.fluents.discard(f)
         if step.action:
-            self.actions.add(step.action)
+            self._action_counts[step.action] -= 1
+            if self._action_counts[step.action] <= 0:
+                del self._action_counts[step.action]
+                self.actions.discard(step.action)
 
-    def __reinit_actions_and_fluents(self):
+    def _reinit_actions_and_fluents(self):
         """Reinitializes the actions and fluents stored in this trace, taking all current
         steps into account.
         """
         self.fluents = set()
         self.actions = set()
-        for step in self.steps:
-            self.__update_actions_and_fluents(step)
+        # the number of steps each fluent occurs in, and is true in
+        self._fluent_counts = Counter()
+        self._true_counts = Counter()
+        self._action_counts = Counter()
+        self._positions = None
+        for step in self:
+            self._add_actions_and_fluents(step)
+
+    def _index_appended(self, action: Action):
+        """Records the position of an action appended to the end of the trace."""
+        if self._positions is not None and action:
+            self._positions[action].append(len(self) - 1)
+
+    def _index_popped(self, action: Action):
+        """Drops the position of an action popped from the end of the trace."""
+        if self._positions is not None and action:
+            positions = self._positions[action]
+            positions.pop()
+            if not positions:
+                del self._positions[action]
+
+    def _iter_actions(self) -> Iterator[Action]:
+        return (step.action for step in self)
+
+    def _get_positions(self, action: Action) -> List[int]:
+        """Retrieves the positions of the steps that use the specified action.
+
+        Modifications in the middle of the trace shift every later position, so
+        they discard the index, which is rebuilt on the next query.
+        """
+        if self._positions is None:
+            self._positions = defaultdict(list)
+            for i, a in enumerate(self._iter_actions()):
+                if a:
+                    self._positions[a].append(i)
+        return self._positions.get(action, [])
 
     def get_pre_states(self, action: Action):
         """Retrieves the list of states prior to the action in this trace.
@@ -281,11 +362,7 @@ class Trace:
             The set of states prior to the action being performed in this
             trace.
         """
-        prev_states = set()
-        for step in self:
-            if step.action == action:
-                prev_states.add(step.state)
-        return prev_states
+        return {self[i].state for i in self._get_positions(action)}
 
     def get_post_states(self, action: Action):
         """Retrieves the list of states after the action in this trace.
@@ -297,11 +374,7 @@ class Trace:
         Returns:
             The set of states after the action was performed in this trace.
         """
-        post_states = set()
-        for i, step in enumerate(self):
-            if step.action == action:
-                post_states.add(self[i + 1].state)
-        return post_states
+        return {self[i + 1].state for i in self._get_positions(action)}
 
     def get_sas_triples(self, action: Action) -> List[SAS]:
         """Retrieves the list of (S,A,S') triples for the action in this trace.
@@ -317,12 +390,10 @@ class Trace:
             A `SAS` object, containing the `pre_state`, `action`, and
             `post_state`.
         """
-        sas_triples = []
-        for i, step in enumerate(self):
-            if step.action == action:
-                triple = SAS(step.state, action, self[i + 1].state)
-                sas_triples.append(triple)
-        return sas_triples
+        return [
+            SAS(self[i].state, action, self[i + 1].state)
+            for i in self._get_positions(action)
+        ]
 
     def get_total_cost(self):
         """Calculates the total cost of this trace.
@@ -376,11 +447,7 @@ class Trace:
             The set of steps that use the specified action.
 
         """
-        steps = set()
-        for step in self:
-            if step.action == action:
-                steps.add(action)
-        return steps
+        return {self[i] for i in self._get_positions(action)}
 
     def get_usage(self, action: Action):
         """Calculates how often an action was performed in this trace.
@@ -394,11 +461,14 @@ class Trace:
             as the number of occurences of the action divided by the length of
             the trace (number of steps).
         """
-        return len(self.get_steps(action)) / len(self)
+        return len(self._get_positions(action)) / len(self)
 
     def tokenize(self, Token: Type[Observation], **kwargs):
         """Tokenizes the steps in this trace.
 
+        As with `TraceList.tokenize`, the states of the tokens are views of the
+        states of the trace, so later changes to the trace show up in them.
+
         Args:
             Token (Observation):
                 A subclass of `Observation`, defining the method of tokenization
@@ -412,4 +482,4 @@ class Trace:
         """
         if Token == NoisyPartialDisorderedParallelObservation:
             raise TokenizationError(Token)
-        return [Token(step=step, **kwargs) for step in self]
+        return Token.tokenize_trace(self, **kwargs)
@@ -0,0 +1,261 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from itertools import repeat
+from operator import is_not
+from typing import Iterable, List, Optional
+import numpy as np
+from . import Action, Fluent, State, Step, FluentIndex, CompactState
+
+
+def state_matrix(
+    states: Iterable[State], index: FluentIndex, select: str = "true"
+) -> np.ndarray:
+    """Stacks states into a boolean matrix.
+
+    Args:
+        states (Iterable[State]):
+            The states to stack, one per row.
+        index (FluentIndex):
+            The fluent table giving the column of each fluent. Fluents that are
+            missing from the table are added to it.
+        select ("true" | "known" | "present"):
+            Optional; Which fluents of a state to set: the true fluents, the
+            fluents with a known (not `None`) value, or every fluent present in
+            the state. Defaults to "true".
+
+    Returns:
+        A `bool` matrix of shape (number of states, number of fluents) in which
+        the selected fluents of each state are set.
+    """
+    if select == "true":
+        selected = lambda values: map(bool, values)
+        compact_mask = lambda s: s.true_mask
+    elif select == "known":
+        selected = lambda values: map(is_not, values, repeat(None))
+        compact_mask = lambda s: s.true_mask | s.false_mask
+    elif select == "present":
+        selected = None
+        compact_mask = lambda s: s.keys_mask
+    else:
+        raise ValueError(f"Invalid selection {select}.")
+
+    add = index.add
+    get = index.positions.get
+    # runs of consecutive states over the same fluents, as [first row, number
+    # of rows, columns, selected values]; consecutive states of a trace usually
+    # hold the same fluent objects in the same order, and comparing lists of
+    # identical objects needs no hashing
+    runs = []
+    run, last_keys = None, None
+    masks = []
+    n = 0
+    for n, state in enumerate(states, 1):
+        if isinstance(state, CompactState) and state.index is index:
+            masks.append((n - 1, compact_mask(state)))
+            run, last_keys = None, None
+            continue
+        keys = list(state.keys())
+        if run is None or keys != last_keys:
+            # look up every column at once, adding the missing fluents if needed
+            positions = list(map(get, keys))
+            if None in positions:
+                positions = [add(f) for f in keys]
+            run, last_keys = [n - 1, 0, positions, []], keys
+            runs.append(run)
+        run[1] += 1
+        if selected is not None:
+            run[3].extend(selected(state.values()))
+
+    width = len(index)
+    matrix = np.zeros((n, width), dtype=bool)
+    for first, count, positions, chosen in runs:
+        if not positions:
+            continue
+        cols = np.array(positions, dtype=np.int64)
+        block = matrix[first : first + count]
+        if selected is None:
+            block[:, cols] = True
+        else:
+            block[:, cols] = np.array(chosen, dtype=bool).reshape(count, len(cols))
+    nbytes = (width + 7) // 8
+    for row, mask in masks:
+        bits = np.frombuffer(mask.to_bytes(nbytes, "little"), dtype=np.uint8)
+        matrix[row] = np.unpackbits(bits, count=width, bitorder="little")
+    return matrix
+
+
+def packed_steps(
+    packed: np.ndarray,
+    action_ids: np.ndarray,
+    fluents: List[Fluent],
+    actions: List[Action],
+    fluent_index: FluentIndex = None,
+    indices: Optional[np.ndarray] = None,
+) -> List[Step]:
+    """Builds the steps of a trace from bit-packed state rows.
+
+    Args:
+        packed (np.ndarray):
+            The `uint8` matrix of states, one row per step, with the truth value
+            of fluent `j` in bit `j % 8` (least significant first) of byte
+            `j // 8`.
+        action_ids (np.ndarray):
+            The position in `actions` of the action of each step, or -1.
+        fluents (List[Fluent]):
+            The fluent of each bit.
+        actions (List[Action]):
+            The action vocabulary.
+        fluent_index (FluentIndex):
+            Optional; A fluent table whose leading positions are `fluents`.
+            If provided, the states are built as `CompactState`s over it.
+        indices (np.ndarray):
+            Optional; The index of each step. Defaults to numbering the steps by
+            their position.
+
+    Returns:
+        The list of steps.
+    """
+    steps = []
+    ids = action_ids.tolist()
+    numbers = range(len(ids)) if indices is None else indices.tolist()
+    if fluent_index is not None:
+        keys = (1 << len(fluents)) - 1
+        for row, a, j in zip(packed, ids, numbers):
+            true = int.from_bytes(row.tobytes(), "little")
+            state = CompactState(fluent_index, keys=keys, true=true, false=keys & ~true)
+            steps.append(Step(state, actions[a] if a >= 0 else None, j))
+    else:
+        rows = np.unpackbits(packed, axis=1, count=len(fluents), bitorder="little")
+        for row, a, j in zip(rows.astype(bool).tolist(), ids, numbers):
+            state = State(dict(zip(fluents, row)))
+            steps.append(Step(state, actions[a] if a >= 0 else None, j))
+    return steps
+
+
+@dataclass
+class TraceArrays:
+    """A columnar representation of a collection of traces.
+
+    The steps of all traces are stacked into one state matrix with a column per
+    fluent, so that counting passes over many steps can run as NumPy column
+    reductions instead of walking the state dicts. Only the truth values of the
+    fluents are kept: unknown and missing fluents are stored as false.
+
+    Attributes:
+        states (np.ndarray):
+            The `bool` matrix of shape (total steps, number of fluents), where
+            `states[i, j]` is whether fluent `j` is true in step `i`.
+        action_ids (np.ndarray):
+            The position in `actions` of the action of each step, or -1 for
+            steps without an action.
+        offsets (np.ndarray):
+            The row at which each trace starts, followed by the total number of
+            steps; trace `i` covers rows `offsets[i]:offsets[i + 1]`.
+        fluents (List[Fluent]):
+            The fluent of each column.
+        actions (List[Action]):
+            The action vocabulary.
+        indices (np.ndarray):
+            The index of each step (such as the 1-based `Step.index` of the
+            generated traces), or None to number the steps of each trace by
+            their position.
+    """
+
+    states: np.ndarray
+    action_ids: np.ndarray
+    offsets: np.ndarray
+    fluents: List[Fluent]
+    actions: List[Action]
+    indices: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_traces(
+        cls,
+        traces: Iterable[Iterable[Step]],
+        fluents: Optional[Iterable[Fluent]] = None,
+        actions: Optional[Iterable[Action]] = None,
+    ) -> TraceArrays:
+        """Converts traces (or lists of observation tokens) to arrays.
+
+        Args:
+            traces (Iterable[Iterable[Step]]):
+                The traces to convert. Any iterable of objects with `state` and
+                `action` attributes works, such as a list of observation tokens.
+            fluents (Iterable[Fluent]):
+                Optional; The leading columns of the state matrix, in order.
+                Passing the `FluentIndex` shared by compact states lets their
+                bitsets be unpacked directly (the index is extended in place
+                with any fluent it is missing). Fluents found in the traces
+                are appended as new columns.
+            actions (Iterable[Action]):
+                Optional; The leading entries of the action vocabulary, in
+                order. Actions found in the traces are appended.
+
+        Returns:
+            The `TraceArrays` of the traces.
+        """
+        index = fluents if isinstance(fluents, FluentIndex) else FluentIndex(fluents)
+        action_vocab = list(actions) if actions is not None else []
+        action_pos = {a: i for i, a in enumerate(action_vocab)}
+        offsets = [0]
+        states = []
+        action_ids = []
+        indices = []
+        for trace in traces:
+            for j, step in enumerate(trace):
+                states.append(step.state)
+                number = getattr(step, "index", None)
+                indices.append(number if isinstance(number, int) else j)
+                action = step.action
+                if action is None:
+                    action_ids.append(-1)
+                    continue
+                pos = action_pos.get(action)
+                if pos is None:
+                    pos = action_pos[action] = len(action_vocab)
+                    action_vocab.append(action)
+                action_ids.append(pos)
+            offsets.append(len(states))
+
+        return cls(
+            state_matrix(states, index),
+            np.array(action_ids, dtype=np.int64),
+            np.array(offsets, dtype=np.int64),
+            list(index.fluents),
+            action_vocab,
+            np.array(indices, dtype=np.int64),
+        )
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def rows(self, i: int) -> slice:
+        """The rows of the state matrix that belong to trace `i`."""
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def to_steps(self, i: int, fluent_index: FluentIndex = None) -> List[Step]:
+        """Rebuilds the steps of trace `i`.
+
+        Each state assigns every fluent of the vocabulary, and steps keep their
+        index (or are numbered by their position in the trace if there are no
+        `indices`).
+
+        Args:
+            i (int):
+                The position of the trace.
+            fluent_index (FluentIndex):
+                Optional; A fluent table whose leading positions are `fluents`.
+                If provided, the states are built as `CompactState`s over it.
+
+        Returns:
+            The list of steps of the trace.
+        """
+        rows = self.states[self.rows(i)]
+        return packed_steps(
+            np.packbits(rows, axis=1, bitorder="little"),
+            self.action_ids[self.rows(i)],
+            self.fluents,
+            self.actions,
+            fluent_index,
+            None if self.indices is None else self.indices[self.rows(i)],
+        )
@@ -3,7 +3,16 @@ from typing import Callable, List, Type, Union
 from warnings import warn
 
 from ..observation import Observation, ObservedTraceList
-from . import Action, Trace
+from . import (
+    Action,
+    Trace,
+    PartialState,
+    FluentIndex,
+    CompactState,
+    CompactPartialState,
+    TraceArrays,
+    TraceStore,
+)
 
 
 class TraceList(MutableSequence):
@@ -17,6 +26,9 @@ class TraceList(MutableSequence):
             The list of `Trace` objects.
         generator (Callable | None):
             The function used to generate the traces.
+        fluent_index (FluentIndex | None):
+            The fluent table shared by the compact states of the traces, if the
+            traces use the compact state representation.
     """
 
     class MissingGenerator(Exception):
@@ -31,11 +43,13 @@ class TraceList(MutableSequence):
 
     traces: List[Trace]
     generator: Union[Callable, None]
+    fluent_index: Union[FluentIndex, None]
 
     def __init__(
         self,
         traces: List[Trace] = None,
         generator: Callable = None,
+        fluent_index: FluentIndex = None,
     ):
         """Initializes a TraceList with a list of traces and a generator.
 
@@ -44,9 +58,13 @@ class TraceList(MutableSequence):
                 Optional; The list of `Trace` objects.
             generator (Callable):
                 Optional; The function used to generate the traces.
+            fluent_index (FluentIndex):
+                Optional; The fluent table shared by the compact states of the
+                traces.
         """
         self.traces = [] if traces is None else traces
         self.generator = generator
+        self.fluent_index = fluent_index
 
     def __getitem__(self, key: int):
         return self.traces[key]
@@ -117,6 +135,92 @@ class TraceList(MutableSequence):
                 fluents.update(step.state.fluents)
         return fluents
 
+    def compact(self):
+        """Converts the states of every trace to the compact representation.
+
+        All states are packed into bitsets over the trace list's `fluent_index`
+        (created if the trace list does not have one yet), so the fluent table
+        is stored once rather than once per state. Partial states become
+        `CompactPartialState`s.
+
+        Returns:
+            The trace list itself, for chaining.
+        """
+        if self.fluent_index is None:
+            self.fluent_index = FluentIndex()
+        index = self.fluent_index
+        for trace in self.traces:
+            for step in trace:
+                if isinstance(step.state, CompactState) and step.state.index is index:
+                    continue
+                Compact = (
+                    CompactPartialState
+                    if isinstance(step.state, PartialState)
+                    else CompactState
+                )
+                step.state = Compact.from_state(step.state, index)
+        return self
+
+    def to_arrays(self) -> TraceArrays:
+        """Converts the traces to the columnar `TraceArrays` representation.
+
+        The columns of the state matrix follow the trace list's `fluent_index`
+        when it has one, so compact states are unpacked without a per-fluent
+        lookup.
+
+        Returns:
+            The `TraceArrays` of the traces.
+        """
+        return TraceArrays.from_traces(self.traces, fluents=self.fluent_index)
+
+    @classmethod
+    def from_arrays(cls, arrays: TraceArrays, compact: bool = False):
+        """Builds a trace list from its `TraceArrays` representation.
+
+        Args:
+            arrays (TraceArrays):
+                The arrays to rebuild the traces from.
+            compact (bool):
+                Optional; Whether to build the states as `CompactState`s over a
+                new `fluent_index`. Defaults to False.
+
+        Returns:
+            The rebuilt `TraceList`.
+        """
+        index = FluentIndex(arrays.fluents) if compact else None
+        traces = [Trace(arrays.to_steps(i, index)) for i in range(len(arrays))]
+        return cls(traces, fluent_index=index)
+
+    def save(self, path: str):
+        """Writes the traces to a binary `TraceStore` file.
+
+        Args:
+            path (str):
+                The path of the file to write.
+        """
+        TraceStore.write(path, self.traces, fluents=self.fluent_index)
+
+    @classmethod
+    def open(cls, path: str, compact: bool = False):
+        """Opens a `TraceStore` file as a trace list.
+
+        The file is memory-mapped and each trace is decoded when it is accessed,
+        so opening is instant regardless of the size of the file. The returned
+        trace list is read-only.
+
+        Args:
+            path (str):
+                The path of the file to open.
+            compact (bool):
+                Optional; Whether to build the states as `CompactState`s over a
+                shared `fluent_index`. Defaults to False.
+
+        Returns:
+            The `TraceList` backed by the file.
+        """
+        store = TraceStore(path, compact=compact)
+        return cls(store, fluent_index=store.fluent_index)
+
     def tokenize(
         self,
         Token: Type[Observation],
@@ -125,6 +229,12 @@ class TraceList(MutableSequence):
     ):
         """Tokenizes the steps in this trace.
 
+        The states of the tokens are copy-on-write views of the states of the
+        traces (see `StateView`). Modifying a token never changes the traces, but
+        changes made to the states of the traces after tokenizing show up in the
+        existing tokens. Tokenize the traces again (or a copy of them) to observe
+        traces that are modified afterwards.
+
         Args:
             Token (Observation):
                 A subclass of `Observation`, defining the method of tokenization
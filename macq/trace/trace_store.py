@@ -0,0 +1,255 @@
+from __future__ import annotations
+import json
+import os
+import struct
+from collections.abc import Sequence
+from typing import Iterable, List, Optional
+import numpy as np
+from . import Action, Fluent, InternPool, FluentIndex, Trace, TraceArrays
+from .trace_arrays import packed_steps
+
+MAGIC = b"MACQTRC\x00"
+VERSION = 2
+# magic, version, trace count, step count, state columns, bytes per row, and the
+# offset of the rows, action ids, step indices, trace offsets and vocabulary
+# sections
+_HEADER = struct.Struct("<8sI4xQQQQQQQQQ")
+
+
+def _pad(f, alignment: int = 8):
+    f.write(b"\0" * (-f.tell() % alignment))
+
+
+class TraceStore(Sequence):
+    """A read-only sequence of traces backed by a memory-mapped file.
+
+    The file is only mapped when the store is opened; a trace is decoded when
+    it is accessed, from its own rows of the file, so opening a store and
+    indexing a few traces does not depend on the size of the file.
+
+    The file consists of a fixed header, followed by:
+
+    - the bit-packed state rows, one per step, with the truth value of state
+      column `j` in bit `j % 8` of byte `j // 8`;
+    - the action id of each step (`int32`, -1 for no action);
+    - the index of each step (`int64`), as the `Step.index` of the trace;
+    - the row offset of each trace, followed by the number of steps (`int64`);
+    - the fluent and action vocabularies, as JSON.
+
+    Like `TraceArrays`, only truth values are stored: each state assigns every
+    fluent of the vocabulary, with unknown and missing fluents stored as false.
+
+    Attributes:
+        path (str):
+            The path of the store file.
+        fluents (List[Fluent]):
+            The fluent vocabulary. The first `n_columns` fluents are the state
+            columns; the rest only appear in action preconditions or effects.
+        actions (List[Action]):
+            The action vocabulary.
+        fluent_index (FluentIndex | None):
+            The fluent table shared by the states of the traces, if the store
+            was opened with compact states.
+    """
+
+    class InvalidTraceStore(Exception):
+        """Raised when a file is not a valid trace store."""
+
+        def __init__(self, message):
+            super().__init__(message)
+
+    def __init__(self, path: str, compact: bool = False):
+        """Opens a trace store file.
+
+        Args:
+            path (str):
+                The path of the store file.
+            compact (bool):
+                Optional; Whether to build the states as `CompactState`s over a
+                shared `fluent_index`. Defaults to False.
+        """
+        self.path = path
+        # an empty file cannot be mapped, so the size is checked first
+        if os.path.getsize(path) < _HEADER.size:
+            raise TraceStore.InvalidTraceStore(f"{path} is too short for a trace store.")
+        self._buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        (
+            magic,
+            version,
+            n_traces,
+            n_steps,
+            self.n_columns,
+            row_bytes,
+            rows_at,
+            actions_at,
+            indices_at,
+            offsets_at,
+            vocab_at,
+        ) = _HEADER.unpack(bytes(self._buffer[: _HEADER.size]))
+        if magic != MAGIC:
+            raise TraceStore.InvalidTraceStore(f"{path} is not a trace store.")
+        if version != VERSION:
+            raise TraceStore.InvalidTraceStore(
+                f"Unsupported trace store version {version}."
+            )
+
+        buffer = self._buffer
+        self._rows = buffer[rows_at : rows_at + n_steps * row_bytes].reshape(
+            n_steps, row_bytes
+        )
+        self._action_ids = buffer[actions_at : actions_at + 4 * n_steps].view("<i4")
+        self._indices = buffer[indices_at : indices_at + 8 * n_steps].view("<i8")
+        self._offsets = buffer[offsets_at : offsets_at + 8 * (n_traces + 1)].view("<i8")
+        self.fluents, self.actions = self._decode_vocabulary(
+            json.loads(bytes(buffer[vocab_at:]).decode("utf-8"))
+        )
+        self.fluent_index = FluentIndex(self.fluents) if compact else None
+
+    @staticmethod
+    def write(
+        path: str,
+        traces: Sequence[Trace],
+        fluents: Optional[Iterable[Fluent]] = None,
+    ):
+        """Writes traces to a trace store file.
+
+        The traces are encoded one at a time, so only the per-step action ids
+        and indices are held in memory besides the trace being written.
+
+        Args:
+            path (str):
+                The path of the store file.
+            traces (Sequence[Trace]):
+                The traces to write.
+            fluents (Iterable[Fluent]):
+                Optional; The leading state columns, in order, such as the
+                `fluent_index` of a `TraceList`. The fluents of the traces are
+                appended.
+        """
+        index = FluentIndex(fluents)
+        for trace in traces:
+            for f in trace.fluents:
+                index.add(f)
+        n_columns = len(index)
+        row_bytes = (n_columns + 7) // 8
+        actions: List[Action] = []
+        action_ids = []
+        indices = []
+        offsets = [0]
+
+        with open(path, "wb") as f:
+            f.write(b"\0" * _HEADER.size)
+            _pad(f)
+            rows_at = f.tell()
+            for trace in traces:
+                arrays = TraceArrays.from_traces([trace], index, actions)
+                actions = arrays.actions
+                f.write(np.packbits(arrays.states, axis=1, bitorder="little").tobytes())
+                action_ids.append(arrays.action_ids)
+                indices.append(arrays.indices)
+                offsets.append(offsets[-1] + len(trace))
+
+            _pad(f)
+            actions_at = f.tell()
+            for ids in action_ids:
+                f.write(ids.astype("<i4").tobytes())
+            _pad(f)
+            indices_at = f.tell()
+            for numbers in indices:
+                f.write(numbers.astype("<i8").tobytes())
+            _pad(f)
+            offsets_at = f.tell()
+            f.write(np.array(offsets, dtype="<i8").tobytes())
+            vocab_at = f.tell()
+            f.write(
+                json.dumps(TraceStore._encode_vocabulary(index, actions)).encode("utf-8")
+            )
+
+            f.seek(0)
+            f.write(
+                _HEADER.pack(
+                    MAGIC,
+                    VERSION,
+                    len(offsets) - 1,
+                    offsets[-1],
+                    n_columns,
+                    row_bytes,
+                    rows_at,
+                    actions_at,
+                    indices_at,
+                    offsets_at,
+                    vocab_at,
+                )
+            )
+
+    @staticmethod
+    def _encode_vocabulary(index: FluentIndex, actions: List[Action]) -> dict:
+        def objects(objs):
+            return [[o.obj_type, o.name] for o in objs]
+
+        def fluent_ids(fluents):
+            return None if fluents is None else [index.add(f) for f in fluents]
+
+        # encode the actions first, as their conditions may add fluents
+        encoded_actions = [
+            {
+                "name": a.name,
+                "obj_params": objects(a.obj_params),
+                "cost": a.cost,
+                "precond": fluent_ids(a.precond),
+                "add": fluent_ids(a.add),
+                "delete": fluent_ids(a.delete),
+            }
+            for a in actions
+        ]
+        return {
+            "fluents": [[f.name, objects(f.objects)] for f in index],
+            "actions": encoded_actions,
+        }
+
+    @staticmethod
+    def _decode_vocabulary(data: dict):
+        pool = InternPool()
+
+        def objects(objs):
+            return [pool.planning_object(obj_type, name) for obj_type, name in objs]
+
+        fluents = [pool.fluent(name, objects(objs)) for name, objs in data["fluents"]]
+
+        def fluent_set(ids):
+            return None if ids is None else {fluents[i] for i in ids}
+
+        actions = [
+            Action(
+                a["name"],
+                objects(a["obj_params"]),
+                a["cost"],
+                fluent_set(a["precond"]),
+                fluent_set(a["add"]),
+                fluent_set(a["delete"]),
+            )
+            for a in data["actions"]
+        ]
+        return fluents, actions
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, key: int):
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("trace store index out of range")
+        start, end = int(self._offsets[key]), int(self._offsets[key + 1])
+        return Trace(
+            packed_steps(
+                self._rows[start:end],
+                self._action_ids[start:end],
+                self.fluents[: self.n_columns],
+                self.actions,
+                self.fluent_index,
+                self._indices[start:end],
+            )
+        )
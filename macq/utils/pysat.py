@@ -1,8 +1,17 @@
-from typing import List, Tuple, Dict, Hashable
+import os
+import pickle
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Tuple, Dict, Hashable, Optional, Union
 from pysat.formula import WCNF
-from pysat.examples.rc2 import RC2
+from pysat.examples.rc2 import RC2, RC2Stratified
+from pysat.solvers import Solver
 from nnf import And, Or, Var
-from ..extract.exceptions import InvalidMaxSATModel
+from ..extract.exceptions import InvalidMaxSATModel, MaxSATTimeout
 
 
 def get_encoding(
@@ -76,8 +85,243 @@ def to_wcnf(
     return wcnf, decode
 
 
+@dataclass
+class MaxSATStats:
+    """Statistics of a MaxSAT solve.
+
+    Attributes:
+        cost (float):
+            The total weight of the soft clauses the model falsifies.
+        optimal (bool):
+            Whether the model is known to be optimal.
+        cores (int):
+            The number of unsatisfiable cores processed.
+        models (int):
+            The number of improving models found (by the linear search).
+        time (float):
+            The wall-clock time of the solve, in seconds.
+    """
+
+    cost: float = 0
+    optimal: bool = False
+    cores: int = 0
+    models: int = 0
+    time: float = 0.0
+
+
+class _CoreCounter:
+    """Counts the cores an RC2 solver processes."""
+
+    cores = 0
+
+    def process_core(self):
+        self.cores += 1
+        super().process_core()
+
+
+class _RC2(_CoreCounter, RC2):
+    pass
+
+
+class _RC2Stratified(_CoreCounter, RC2Stratified):
+    pass
+
+
+class MaxSATSolver:
+    """A configurable MaxSAT solver for WCNF theories.
+
+    The core-guided algorithms ("rc2" and "rc2-stratified") find optimal
+    models. The "lsu" algorithm is a linear search: starting from any model of
+    the hard clauses, each SAT call looks for a model that satisfies every soft
+    clause the current one does and at least one more, so the cost strictly
+    decreases. It stops when there is no such model, so the satisfied clauses
+    are a maximal satisfiable subset, but not necessarily an optimal one. It is
+    fast, but only optimal if the theory is satisfiable.
+
+    Given a time budget, solving is anytime: a core-guided search is preceded
+    by a linear search, and if the budget runs out before the optimum is found,
+    the best model found so far is returned (with `stats.optimal` False). Only
+    the search is interrupted: loading the theory into the solver is not.
+
+    Attributes:
+        algorithm ("rc2" | "rc2-stratified" | "lsu"):
+            The MaxSAT algorithm.
+        timeout (float):
+            The wall-clock budget of a solve, in seconds, or None.
+        sat_solver (str):
+            The name of the pysat SAT solver used as the oracle.
+        options (dict):
+            Extra keyword arguments for the RC2 solver, such as `exhaust`,
+            `minz`, `adapt` and `trim` (and `blo` for "rc2-stratified").
+        stats (MaxSATStats):
+            The statistics of the last solve.
+    """
+
+    ALGORITHMS = ("rc2", "rc2-stratified", "lsu")
+
+    def __init__(
+        self,
+        algorithm: str = "rc2",
+        timeout: Optional[float] = None,
+        sat_solver: str = "g3",
+        **options,
+    ):
+        """Initializes a MaxSATSolver.
+
+        Args:
+            algorithm ("rc2" | "rc2-stratified" | "lsu"):
+                Optional; The MaxSAT algorithm. Defaults to "rc2".
+            timeout (float):
+                Optional; The wall-clock budget of a solve, in seconds.
+                Defaults to None (no limit).
+            sat_solver (str):
+                Optional; The name of the pysat SAT solver to use as the
+                oracle. Defaults to "g3" (Glucose 3).
+            **options:
+                Extra keyword arguments for the RC2 solver, such as
+                `exhaust=True` (core exhaustion) or `minz=True` (core
+                minimization).
+
+        Raises:
+            ValueError:
+                If the algorithm is unknown, or options are given for "lsu".
+        """
+        if algorithm not in MaxSATSolver.ALGORITHMS:
+            raise ValueError(f"Invalid MaxSAT algorithm {algorithm}.")
+        if algorithm == "lsu" and options:
+            raise ValueError("The lsu algorithm takes no RC2 options.")
+        self.algorithm = algorithm
+        self.timeout = timeout
+        self.sat_solver = sat_solver
+        self.options = options
+        self.stats = MaxSATStats()
+
+    def solve(self, max_sat: WCNF) -> List[int]:
+        """Solves a theory.
+
+        Args:
+            max_sat (WCNF):
+                The theory to solve.
+
+        Raises:
+            InvalidMaxSATModel:
+                If the hard clauses have no model.
+            MaxSATTimeout:
+                If the time budget ran out before any model was found.
+
+        Returns:
+            List[int]:
+                The model, over the variables of the theory.
+        """
+        start = time.perf_counter()
+        deadline = None if self.timeout is None else start + self.timeout
+        self.stats = MaxSATStats()
+        try:
+            model = None
+            if self.algorithm == "lsu" or deadline is not None:
+                model = self._linear_search(max_sat, deadline)
+            if self.algorithm != "lsu" and not self.stats.optimal:
+                optimum = self._core_guided(max_sat, deadline)
+                if optimum is not None:
+                    model = optimum
+        finally:
+            self.stats.time = time.perf_counter() - start
+        if model is None:
+            raise MaxSATTimeout(self.timeout)
+        return model
+
+    @staticmethod
+    def _interrupt_at(deadline: Optional[float], solver) -> Optional[threading.Timer]:
+        """Starts a timer that interrupts `solver` at the deadline, if any."""
+        if deadline is None:
+            return None
+        delay = max(deadline - time.perf_counter(), 0)
+        timer = threading.Timer(delay, solver.interrupt)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def _core_guided(
+        self, max_sat: WCNF, deadline: Optional[float]
+    ) -> Optional[List[int]]:
+        """Finds an optimal model, or None if interrupted at the deadline."""
+        rc2_class = _RC2Stratified if self.algorithm == "rc2-stratified" else _RC2
+        with rc2_class(max_sat, solver=self.sat_solver, **self.options) as rc2:
+            timer = MaxSATSolver._interrupt_at(deadline, rc2)
+            try:
+                model = rc2.compute(expect_interrupt=timer is not None)
+            finally:
+                if timer is not None:
+                    timer.cancel()
+            self.stats.cores = rc2.cores
+            if model is None and rc2.interrupted:
+                return None
+            if not isinstance(model, list):
+                raise InvalidMaxSATModel(model)
+            self.stats.cost = rc2.cost
+            self.stats.optimal = True
+            self.stats.models += 1
+        return model
+
+    def _linear_search(
+        self, max_sat: WCNF, deadline: Optional[float]
+    ) -> Optional[List[int]]:
+        """Finds models of decreasing cost until no better one is found (see
+        `MaxSATSolver`), or None if interrupted before the first one."""
+        nv = max_sat.nv
+        soft = [list(clause) for clause in max_sat.soft]
+        # soft clause i must hold if its selector nv + 1 + i is true
+        selectors = list(range(nv + 1, nv + 1 + len(soft)))
+        top = nv + len(soft)
+        best = None
+        with Solver(name=self.sat_solver, bootstrap_with=max_sat.hard) as oracle:
+            for clause, selector in zip(soft, selectors):
+                oracle.add_clause(clause + [-selector])
+            # prefer models that satisfy the soft clauses
+            oracle.set_phases(selectors)
+            timer = MaxSATSolver._interrupt_at(deadline, oracle)
+            try:
+                assumptions: List[int] = []
+                while deadline is None or time.perf_counter() < deadline:
+                    found = oracle.solve_limited(
+                        assumptions=assumptions, expect_interrupt=timer is not None
+                    )
+                    if not found:
+                        # None if interrupted, False if there is no better model
+                        # (or, on the first call, no model of the hard clauses)
+                        if found is False and best is None:
+                            raise InvalidMaxSATModel(None)
+                        break
+                    model = oracle.get_model()
+                    true = set(model)
+                    satisfied, falsified = [], []
+                    cost = 0
+                    for clause, selector, weight in zip(
+                        soft, selectors, max_sat.wght
+                    ):
+                        if true.intersection(clause):
+                            satisfied.append(selector)
+                        else:
+                            falsified.append(selector)
+                            cost += weight
+                    best = [literal for literal in model if abs(literal) <= nv]
+                    self.stats.cost = cost
+                    self.stats.models += 1
+                    if not falsified:
+                        self.stats.optimal = True
+                        break
+                    # keep the satisfied clauses and satisfy one more
+                    top += 1
+                    oracle.add_clause([-top] + falsified)
+                    assumptions = satisfied + [top]
+            finally:
+                if timer is not None:
+                    timer.cancel()
+        return best
+
+
 def extract_raw_model(
-    max_sat: WCNF, decode: Dict[int, Hashable]
+    max_sat: WCNF, decode: Dict[int, Hashable], solver: Optional[MaxSATSolver] = None
 ) -> Dict[Hashable, bool]:
     """Extracts a raw model given a WCNF and the corresponding decoding dictionary.
 
@@ -86,24 +330,375 @@ def extract_raw_model(
             The WCNF to solve for.
         decode (Dict[int, Hashable]):
             The decode dictionary mapping to convert the pysat vars back to NNF.
+        solver (MaxSATSolver):
+            Optional; The solver to use. Defaults to an RC2 solver without a
+            time limit.
 
     Raises:
         InvalidMaxSATModel:
             If the model is invalid.
+        MaxSATTimeout:
+            If the solver ran out of time before finding a model.
 
     Returns:
         Dict[Hashable, bool]:
             The raw model.
     """
-    solver = RC2(max_sat)
-    encoded_model = solver.compute()
-
-    if not isinstance(encoded_model, list):
-        # should never be reached
-        raise InvalidMaxSATModel(encoded_model)
+    if solver is None:
+        solver = MaxSATSolver()
+    encoded_model = solver.solve(max_sat)
 
     # decode the model (back to nnf vars)
     model: Dict[Hashable, bool] = {
         decode[abs(clause)]: clause > 0 for clause in encoded_model
     }
     return model
+
+
+class IncrementalMaxSAT:
+    """A MaxSAT solver for a sequence of related WCNF theories.
+
+    A single RC2 solver is kept across calls to `solve`. Each soft clause is
+    added to it once, relaxed by a fresh selector variable, with the negated
+    selector as a soft unit clause of the clause's weight. A soft clause that is
+    missing from a later theory (or has another weight there) is retracted by
+    asserting its selector, which adds the same cost to every assignment and so
+    leaves the optimal assignments unchanged. Since the solver's formula only
+    ever grows stronger, the cores it found in earlier solves stay valid and are
+    reused.
+
+    Hard clauses cannot be retracted: they are kept once added.
+
+    Attributes:
+        top (int):
+            The largest variable the theories may use. Selector variables are
+            numbered after it.
+        sat_solver (str):
+            The name of the pysat SAT solver used as the oracle.
+        options (dict):
+            Extra keyword arguments for the RC2 solver.
+        stats (MaxSATStats):
+            The statistics of the last solve. Only the cores found during that
+            solve are counted.
+    """
+
+    def __init__(self, top: int, sat_solver: str = "g3", **options):
+        """Initializes an IncrementalMaxSAT solver.
+
+        Args:
+            top (int):
+                The largest variable the theories may use.
+            sat_solver (str):
+                Optional; The name of the pysat SAT solver to use as the
+                oracle. Defaults to "g3" (Glucose 3).
+            **options:
+                Extra keyword arguments for the RC2 solver, such as
+                `exhaust=True` or `minz=True`.
+        """
+        self.top = top
+        self.sat_solver = sat_solver
+        self.options = options
+        self.stats = MaxSATStats()
+        self._solver: Optional[_RC2] = None
+        # the total weight of the retracted clauses, which every model pays
+        self._retracted: Union[int, float] = 0
+        self._hard = set()
+        # the weight and selector of each active soft clause
+        self._selectors: Dict[Tuple[int, ...], Tuple[Union[int, float], int]] = {}
+        self._next_selector = top + 1
+
+    def solve(self, max_sat: WCNF) -> List[int]:
+        """Solves a theory, updating the clauses of the previous one.
+
+        Args:
+            max_sat (WCNF):
+                The theory to solve. It may only use variables up to `top`.
+
+        Raises:
+            InvalidMaxSATModel:
+                If the theory has no model.
+
+        Returns:
+            List[int]:
+                An optimal model of the theory, over its variables.
+        """
+        start = time.perf_counter()
+        if self._solver is None:
+            self._solver = _RC2(WCNF(), solver=self.sat_solver, **self.options)
+        solver = self._solver
+        cores = solver.cores
+
+        for clause in map(tuple, max_sat.hard):
+            if clause not in self._hard:
+                self._hard.add(clause)
+                solver.add_clause(list(clause))
+
+        # repeated soft clauses count once, with their weights added up
+        weights: Dict[Tuple[int, ...], Union[int, float]] = {}
+        for clause, weight in zip(map(tuple, max_sat.soft), max_sat.wght):
+            weights[clause] = weights.get(clause, 0) + weight
+
+        for clause, (weight, selector) in list(self._selectors.items()):
+            if weights.get(clause) != weight:
+                del self._selectors[clause]
+                solver.add_clause([selector])
+                self._retracted += weight
+        for clause, weight in weights.items():
+            if clause not in self._selectors:
+                selector = self._next_selector
+                self._next_selector += 1
+                self._selectors[clause] = (weight, selector)
+                solver.add_clause([*clause, selector])
+                solver.add_clause([-selector], weight=weight)
+
+        encoded_model = solver.compute()
+        if not isinstance(encoded_model, list):
+            raise InvalidMaxSATModel(encoded_model)
+        self.stats = MaxSATStats(
+            cost=solver.cost - self._retracted,
+            optimal=True,
+            cores=solver.cores - cores,
+            models=1,
+            time=time.perf_counter() - start,
+        )
+        return [literal for literal in encoded_model if abs(literal) <= self.top]
+
+
+def _integer_weights(max_sat: WCNF, precision: int) -> WCNF:
+    """A copy of `max_sat` with integer weights, as DIMACS requires.
+
+    The weights are kept as they are if they are all integers, and otherwise
+    scaled by 10^`precision` and rounded. Soft clauses whose weight rounds to 0
+    are left out, since they cannot change the cost.
+    """
+    scale = 1 if all(float(w).is_integer() for w in max_sat.wght) else 10**precision
+    scaled = WCNF()
+    scaled.nv = max_sat.nv
+    for clause in max_sat.hard:
+        scaled.append(list(clause))
+    for clause, weight in zip(max_sat.soft, max_sat.wght):
+        weight = round(weight * scale)
+        if weight > 0:
+            scaled.append(list(clause), weight=weight)
+    return scaled
+
+
+def write_wcnf(
+    path: str,
+    max_sat: WCNF,
+    decode: Optional[Dict[int, Hashable]] = None,
+    precision: int = 3,
+    format: str = "new",
+):
+    """Writes a WCNF theory to a DIMACS `.wcnf` file.
+
+    Non-integer weights are scaled by 10^`precision` and rounded, and soft
+    clauses whose weight rounds to 0 are left out.
+
+    Args:
+        path (str):
+            The path of the file to write.
+        max_sat (WCNF):
+            The theory to write.
+        decode (Dict[int, Hashable]):
+            Optional; The decode mapping of the theory's variables. If given,
+            it is pickled to `path + ".decode"`, to be read back by `read_wcnf`.
+        precision (int):
+            Optional; The number of decimals of the weights to keep. Defaults
+            to 3.
+        format ("new" | "legacy"):
+            Optional; The DIMACS format: the current one, in which hard clauses
+            are marked with "h", or the legacy one with a "p wcnf" header and a
+            top weight. Defaults to "new".
+    """
+    _integer_weights(max_sat, precision).to_file(path, format=format)
+    if decode is not None:
+        with open(path + ".decode", "wb") as f:
+            pickle.dump(decode, f)
+
+
+def read_wcnf(path: str) -> Tuple[WCNF, Optional[Dict[int, Hashable]]]:
+    """Reads a `.wcnf` file, and its decode mapping if `write_wcnf` wrote one.
+
+    The decode mapping is unpickled, so it should only be read if it is trusted.
+
+    Args:
+        path (str):
+            The path of the file to read.
+
+    Returns:
+        Tuple[WCNF, Optional[Dict[int, Hashable]]]:
+            The theory (with the weights as written), and the decode mapping or
+            None.
+    """
+    max_sat = WCNF(from_file=path)
+    decode = None
+    if os.path.exists(path + ".decode"):
+        with open(path + ".decode", "rb") as f:
+            decode = pickle.load(f)
+    return max_sat, decode
+
+
+def parse_solver_output(
+    output: str, nv: int
+) -> Tuple[Optional[str], Optional[List[int]], int]:
+    """Parses the output of a MaxSAT solver in the MaxSAT Evaluation format.
+
+    Args:
+        output (str):
+            The solver's standard output.
+        nv (int):
+            The number of variables of the theory.
+
+    Returns:
+        Tuple[Optional[str], Optional[List[int]], int]:
+            The status of the "s" line (such as "OPTIMUM FOUND"), the model of
+            the last "v" line(s) over the first `nv` variables, and the number
+            of "o" (improved cost) lines. The status and model are None if
+            missing.
+    """
+    status = None
+    values: Optional[List[str]] = None
+    costs = 0
+    in_values = False
+    for line in output.splitlines():
+        if line.startswith("v"):
+            if not in_values:
+                values = []
+            values.extend(line[1:].split())
+            in_values = True
+            continue
+        in_values = False
+        if line.startswith("s "):
+            status = line[2:].strip()
+        elif line.startswith("o "):
+            costs += 1
+
+    if values is None:
+        return status, None, costs
+    if len(values) == 1 and set(values[0]) <= {"0", "1"} and len(values[0]) >= nv:
+        # a string of the values of the variables
+        bits = values[0]
+        model = [v if bits[v - 1] == "1" else -v for v in range(1, nv + 1)]
+    else:
+        # a list of literals, ending with 0
+        model = [l for l in map(int, values) if l != 0 and abs(l) <= nv]
+    return status, model, costs
+
+
+class ExternalMaxSATSolver:
+    """A MaxSAT solver run as a separate program.
+
+    The theory is written to a temporary DIMACS `.wcnf` file, passed to the
+    program as its last argument, and the model is read from the "v" line of
+    its output, as in the MaxSAT Evaluations. It can be used wherever a
+    `MaxSATSolver` can, so that any installed solver can be tried on the
+    theories of AMDN and ARMS. Running `python -m macq.utils.wcnf_solver` is a
+    pure-Python stand-in for such a program.
+
+    Attributes:
+        command (List[str]):
+            The command to run the solver, without the file argument.
+        timeout (float):
+            The wall-clock budget of a solve, in seconds, or None. When it runs
+            out, the solver's process group is sent SIGTERM (upon which
+            solvers in the MaxSAT Evaluation format print their best model)
+            and, a second later, killed.
+        precision (int):
+            The number of decimals of the weights to keep (see `write_wcnf`).
+        format ("new" | "legacy"):
+            The DIMACS format of the files.
+        stats (MaxSATStats):
+            The statistics of the last solve. The cost uses the exact weights.
+    """
+
+    def __init__(
+        self,
+        command: Union[str, List[str]],
+        timeout: Optional[float] = None,
+        precision: int = 3,
+        format: str = "new",
+    ):
+        """Initializes an ExternalMaxSATSolver.
+
+        Args:
+            command (Union[str, List[str]]):
+                The command to run the solver, without the file argument.
+            timeout (float):
+                Optional; The wall-clock budget of a solve, in seconds.
+                Defaults to None (no limit).
+            precision (int):
+                Optional; The number of decimals of the weights to keep.
+                Defaults to 3.
+            format ("new" | "legacy"):
+                Optional; The DIMACS format of the files. Defaults to "new".
+        """
+        self.command = [command] if isinstance(command, str) else list(command)
+        self.timeout = timeout
+        self.precision = precision
+        self.format = format
+        self.stats = MaxSATStats()
+
+    def solve(self, max_sat: WCNF) -> List[int]:
+        """Solves a theory with the external solver.
+
+        Args:
+            max_sat (WCNF):
+                The theory to solve.
+
+        Raises:
+            InvalidMaxSATModel:
+                If the solver reports the theory unsatisfiable, or prints no
+                model without running out of time.
+            MaxSATTimeout:
+                If the time budget ran out before a model was printed.
+
+        Returns:
+            List[int]:
+                The model, over the variables of the theory.
+        """
+        start = time.perf_counter()
+        self.stats = MaxSATStats()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "theory.wcnf")
+            write_wcnf(path, max_sat, precision=self.precision, format=self.format)
+            process = subprocess.Popen(
+                self.command + [path],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                # in its own process group, so that wrapper scripts are
+                # signalled along with the solver they start
+                start_new_session=True,
+            )
+            timed_out = False
+            try:
+                output, _ = process.communicate(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                timed_out = True
+                os.killpg(process.pid, signal.SIGTERM)
+                try:
+                    output, _ = process.communicate(timeout=1)
+                except subprocess.TimeoutExpired:
+                    os.killpg(process.pid, signal.SIGKILL)
+                    output, _ = process.communicate()
+        self.stats.time = time.perf_counter() - start
+
+        status, model, costs = parse_solver_output(output, max_sat.nv)
+        if status == "UNSATISFIABLE":
+            raise InvalidMaxSATModel(None)
+        if model is None:
+            if timed_out:
+                raise MaxSATTimeout(self.timeout)
+            raise InvalidMaxSATModel(
+                None, f"The MAX-SAT solver printed no model: {output}"
+            )
+        true = set(model)
+        self.stats.cost = sum(
+            w
+            for clause, w in zip(max_sat.soft, max_sat.wght)
+            if not true.intersection(clause)
+        )
+        self.stats.optimal = status == "OPTIMUM FOUND"
+        self.stats.models = max(costs, 1)
+        return model
@@ -0,0 +1,43 @@
+"""A stand-in for an external MaxSAT solver, in the MaxSAT Evaluation format.
+
+Usage:
+    python -m macq.utils.wcnf_solver [--algorithm ALGORITHM] [--timeout SECONDS] FILE
+
+Solves a `.wcnf` file with a `MaxSATSolver` and prints the "o" (cost),
+"s" (status) and "v" (model) lines an `ExternalMaxSATSolver` reads.
+"""
+import argparse
+from typing import List, Optional
+
+# loading the extraction package first avoids a circular import of macq.utils.pysat
+from .. import extract  # noqa: F401
+from .pysat import MaxSATSolver, read_wcnf
+from ..extract.exceptions import InvalidMaxSATModel, MaxSATTimeout
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", help="the .wcnf file to solve")
+    parser.add_argument("--algorithm", default="rc2", choices=MaxSATSolver.ALGORITHMS)
+    parser.add_argument("--timeout", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    max_sat, _ = read_wcnf(args.file)
+    solver = MaxSATSolver(args.algorithm, timeout=args.timeout)
+    try:
+        model = solver.solve(max_sat)
+    except InvalidMaxSATModel:
+        print("s UNSATISFIABLE")
+        return
+    except MaxSATTimeout:
+        print("s UNKNOWN")
+        return
+    print(f"o {solver.stats.cost}")
+    print("s OPTIMUM FOUND" if solver.stats.optimal else "s SATISFIABLE")
+    values = {abs(l): l > 0 for l in model}
+    bits = ("1" if values.get(v) else "0" for v in range(1, max_sat.nv + 1))
+    print("v " + "".join(bits))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,35 @@
+import sys
+import pytest
 from pathlib import Path
 from typing import List
 from macq.trace import *
 from macq.extract import Extract, modes
 from macq.observation import PartialObservation
 from macq.generate.pddl import *
+from macq.extract import arms
+from macq.extract.arms import (
+    ARMS,
+    ARMSVariables,
+    Membership,
+    Relevance,
+    _Step2Cache,
+    _clause,
+    _trace_info_constraints,
+)
+from macq.utils.pysat import MaxSATSolver, ExternalMaxSATSolver, read_wcnf
+from macq.extract.exceptions import InvalidMaxSATModel
+from tests.utils.test_traces import blocks_world
+
+
+@pytest.fixture(scope="module")
+def traces():
+    return blocks_world(5)
+
+
+@pytest.fixture
+def observations(traces):
+    # ARMS updates the observed states, so each test tokenizes the traces anew
+    return traces.tokenize(PartialObservation, percent_missing=0.3)
 
 
 def get_fluent(name: str, objs: List[str]):
@@ -58,4 +84,165 @@ def test_arms():
     )
     model.to_pddl(
         "model_blocks_dom", "model_blocks_prob", model_blocks_dom, model_blocks_prob
-    )
\ No newline at end of file
+    )
+
+def test_arms_step2_cache(observations):
+    fluents = observations.get_fluents()
+    connected_actions, action_map = ARMS.step1(observations, False)
+    variables = ARMSVariables(ARMS._relations(fluents).values(), connected_actions)
+
+    def step2(**kwargs):
+        constraints, _ = ARMS.step2(
+            observations,
+            connected_actions,
+            action_map,
+            fluents,
+            2,
+            False,
+            variables=variables,
+            **kwargs,
+        )
+        return (
+            constraints.action,
+            constraints.info,
+            list(constraints.info3.items()),
+            list(constraints.plan.items()),
+        )
+
+    cache = _Step2Cache()
+    assert step2(cache=cache) == step2()
+
+    relation, action = variables.relations[0], variables.actions[-1]
+    var = variables.membership(relation, "del", action)
+    assert variables[var] == Membership(relation, "del", action)
+
+    # learn an action, as ARMS._arms does
+    learned = next(iter(connected_actions))
+    for obs_action in [a for a, la in action_map.items() if la == learned]:
+        del action_map[obs_action]
+    del connected_actions[learned]
+    for connected in connected_actions.values():
+        connected.pop(learned, None)
+    cache.forget({learned}, set())
+
+    assert step2(cache=cache) == step2() == step2(workers=2)
+
+
+def test_arms_workers(observations, monkeypatch):
+    pools = []
+
+    class CountedPool(arms.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(arms, "ProcessPoolExecutor", CountedPool)
+    details = lambda m: {a.details(): (a.precond, a.add, a.delete) for a in m.actions}
+    expected = ARMS(observations, debug=False, upper_bound=2)
+    model = ARMS(observations, debug=False, upper_bound=2, workers=2)
+    assert details(model) == details(expected)
+    # a single pool builds the constraints of every iteration
+    assert len(pools) == 1
+
+
+def test_arms_info_constraints(observations):
+    fluents = observations.get_fluents()
+    _, action_map = ARMS.step1(observations, False)
+    relations = ARMS._relations(fluents)
+    variables = ARMSVariables(relations.values(), action_map.values())
+    var = variables.var
+    # one long trace, in which actions repeat
+    obs_trace = [obs for obs_list in observations for obs in obs_list]
+
+    # the I1 and I2 clauses as they were built before the single-pass rewrite,
+    # by rescanning the trace prefix at every step
+    expected = []
+    for i, obs in enumerate(obs_trace):
+        if obs.state is None or i == 0:
+            continue
+        for fluent, val in obs.state.items():
+            if not val:
+                continue
+            r = variables.relation_ids[relations[fluent]]
+            i1 = []
+            for obs_i in obs_trace[: i - 1]:
+                if obs_i.action in action_map:
+                    ai = variables.action_ids[action_map[obs_i.action]]
+                    if variables.matches(r, ai):
+                        i1.append(var(r, ARMSVariables.ADD, ai))
+            if i1:
+                expected.append(_clause(*i1))
+            a_n = obs_trace[i - 1].action
+            if a_n in action_map:
+                expected.append(
+                    (-var(r, ARMSVariables.DEL, variables.action_ids[action_map[a_n]]),)
+                )
+
+    constraints, support_counts = _trace_info_constraints(
+        0, obs_trace, relations, action_map, variables
+    )
+    assert constraints == expected
+    assert any(len(c) > 1 for c in constraints)
+    assert sum(support_counts.values()) > 0
+
+
+def test_arms_apriori():
+    # supports count the occurrences of the first action followed by the second
+    action_lists = [["a", "b", "a", "b"], ["b", "a", "c", "a"], ["c"]]
+    assert ARMS._apriori(action_lists, 1) == {
+        ("a", "b"): 2,
+        ("b", "a"): 2,
+        ("a", "c"): 1,
+        ("b", "c"): 1,
+        ("c", "a"): 1,
+    }
+    assert ARMS._apriori(action_lists, 2) == {("a", "b"): 2, ("b", "a"): 2}
+    # c appears twice, but never before another action twice
+    assert ARMS._apriori(action_lists, 3) == {}
+    assert all(type(n) is int for n in ARMS._apriori(action_lists, 1).values())
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_arms_solver(observations, incremental):
+    solver = None if incremental else MaxSATSolver("lsu")
+    model = ARMS(
+        observations,
+        debug=False,
+        upper_bound=2,
+        incremental=incremental,
+        solver=solver,
+    )
+    assert model
+    with pytest.raises(ValueError):
+        ARMS(
+            observations,
+            debug=False,
+            upper_bound=2,
+            incremental=True,
+            solver=MaxSATSolver(),
+        )
+
+
+def test_arms_external_solver(observations, tmp_path):
+    # the pure-Python stand-in for a MaxSAT solver binary
+    solver = ExternalMaxSATSolver([sys.executable, "-m", "macq.utils.wcnf_solver"])
+    path = str(tmp_path / "arms-{iteration}.wcnf")
+    model = ARMS(
+        observations, debug=False, upper_bound=2, solver=solver, wcnf_path=path
+    )
+    assert model
+    assert solver.stats.optimal
+
+    max_sat, decode = read_wcnf(path.format(iteration=1))
+    assert all(isinstance(p, (Membership, Relevance)) for p in decode.values())
+    assert all(float(w).is_integer() for w in max_sat.wght)
+    rc2 = MaxSATSolver()
+    rc2.solve(max_sat)
+    # the file holds the problem the stand-in solved, with the weights scaled
+    assert rc2.stats.cost == pytest.approx(
+        1000 * solver.stats.cost, abs=len(max_sat.soft)
+    )
+
+    # a program that exits without printing a model
+    with pytest.raises(InvalidMaxSATModel):
+        ExternalMaxSATSolver([sys.executable, "-c", "pass"]).solve(max_sat)
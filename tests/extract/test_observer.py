@@ -1,6 +1,6 @@
 import pytest
 from pathlib import Path
-from macq.extract import Extract, modes
+from macq.extract import Extract, IncrementalObserver, Observer, modes
 from macq.observation import *
 from macq.trace import *
 from tests.utils.test_traces import blocks_world
@@ -27,6 +27,96 @@ def test_observer():
         observations.fetch_observations({"test": "test"})
 
 
+def test_incremental_observer():
+    traces = blocks_world(5)
+    observations = traces.tokenize(IdentityObservation)
+
+    observer = IncrementalObserver()
+    for trace in traces[:3]:
+        observer.update(trace)
+    partial = observer.model()
+    for trace in traces[3:]:
+        observer.update(trace)
+    model = observer.model()
+    expected = Extract(observations, modes.OBSERVER)
+
+    details = lambda m: {
+        a.details(): (a.precond, a.add, a.delete) for a in m.actions
+    }
+    assert details(model) == details(expected)
+    assert model.fluents == expected.fluents
+    # folding the traces in small chunks gives the same model
+    for chunk_size in (1, 2, 7):
+        chunked = IncrementalObserver()
+        chunked.update_traces([[]] + list(observations), chunk_size=chunk_size)
+        assert details(chunked.model()) == details(expected)
+        assert chunked.model().fluents == expected.fluents
+    # later traces only add actions and widen the effects
+    for name, (precond, add, delete) in details(partial).items():
+        assert precond >= details(model)[name][0]
+        assert add <= details(model)[name][1]
+
+
+def test_observer_compact_states():
+    traces = blocks_world(5)
+    expected = Extract(traces.tokenize(IdentityObservation), modes.OBSERVER)
+    traces.compact()
+    observations = traces.tokenize(IdentityObservation)
+    model = Extract(observations, modes.OBSERVER)
+    assert model.fluents == expected.fluents
+    assert {a.details(): (a.precond, a.add, a.delete) for a in model.actions} == {
+        a.details(): (a.precond, a.add, a.delete) for a in expected.actions
+    }
+
+    pre, post = traces[0][0].state, traces[0][1].state
+    delta = Observer.get_delta(pre, post)
+    assert delta == Observer.get_delta(pre.copy(), post.copy())
+    assert Observer._filter_positive(pre) == Observer._filter_positive(pre.copy())
+
+
+def test_incremental_observer_delta_trace(monkeypatch):
+    traces = blocks_world(3)
+    expected = IncrementalObserver()
+    expected.update_traces(traces)
+
+    calls = []
+    get_delta = DeltaTrace.get_delta
+
+    def counted(self, i):
+        calls.append(i)
+        return get_delta(self, i)
+
+    monkeypatch.setattr(DeltaTrace, "get_delta", counted)
+    observer = IncrementalObserver()
+    for trace in traces:
+        observer.update(DeltaTrace.from_trace(trace, keyframe_interval=2))
+    details = lambda m: {a.details(): (a.precond, a.add, a.delete) for a in m.actions}
+    assert details(observer.model()) == details(expected.model())
+    assert observer.model().fluents == expected.model().fluents
+    assert len(calls) == sum(len(trace) - 1 for trace in traces)
+
+
+def test_observer_merge():
+    traces = blocks_world(6)
+    observations = traces.tokenize(IdentityObservation)
+    details = lambda m: {a.details(): (a.precond, a.add, a.delete) for a in m.actions}
+    expected = Extract(observations, modes.OBSERVER)
+
+    shards = []
+    for shard in (traces[:2], traces[2:4], traces[4:]):
+        observer = IncrementalObserver()
+        observer.update_traces(shard)
+        shards.append(observer)
+    a, b, c = shards
+    left = a.merge(b).merge(c).model()
+    right = a.merge(b.merge(c)).model()
+    assert details(left) == details(right) == details(expected)
+    assert left.fluents == expected.fluents
+
+    model = Extract(observations, modes.OBSERVER, workers=2)
+    assert details(model) == details(expected)
+
+
 if __name__ == "__main__":
     # exit out to the base macq folder so we can get to /tests
     base = Path(__file__).parent.parent
@@ -1,5 +1,7 @@
 import pytest
+from macq.trace import *
 from macq.observation import *
+from tests.utils.generators import generate_test_trace_list
 
 
 def test_observation():
@@ -8,3 +10,95 @@ def test_observation():
         o.matches({"test": "test"})
 
     assert o.serialize()
+
+
+def test_lazy_observed_tracelist():
+    traces = generate_test_trace_list(4)
+    eager = traces.tokenize(IdentityObservation)
+    lazy = traces.tokenize(IdentityObservation, lazy=True, cache_size=2)
+    assert lazy.lazy
+    assert len(lazy) == len(eager)
+    assert list(lazy) == list(eager)
+
+    # the tokens of a trace do not change between accesses
+    partial = traces.tokenize(PartialObservation, lazy=True, percent_missing=0.5)
+    assert partial[1] == partial[1]
+    assert partial[1] is not partial[1]
+
+    lazy[0] = eager[0]
+    assert not lazy.lazy
+    assert list(lazy) == list(eager)
+
+
+def test_parallel_tokenize():
+    traces = generate_test_trace_list(4)
+    serial = traces.tokenize(PartialObservation, workers=1, seed=7, percent_missing=0.5)
+    parallel = traces.tokenize(
+        PartialObservation, workers=2, seed=7, percent_missing=0.5
+    )
+    assert list(serial) == list(parallel)
+
+
+def test_batch_masking():
+    traces = generate_test_trace_list(2)
+    for compact in [False, True]:
+        if compact:
+            traces = traces.compact()
+        obs = traces.tokenize(
+            NoisyPartialObservation, percent_missing=0.3, percent_noisy=0.2
+        )
+        for trace, tokens in zip(traces, obs):
+            for step, token in zip(trace, tokens):
+                n = len(step.state)
+                hidden = {f for f, v in token.state.items() if v is None}
+                noisy = {
+                    f
+                    for f, v in token.state.items()
+                    if v is not None and v != step.state[f]
+                }
+                assert len(hidden) == int(n * 0.3)
+                assert len(noisy) == int((n - len(hidden)) * 0.2)
+
+
+def test_observation_index():
+    traces = generate_test_trace_list(3)
+    obs = traces.tokenize(IdentityObservation)
+    action = obs[0][0].action.details()
+    fluent = next(iter(obs[0][0].state)).name
+    for query in [
+        {"action": action},
+        {"fluent_holds": fluent},
+        {"action": action, "fluent_holds": fluent},
+    ]:
+        expected = [{o for o in obs_trace if o.matches(query)} for obs_trace in obs]
+        assert obs.fetch_observations(query) == expected
+
+    # modifying the list resets the index
+    del obs[0]
+    assert obs.fetch_observations({"action": action}) == [
+        {o for o in obs_trace if o.matches({"action": action})} for obs_trace in obs
+    ]
+
+
+def test_observation_store(tmp_path):
+    traces = generate_test_trace_list(3)
+    path = str(tmp_path / "observations.bin")
+    for Token, kwargs in [
+        (IdentityObservation, {}),
+        (PartialObservation, {"percent_missing": 0.5}),
+        (PartialObservation, {"percent_missing": 1}),
+    ]:
+        obs = traces.tokenize(Token, **kwargs)
+        obs.save(path)
+        for compact in [False, True]:
+            loaded = ObservedTraceList.load(path, compact=compact)
+            assert loaded.type is Token
+            assert [[o.index for o in t] for t in loaded] == [
+                [o.index for o in t] for t in obs
+            ]
+            assert [[o.action for o in t] for t in loaded] == [
+                [o.action for o in t] for t in obs
+            ]
+            assert [[o.state for o in t] for t in loaded] == [
+                [o.state for o in t] for t in obs
+            ]
@@ -0,0 +1,14 @@
+from macq.trace import InternPool, Fluent, PlanningObject
+
+
+def test_intern_pool():
+    pool = InternPool()
+    a = pool.planning_object("block", "a")
+    assert pool.planning_object("block", "a") is a
+
+    on = pool.fluent("on", [a, PlanningObject("block", "b")])
+    assert pool.fluent("on", [PlanningObject("block", "a"), PlanningObject("block", "b")]) is on
+    assert on.objects[0] is a
+    assert pool.intern(Fluent("on", [a, PlanningObject("block", "b")])) is on
+    assert pool.fluent("on", [on.objects[1], a]) is not on
+    assert len(pool) == 2
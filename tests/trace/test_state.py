@@ -1,5 +1,16 @@
+import pickle
 import pytest
-from macq.trace import State
+from macq.trace import (
+    State,
+    PartialState,
+    FluentIndex,
+    CompactState,
+    CompactPartialState,
+    Fluent,
+    PlanningObject,
+    StateView,
+    PartialStateView,
+)
 from tests.utils.generators import generate_test_states, generate_test_fluents
 
 
@@ -34,3 +45,120 @@ def test_state():
         assert s1.has_key(f)
     for f in s1:
         assert f in fluents
+
+
+def test_compact_state():
+    s1, s2 = generate_test_states(2)
+    index = FluentIndex()
+    c1 = CompactState.from_state(s1, index)
+    c2 = CompactState.from_state(s2, index)
+
+    assert c1 == s1 and s1 == c1
+    assert c1 != c2
+    assert hash(c1) == hash(s1)
+    assert c1.copy() == s1.copy()
+    assert c1.clone() == c1
+    assert len(c2) == 2
+    assert len(index) == 2
+
+    fluent = generate_test_fluents(3)[2]
+    assert not c2.has_key(fluent)
+    c2[fluent] = True
+    assert c2[fluent] and c2.holds(fluent.name)
+    assert len(index) == 3
+    c2.fluents[fluent] = False
+    assert not c2[fluent]
+    del c2[fluent]
+    with pytest.raises(KeyError):
+        c2[fluent]
+
+    partial = CompactPartialState(index, {fluent: None})
+    assert isinstance(partial, PartialState)
+    assert partial[fluent] is None
+    assert dict(partial.items()) == {fluent: None}
+
+    # only the bitsets are stored per state
+    for state in (c1, partial):
+        assert not hasattr(state, "__dict__")
+
+
+def test_state_pickle():
+    s1, _ = generate_test_states(2)
+    hash(s1)
+    states = [
+        s1,
+        PartialState({**s1.copy(), generate_test_fluents(3)[2]: None}),
+        StateView(s1, {generate_test_fluents(3)[2]: True}),
+        CompactState.from_state(s1, FluentIndex()),
+    ]
+    for state in states:
+        copy = pickle.loads(pickle.dumps(state))
+        assert type(copy) is type(state)
+        assert copy == state
+        assert hash(copy) == hash(state)
+
+
+def test_state_hash():
+    s1, s2 = generate_test_states(2)
+    s3 = s1.clone()
+    assert hash(s1) == hash(s3)
+    assert len({s1, s2, s3}) == 2
+
+    fluent = generate_test_fluents(2)[1]
+    s3[fluent] = True
+    assert hash(s1) != hash(s3)
+    del s3[fluent]
+    assert hash(s1) == hash(s3)
+
+
+def test_state_holds():
+    a, b = PlanningObject("block", "a"), PlanningObject("block", "b")
+    on_a, on_b = Fluent("on", [a]), Fluent("on", [b])
+    clear = Fluent("clear", [a])
+    # the last fluent with a name decides whether it holds
+    s = State({on_a: True, clear: False, on_b: False})
+    c = CompactState.from_state(s, FluentIndex())
+    for state in [s, c, s.clone(), c.clone()]:
+        assert state.holds("on") is False
+        assert state.holds("clear") is False
+        assert state.holds("missing") is None
+        assert state.held_names() == []
+
+    for state in [s, c]:
+        state[on_b] = True
+        assert state.holds("on") and state.held_names() == ["on"]
+        del state[on_b]
+        assert state.holds("on")
+        state[Fluent("clear", [b])] = True
+        assert sorted(state.held_names()) == ["clear", "on"]
+
+
+def test_state_view():
+    s1, _ = generate_test_states(2)
+    fluents = generate_test_fluents(3)
+    base = s1.clone()
+    view = StateView(base)
+    assert view == s1 and s1 == view and hash(view) == hash(s1)
+    assert view.holds(fluents[0].name)
+
+    # writes never reach the base state
+    view[fluents[0]] = False
+    view[fluents[2]] = True
+    assert base == s1
+    assert not view[fluents[0]] and view[fluents[2]]
+    assert len(view) == len(s1) + 1
+    del view[fluents[0]]
+    assert not view.has_key(fluents[0]) and base.has_key(fluents[0])
+    assert view.copy() == {fluents[2]: True}
+    assert view.clone() == view and view.clone().base is base
+
+    partial = PartialStateView(s1, {fluents[0]: None})
+    assert isinstance(partial, PartialState)
+    assert partial[fluents[0]] is None and not partial.holds(fluents[0].name)
+    assert StateView.of(partial).base is s1
+
+    # but later changes to the base state show through, unless overridden
+    live = StateView(base)
+    base[fluents[1]] = False
+    assert live[fluents[1]] is False
+    assert view[fluents[2]] and not view.has_key(fluents[0])
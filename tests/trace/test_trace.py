@@ -144,3 +144,53 @@ def test_trace_list_methods():
 
     trace.remove(step)
     assert step not in trace
+
+
+def test_trace_bookkeeping():
+    steps = generate_test_trace(5).steps + generate_test_steps(3)
+    for trace in (Trace(), DeltaTrace(keyframe_interval=2)):
+        trace.extend(steps[:5])
+        trace.insert(2, steps[5])
+        trace.append(steps[6])
+        trace[0] = steps[7]
+        trace.remove(steps[3])
+        trace.pop()
+        trace[1:3] = (step for step in steps[5:])
+
+        # the incremental bookkeeping agrees with a trace built from scratch
+        expected = Trace(list(trace))
+        assert trace.fluents == expected.fluents
+        assert trace.actions == expected.actions
+        assert trace.get_static_fluents() == expected.get_static_fluents()
+        for action in expected.actions:
+            assert trace.get_usage(action) == expected.get_usage(action)
+            assert trace.get_pre_states(action) == expected.get_pre_states(action)
+
+
+def test_delta_trace():
+    trace = generate_test_trace(6)
+    delta_trace = DeltaTrace.from_trace(trace, keyframe_interval=4)
+
+    assert delta_trace == trace
+    assert len(delta_trace) == len(trace)
+    assert delta_trace.fluents == trace.fluents
+    assert delta_trace.actions == trace.actions
+    assert delta_trace[-1].state == trace[-1].state
+    assert [s.state for s in delta_trace[1:4]] == [s.state for s in trace[1:4]]
+    assert delta_trace.get_total_cost() == trace.get_total_cost()
+    assert delta_trace.get_slice_cost(2, 4) == trace.get_slice_cost(2, 4)
+
+    for i in range(len(trace) - 1):
+        delta = delta_trace.get_delta(i)
+        state = trace[i].state.clone()
+        delta.apply(state)
+        assert state == trace[i + 1].state
+        assert delta == StateDelta.between(trace[i].state, trace[i + 1].state)
+
+    step = trace[3]
+    assert step in delta_trace
+    delta_trace.remove(step)
+    assert step not in delta_trace
+    assert delta_trace[3].state == trace[4].state
+    assert delta_trace.pop().state == trace[-1].state
+    assert len(delta_trace) == len(trace) - 2
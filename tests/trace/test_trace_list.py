@@ -1,12 +1,14 @@
 from inspect import trace
 from pathlib import Path
 import pytest
-from macq.trace import TraceList, Fluent
+from macq.trace import TraceList, TraceStore, Fluent, CompactState
 from tests.utils.generators import (
     generate_test_trace_list,
     generate_test_trace,
 )
-from macq.generate.csv import load
+from macq.generate.csv import load, iter_traces
+from macq.observation import IdentityObservation
+from tests.utils.test_traces import blocks_world
 
 MissingGenerator = TraceList.MissingGenerator
 
@@ -71,3 +73,90 @@ def test_trace_list_csv_load():
     assert trace_list[2][2].state[Fluent("holding object i", [])] == False
     assert trace_list[2][2].state[Fluent("ontable object g", [])] == False
     assert trace_list[2][2].state[Fluent("ontable object c", [])] == True
+
+
+def test_trace_list_csv_stream():
+    base = Path(__file__).parent.parent
+    f = str((base / "csv_testing_files/test_load.csv").resolve())
+    trace_list = load(f, "actions", "plan_id")
+
+    streamed = list(iter_traces(f, "actions", "plan_id", chunk_size=2))
+    assert [len(t) for t in streamed] == [len(t) for t in trace_list]
+    assert streamed[2][2].state == trace_list[2][2].state
+
+    compact = load(f, "actions", "plan_id", compact=True)
+    state = compact[2][2].state
+    assert isinstance(state, CompactState)
+    assert state.index is compact.fluent_index
+    assert state == trace_list[2][2].state
+
+
+def test_trace_list_compact():
+    trace_list = generate_test_trace_list(3)
+    states = [step.state.clone() for trace in trace_list for step in trace]
+
+    assert trace_list.compact() is trace_list
+    assert trace_list.fluent_index is not None
+    compact = [step.state for trace in trace_list for step in trace]
+    for state, original in zip(compact, states):
+        assert isinstance(state, CompactState)
+        assert state.index is trace_list.fluent_index
+        assert state == original
+
+
+def test_trace_list_arrays():
+    trace_list = blocks_world(3)
+    n_steps = sum(len(trace) for trace in trace_list)
+
+    arrays = trace_list.to_arrays()
+    assert arrays.states.shape == (n_steps, len(arrays.fluents))
+    assert arrays.offsets[-1] == n_steps
+    assert len(arrays) == len(trace_list)
+
+    for compact in (False, True):
+        rebuilt = TraceList.from_arrays(arrays, compact=compact)
+        for trace, original in zip(rebuilt, trace_list):
+            assert [s.state for s in trace] == [s.state for s in original]
+            assert [s.action for s in trace] == [s.action for s in original]
+            assert [s.index for s in trace] == [s.index for s in original]
+        assert rebuilt.to_arrays().states.tolist() == arrays.states.tolist()
+
+        # the generated steps are numbered from 1, which transitions rely on
+        transitions = rebuilt.tokenize(IdentityObservation).get_all_transitions()
+        expected = trace_list.tokenize(IdentityObservation).get_all_transitions()
+        assert transitions == expected
+        assert all(len(window) == 2 for w in transitions.values() for window in w)
+
+
+def test_trace_list_store(tmp_path):
+    base = Path(__file__).parent.parent
+    f = str((base / "csv_testing_files/test_load.csv").resolve())
+    trace_list = load(f, "actions", "plan_id")
+    path = str(tmp_path / "traces.bin")
+    trace_list.save(path)
+
+    for compact in (False, True):
+        opened = TraceList.open(path, compact=compact)
+        assert len(opened) == len(trace_list)
+        for trace, original in zip(opened, trace_list):
+            assert [s.state for s in trace] == [s.state for s in original]
+            assert [s.action for s in trace] == [s.action for s in original]
+        assert opened[-1][0].action == trace_list[-1][0].action
+
+    for content in (b"", b"MACQTRC"):
+        path = str(tmp_path / "invalid.bin")
+        with open(path, "wb") as f:
+            f.write(content)
+        with pytest.raises(TraceStore.InvalidTraceStore):
+            TraceList.open(path)
+
+    # generated traces are numbered from 1, which must survive the file
+    trace_list = blocks_world(3)
+    path = str(tmp_path / "generated.bin")
+    trace_list.save(path)
+    opened = TraceList.open(path)
+    for trace, original in zip(opened, trace_list):
+        assert [s.index for s in trace] == [s.index for s in original]
+        assert [s.state for s in trace] == [s.state for s in original]
+    transitions = opened.tokenize(IdentityObservation).get_all_transitions()
+    assert transitions == trace_list.tokenize(IdentityObservation).get_all_transitions()
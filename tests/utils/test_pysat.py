@@ -0,0 +1,143 @@
+import time
+import pytest
+from typing import List
+from macq.extract.arms import ARMS
+from macq.extract.exceptions import InvalidMaxSATModel, MaxSATTimeout
+from macq.observation import PartialObservation
+from macq.utils.pysat import (
+    RC2,
+    WCNF,
+    IncrementalMaxSAT,
+    MaxSATSolver,
+    parse_solver_output,
+    read_wcnf,
+    write_wcnf,
+)
+from tests.utils.test_traces import blocks_world
+
+
+@pytest.fixture(scope="module")
+def max_sat():
+    # the first ARMS problem of a few blocks world traces
+    observations = blocks_world(5).tokenize(PartialObservation, percent_missing=0.3)
+    fluents = observations.get_fluents()
+    connected_actions, action_map = ARMS.step1(observations, False)
+    constraints, _ = ARMS.step2(
+        observations, connected_actions, action_map, fluents, 2, False
+    )
+    max_sat, _ = ARMS.step3(constraints, 110, 100, 0.6, 30, 30, False)
+    return max_sat
+
+
+def cost(max_sat: WCNF, model: List[int]) -> float:
+    true = set(model)
+    return sum(
+        w for clause, w in zip(max_sat.soft, max_sat.wght) if not true.intersection(clause)
+    )
+
+
+def test_incremental_solver(max_sat):
+    solver = IncrementalMaxSAT(max_sat.nv)
+
+    # every other clause is retracted, then added back along with a new one
+    theories = [max_sat.copy(), WCNF(), WCNF()]
+    for i, (clause, w) in enumerate(zip(max_sat.soft, max_sat.wght)):
+        if i % 2:
+            theories[1].append(clause, weight=w)
+        theories[2].append(clause, weight=w)
+    theories[2].append([-1], weight=500)
+
+    for theory in theories:
+        model = solver.solve(theory)
+        optimum = cost(theory, RC2(theory.copy()).compute())
+        assert cost(theory, model) == pytest.approx(optimum)
+
+
+@pytest.mark.parametrize("algorithm", MaxSATSolver.ALGORITHMS)
+def test_maxsat_solver(max_sat, algorithm):
+    optimum = cost(max_sat, RC2(max_sat.copy()).compute())
+
+    solver = MaxSATSolver(algorithm)
+    model = solver.solve(max_sat.copy())
+    assert solver.stats.cost == pytest.approx(cost(max_sat, model))
+    if algorithm == "lsu":
+        assert solver.stats.cost >= optimum - 1e-6
+    else:
+        assert solver.stats.optimal
+        assert solver.stats.cost == pytest.approx(optimum)
+        # with a time budget, a linear search runs before the core-guided one
+        solver = MaxSATSolver(algorithm, timeout=60, exhaust=True, minz=True)
+        solver.solve(max_sat.copy())
+        assert solver.stats.optimal
+        assert solver.stats.cost == pytest.approx(optimum)
+
+
+def test_maxsat_linear_search():
+    # x1 is forced, so only the first soft clause is falsified by the optimum
+    max_sat = WCNF()
+    max_sat.append([1])
+    max_sat.append([-1], weight=4)
+    max_sat.append([2], weight=1)
+    max_sat.append([-2, 3], weight=2.5)
+    max_sat.append([-3, 1], weight=0.5)
+
+    solver = MaxSATSolver("lsu")
+    model = solver._linear_search(max_sat, None)
+    assert {1, 2, 3} <= set(model)
+    assert solver.stats.cost == pytest.approx(4)
+    assert solver.stats.models >= 1
+    assert not solver.stats.optimal
+
+    # out of time before the first model
+    assert solver._linear_search(max_sat, time.perf_counter()) is None
+    solver = MaxSATSolver("lsu", timeout=0)
+    with pytest.raises(MaxSATTimeout):
+        solver.solve(max_sat)
+    assert solver.stats.models == 0
+
+    max_sat.append([-1])
+    with pytest.raises(InvalidMaxSATModel):
+        MaxSATSolver("lsu").solve(max_sat)
+
+    with pytest.raises(ValueError):
+        MaxSATSolver("lsu", exhaust=True)
+    with pytest.raises(ValueError):
+        MaxSATSolver("maxhs")
+
+
+def test_parse_solver_output():
+    bits = "c comment\no 7\no 3\ns OPTIMUM FOUND\nv 1010\n"
+    assert parse_solver_output(bits, 3) == ("OPTIMUM FOUND", [1, -2, 3], 2)
+
+    literals = "o 3\ns SATISFIABLE\nv -1 2\nv 3 -4 0\n"
+    assert parse_solver_output(literals, 3) == ("SATISFIABLE", [-1, 2, 3], 1)
+    # only the last model counts
+    assert parse_solver_output("v 1 2 0\nc\nv -1 -2 0\n", 2)[1] == [-1, -2]
+
+    assert parse_solver_output("s UNSATISFIABLE\n", 3) == ("UNSATISFIABLE", None, 0)
+    assert parse_solver_output("o 5\n", 3) == (None, None, 1)
+
+
+@pytest.mark.parametrize("format", ["new", "legacy"])
+def test_wcnf_round_trip(tmp_path, format):
+    max_sat = WCNF()
+    max_sat.append([1, -2])
+    max_sat.append([1], weight=2.5)
+    max_sat.append([-1, 3], weight=0.125)
+    max_sat.append([2], weight=0.0001)
+    decode = {1: "a", 2: "b", 3: "c"}
+
+    path = str(tmp_path / "theory.wcnf")
+    write_wcnf(path, max_sat, decode, precision=3, format=format)
+    read, read_decode = read_wcnf(path)
+    assert read_decode == decode
+    assert read.hard == [[1, -2]]
+    # scaled by 10^3 and rounded, dropping the weight that rounds to 0
+    assert read.soft == [[1], [-1, 3]]
+    assert read.wght == [2500, 125]
+
+    # integer weights are kept as they are, and no decode file is read back
+    path = str(tmp_path / "integer.wcnf")
+    write_wcnf(path, read, format=format)
+    assert read_wcnf(path)[0].wght == [2500, 125]
+    assert read_wcnf(path)[1] is None